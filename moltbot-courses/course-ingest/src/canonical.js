@@ -0,0 +1,53 @@
+import crypto from "node:crypto";
+
+// Canonical JSON for payload hashing: keys sorted recursively, no whitespace.
+// Python's course-proposal-manager/canonical_hash.py produces the same bytes,
+// so proposal payload hashes match course_snapshots.payload_hash.
+// Conformance vectors: moltbot-courses/hash_vectors.json
+// (python3 moltbot-courses/verify_hash_compatibility.py).
+
+const CHUNK_CHARS = 64 * 1024;
+
+function writeCanonical(obj, write) {
+  if (obj === null || typeof obj !== "object" || obj instanceof Date) {
+    write(JSON.stringify(obj));
+    return;
+  }
+  if (Array.isArray(obj)) {
+    write("[");
+    for (let i = 0; i < obj.length; i++) {
+      if (i > 0) write(",");
+      writeCanonical(obj[i], write);
+    }
+    write("]");
+    return;
+  }
+  const keys = Object.keys(obj).sort();
+  write("{");
+  for (let i = 0; i < keys.length; i++) {
+    write((i > 0 ? "," : "") + JSON.stringify(keys[i]) + ":");
+    writeCanonical(obj[keys[i]], write);
+  }
+  write("}");
+}
+
+export function normalizeJSON(obj) {
+  const parts = [];
+  writeCanonical(obj, s => parts.push(s));
+  return parts.join("");
+}
+
+// SHA-256 of normalizeJSON(obj), fed to the hash in bounded chunks
+export function payloadHashOf(obj) {
+  const hash = crypto.createHash("sha256");
+  let buffer = "";
+  writeCanonical(obj, s => {
+    buffer += s;
+    if (buffer.length >= CHUNK_CHARS) {
+      hash.update(buffer);
+      buffer = "";
+    }
+  });
+  hash.update(buffer);
+  return hash.digest("hex");
+}
@@ -1,8 +1,10 @@
 import Fastify from "fastify";
 import crypto from "node:crypto";
+import zlib from "node:zlib";
 
 import { makePool, ensureSchema } from "./db.js";
 import { PayloadSchema } from "./schema.js";
+import { payloadHashOf } from "./canonical.js";
 
 const app = Fastify({
   logger: {
@@ -10,6 +12,16 @@ const app = Fastify({
   }
 });
 
+// Accept gzip-compressed request bodies (proposal_manager compresses large payloads)
+app.addHook("preParsing", async (req, reply, payload) => {
+  if ((req.headers["content-encoding"] || "").toLowerCase() !== "gzip") return payload;
+  const gunzip = zlib.createGunzip();
+  // Fastify compares Content-Length with the encoded (compressed) byte count
+  gunzip.receivedEncodedLength = 0;
+  payload.on("data", (chunk) => { gunzip.receivedEncodedLength += chunk.length; });
+  return payload.pipe(gunzip);
+});
+
 const AUTH_TOKEN = process.env.AUTH_TOKEN || "";
 const VIEWER_AUTH = process.env.VIEWER_AUTH || ""; // Basic auth for viewer (user:pass format)
 
@@ -1002,20 +1014,8 @@ app.post("/v1/courses/ingest", async (req, reply) => {
     const payload = parsed.data;
     const c = payload.course;
   
-    // Compute payload hash for idempotency (normalize JSON: sort keys recursively, no whitespace)
-    // This matches Python's json.dumps(payload, sort_keys=True, separators=(',', ':'))
-    function normalizeJSON(obj) {
-      if (obj === null || typeof obj !== "object" || obj instanceof Date) {
-        return JSON.stringify(obj);
-      }
-      if (Array.isArray(obj)) {
-        return "[" + obj.map(normalizeJSON).join(",") + "]";
-      }
-      const keys = Object.keys(obj).sort();
-      return "{" + keys.map(k => `"${k}":${normalizeJSON(obj[k])}`).join(",") + "}";
-    }
-    const normalizedPayload = normalizeJSON(payload);
-    const payloadHash = crypto.createHash("sha256").update(normalizedPayload).digest("hex");
+    // Compute payload hash for idempotency (canonical JSON, see canonical.js)
+    const payloadHash = payloadHashOf(payload);
     
     // Check for existing snapshot with same payload hash (idempotency check)
     const existingSnapshot = await pool.query(
@@ -1298,19 +1298,8 @@ app.post("/v1/courses/ingest/batch", async (req, reply) => {
     try {
       const c = parsed.data.course;
       
-      // Compute payload hash for idempotency (normalize JSON: sort keys recursively, no whitespace)
-      function normalizeJSON(obj) {
-        if (obj === null || typeof obj !== "object" || obj instanceof Date) {
-          return JSON.stringify(obj);
-        }
-        if (Array.isArray(obj)) {
-          return "[" + obj.map(normalizeJSON).join(",") + "]";
-        }
-        const keys = Object.keys(obj).sort();
-        return "{" + keys.map(k => `"${k}":${normalizeJSON(obj[k])}`).join(",") + "}";
-      }
-      const normalizedPayload = normalizeJSON(payload);
-      const payloadHash = crypto.createHash("sha256").update(normalizedPayload).digest("hex");
+      // Compute payload hash for idempotency (canonical JSON, see canonical.js)
+      const payloadHash = payloadHashOf(payload);
       
       // Check for existing snapshot with same payload hash
       const existingSnapshot = await pool.query(
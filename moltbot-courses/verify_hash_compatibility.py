@@ -2,70 +2,215 @@
 """
 Verify that Python and JavaScript produce the same payload hash.
 
-Run this to ensure idempotency works across both systems.
+Checks every vector in hash_vectors.json against:
+  - Python: course-proposal-manager/canonical_hash.py (what proposal_manager
+    stores as payload_hash and sends as Idempotency-Key)
+  - Node:   course-ingest/src/canonical.js (what the server stores as
+    course_snapshots.payload_hash), when `node` is on PATH
+
+Vectors are generated payloads covering unicode (non-ASCII, astral, lone
+surrogates, control characters, keys that sort differently by code point
+and by UTF-16 unit), floats (integral, tiny/huge exponents, -0, random
+doubles), large integers and deep nesting, plus the sample courses in this
+directory. Each is stored as JSON text so both sides parse it natively.
+
+    python3 verify_hash_compatibility.py              # check
+    python3 verify_hash_compatibility.py --regenerate # rewrite hash_vectors.json
 """
 
-import json
+import argparse
 import hashlib
+import json
+import random
+import shutil
+import struct
+import subprocess
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).parent
+VECTORS_PATH = HERE / "hash_vectors.json"
+CANONICAL_JS = HERE / "course-ingest" / "src" / "canonical.js"
+SAMPLE_COURSES = ("royal_scot.json", "hawk_hollow.json")
+
+sys.path.insert(0, str(HERE.parent / "skills_for_moltbot" / "course-proposal-manager"))
+from canonical_hash import canonical_hash, canonical_json  # noqa: E402
+
+SEED = 20260201
+GENERATED_COUNT = 120
+
+STRING_POOL = [
+    "", "Royal Scot", "café", "Zürich", "東京ゴルフ倶楽部", "⛳ 18 holes", "🏌️‍♀️",
+    "é", "line\nbreak", "tab\tand\rreturn", "quote \" and \\ backslash",
+    "\u0000\u0001\u001f\u007f", "  ", "\ud83c", "\udfcc", "￿", "\U0001f600",
+]
+KEY_POOL = [
+    "id", "name", "city", "state", "geoLat", "teeSets", "a", "B", "_", "1", "10", "2",
+    "é", "ｆ", "｡", "\U0001f3cc", "\U00010000", "ключ", "key with space", "k\"q", "",
+]
+FLOAT_POOL = [
+    0.0, -0.0, 70.0, 72.5, 0.1, 0.1 + 0.2, 1e-7, 1.5e-7, 1e-6, 123e-20, 1e16, 1e20,
+    1e21, 1.7976931348623157e308, 5e-324, 2.0 ** 53, 2.0 ** 53 + 2, -84.4, 42.7,
+]
+INT_POOL = [0, 1, -1, 18, 130, 2 ** 31, 2 ** 53 - 1, 2 ** 53, 2 ** 53 + 1, -(2 ** 63), 12345678901234567890]
+
+
+def _random_double(rng: random.Random) -> float:
+    while True:
+        value = struct.unpack("<d", struct.pack("<Q", rng.getrandbits(64)))[0]
+        if value == value and abs(value) != float("inf"):
+            return value
+
+
+def _random_value(rng: random.Random, depth: int):
+    roll = rng.random()
+    if depth > 0 and roll < 0.2:
+        return {rng.choice(KEY_POOL) + rng.choice(["", "x", "é"]): _random_value(rng, depth - 1)
+                for _ in range(rng.randint(0, 6))}
+    if depth > 0 and roll < 0.35:
+        return [_random_value(rng, depth - 1) for _ in range(rng.randint(0, 5))]
+    kind = rng.randrange(7)
+    if kind == 0:
+        return rng.choice(STRING_POOL) + rng.choice(STRING_POOL)
+    if kind == 1:
+        return rng.choice(FLOAT_POOL)
+    if kind == 2:
+        return _random_double(rng)
+    if kind == 3:
+        return round(rng.uniform(-1000, 1000), rng.randint(0, 4))
+    if kind == 4:
+        return rng.choice(INT_POOL)
+    if kind == 5:
+        return rng.choice([True, False, None])
+    return rng.randint(-10 ** 6, 10 ** 6)
+
+
+def _nested_arrays(rng: random.Random, depth: int):
+    value = rng.choice(FLOAT_POOL)
+    for _ in range(depth):
+        value = [value, rng.choice(STRING_POOL)] if rng.random() < 0.5 else [value]
+    return value
+
+
+def generate_payloads(seed: int = SEED, count: int = GENERATED_COUNT) -> list:
+    """Deterministic course-shaped and free-form payloads."""
+    rng = random.Random(seed)
+    payloads = []
+    for i in range(count):
+        if i % 3 == 0:
+            payloads.append({
+                "course": {
+                    "id": f"course_vector_{i}",
+                    "name": rng.choice(STRING_POOL) or "Vector Course",
+                    "city": rng.choice(STRING_POOL),
+                    "state": "MI",
+                    "geoLat": _random_double(rng) if rng.random() < 0.3 else round(rng.uniform(41, 47), 6),
+                    "geoLng": round(rng.uniform(-90, -82), 6),
+                },
+                "teeSets": [
+                    {"color": rng.choice(STRING_POOL), "rating": rng.choice(FLOAT_POOL),
+                     "slope": rng.choice(INT_POOL), "yardage": rng.randint(4000, 7500)}
+                    for _ in range(rng.randint(0, 4))
+                ],
+                "holes": [{"number": n, "par": rng.choice([3, 4, 5]), "handicap": rng.choice([n, float(n)])}
+                          for n in range(1, rng.choice([1, 10, 19]))],
+                "amenities": [rng.choice(STRING_POOL) for _ in range(rng.randint(0, 3))],
+            })
+        elif i % 3 == 1:
+            payloads.append({"nested": _nested_arrays(rng, rng.randint(1, 40)), "extra": _random_value(rng, 3)})
+        else:
+            payloads.append({rng.choice(KEY_POOL): _random_value(rng, 6) for _ in range(rng.randint(1, 8))})
+    return payloads
+
 
-# Sample payload (matches what golf-course-research would produce)
-sample_payload = {
-    "course": {
-        "id": "course_test_123",
-        "name": "Test Golf Course",
-        "city": "Test City",
-        "state": "MI",
-        "geoLat": 42.7,
-        "geoLng": -84.4,
-        "holes": 18,
-        "teeSets": [
-            {
-                "color": "blue",
-                "rating": 72.5,
-                "slope": 130
-            },
-            {
-                "color": "white",
-                "rating": 70.0,
-                "slope": 125
-            }
-        ]
-    },
-    "courseTypes": [
-        {"groupKey": "access", "typeKey": "public"},
-        {"groupKey": "tech", "typeKey": "none"}
-    ]
-}
-
-# Python normalization (matches proposal_manager.py)
-normalized_python = json.dumps(sample_payload, sort_keys=True, separators=(',', ':'))
-hash_python = hashlib.sha256(normalized_python.encode('utf-8')).hexdigest()
-
-print("Python normalization:")
-print(f"  Normalized (first 100 chars): {normalized_python[:100]}...")
-print(f"  Hash: {hash_python}")
-print()
-
-# Expected JavaScript normalization (matches server.js normalizeJSON)
-# JavaScript should produce the same normalized string
-print("Expected JavaScript hash (should match):")
-print(f"  Hash: {hash_python}")
-print()
-
-# Test with different key order (should produce same hash)
-unordered_payload = {
-    "courseTypes": sample_payload["courseTypes"],
-    "course": sample_payload["course"]
-}
-normalized_unordered = json.dumps(unordered_payload, sort_keys=True, separators=(',', ':'))
-hash_unordered = hashlib.sha256(normalized_unordered.encode('utf-8')).hexdigest()
-
-print("Test: Different key order")
-print(f"  Original hash: {hash_python}")
-print(f"  Unordered hash: {hash_unordered}")
-print(f"  Match: {hash_python == hash_unordered}")
-
-if hash_python == hash_unordered:
+def build_vectors() -> list:
+    vectors = []
+    for name in SAMPLE_COURSES:
+        vectors.append({"name": name, "file": name})
+    for i, payload in enumerate(generate_payloads()):
+        vectors.append({"name": f"generated-{i:03d}", "json": json.dumps(payload)})
+    return vectors
+
+
+def vector_text(vector: dict) -> str:
+    return (HERE / vector["file"]).read_text() if "file" in vector else vector["json"]
+
+
+def python_digests(texts: list) -> list:
+    return [canonical_hash(json.loads(text)) for text in texts]
+
+
+def node_digests(texts: list):
+    """Digests from canonical.js for each JSON text, or None without node."""
+    node = shutil.which("node")
+    if node is None:
+        return None
+    script = (
+        f"import {{ normalizeJSON, payloadHashOf }} from {json.dumps(CANONICAL_JS.as_uri())};\n"
+        "import crypto from 'node:crypto';\n"
+        "import fs from 'node:fs';\n"
+        "const texts = JSON.parse(fs.readFileSync(0, 'utf8'));\n"
+        "const out = texts.map(t => {\n"
+        "  const obj = JSON.parse(t);\n"
+        "  const streamed = payloadHashOf(obj);\n"
+        "  const whole = crypto.createHash('sha256').update(normalizeJSON(obj)).digest('hex');\n"
+        "  return streamed === whole ? streamed : `mismatch:${streamed}:${whole}`;\n"
+        "});\n"
+        "process.stdout.write(JSON.stringify(out));\n"
+    )
+    result = subprocess.run(
+        [node, "--input-type=module", "-e", script],
+        input=json.dumps(texts), capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout)
+
+
+def check_key_order():
+    payload = json.loads((HERE / SAMPLE_COURSES[0]).read_text())
+    reordered = dict(reversed(list(payload.items())))
+    assert canonical_hash(payload) == canonical_hash(reordered), "key order changed the hash"
+    whole = hashlib.sha256(canonical_json(payload).encode("utf-8")).hexdigest()
+    assert canonical_hash(payload) == whole, "streamed hash != hash of canonical_json"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--regenerate", action="store_true", help="Rebuild hash_vectors.json from the generator")
+    args = parser.parse_args()
+
+    check_key_order()
     print("✅ Key order normalization works correctly")
-else:
-    print("❌ Key order normalization failed - hashes differ!")
+
+    if args.regenerate:
+        vectors = build_vectors()
+        texts = [vector_text(v) for v in vectors]
+        for vector, digest in zip(vectors, python_digests(texts)):
+            vector["sha256"] = digest
+    else:
+        vectors = json.loads(VECTORS_PATH.read_text())
+        texts = [vector_text(v) for v in vectors]
+    expected = [v["sha256"] for v in vectors]
+
+    failures = 0
+    sides = [("Python", python_digests(texts)), ("Node", node_digests(texts))]
+    for side, digests in sides:
+        if digests is None:
+            print(f"⚠️  {side}: node not found, skipped")
+            continue
+        bad = [v["name"] for v, want, got in zip(vectors, expected, digests) if want != got]
+        failures += len(bad)
+        if bad:
+            print(f"❌ {side}: {len(bad)}/{len(vectors)} vectors differ: {', '.join(bad[:10])}")
+        else:
+            print(f"✅ {side}: {len(vectors)}/{len(vectors)} vectors match")
+
+    if args.regenerate:
+        if failures:
+            sys.exit("Not writing hash_vectors.json: implementations disagree")
+        VECTORS_PATH.write_text(json.dumps(vectors, indent=1) + "\n")
+        print(f"Wrote {len(vectors)} vectors to {VECTORS_PATH.name}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
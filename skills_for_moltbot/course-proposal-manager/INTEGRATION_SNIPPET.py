@@ -108,11 +108,11 @@ def execute_single_instruction(instruction):
         # Send JSON file
         file_data = instruction.get("file", {})
         filename = file_data.get("filename", "course.json")
-        file_bytes = file_data.get("bytes", b"")
         
-        # Write to temp file (message tool expects a path)
-        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.json') as tmp:
-            tmp.write(file_bytes)
+        # Stream to a temp file (message tool expects a path)
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix=Path(filename).suffix) as tmp:
+            for chunk in file_data["chunks"]():
+                tmp.write(chunk)
             tmp_path = tmp.name
         
         try:
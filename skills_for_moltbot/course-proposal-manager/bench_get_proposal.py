@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: get_proposal lookups/second on a large proposals table.
+
+Compares the original lookup (new connection, PRAGMA table_info, SELECT *,
+eager json.loads on every call) with the current get_proposal (shared
+connection, fixed column projection, lazy payload decoding).
+
+Runs against a throwaway database, never the live one:
+
+    python3 bench_get_proposal.py --rows 100000 --lookups 20000
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Point proposal_manager at a scratch database before importing it
+_tmpdir = tempfile.mkdtemp(prefix="bench_proposals_")
+os.environ["PROPOSALS_DB_PATH"] = os.path.join(_tmpdir, "course_proposals.db")
+
+sys.path.insert(0, str(Path(__file__).parent))
+import proposal_manager as pm  # noqa: E402
+
+ROYAL_SCOT = Path(__file__).parent.parent.parent / "moltbot-courses" / "royal_scot.json"
+
+
+def populate(rows: int, payload: dict) -> list:
+    """Insert `rows` proposals (distinct payloads) and return their IDs."""
+    ids = []
+    batch = 5000
+    for start in range(0, rows, batch):
+        payloads = []
+        for i in range(start, min(start + batch, rows)):
+            p = dict(payload)
+            p["course"] = dict(payload["course"], id=f"course_bench_{i}", name=f"Bench Course {i}")
+            payloads.append(p)
+        ids.extend(pm.create_proposals(payloads, agent_label="bench")["proposal_ids"])
+    return ids
+
+
+def legacy_get_proposal(proposal_id: str):
+    """The original lookup: connect, read the catalog, SELECT *, parse the payload."""
+    conn = sqlite3.connect(pm.DB_PATH)
+    columns = [desc[1] for desc in conn.execute("PRAGMA table_info(proposals)").fetchall()]
+    row = conn.execute("SELECT * FROM proposals WHERE proposal_id = ?", (proposal_id,)).fetchone()
+    conn.close()
+    if not row:
+        return None
+    proposal = dict(zip(columns, row))
+    proposal["payload"] = json.loads(pm.decode_payload_json(proposal["payload_json"]))
+    return proposal
+
+
+def run(label: str, func, ids: list, lookups: int):
+    sample = [random.choice(ids) for _ in range(lookups)]
+    start = time.perf_counter()
+    for proposal_id in sample:
+        func(proposal_id)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<34} {lookups / elapsed:>10,.0f} lookups/s  ({elapsed * 1e6 / lookups:.1f} µs each)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--small", action="store_true", help="Use a minimal payload instead of royal_scot.json")
+    args = parser.parse_args()
+
+    if args.small or not ROYAL_SCOT.exists():
+        payload = {"course": {"id": "course_bench", "name": "Bench", "city": "Lansing", "state": "MI"}}
+    else:
+        payload = json.loads(ROYAL_SCOT.read_text())
+
+    print(f"Populating {args.rows:,} proposals in {pm.DB_PATH} ...")
+    start = time.perf_counter()
+    ids = populate(args.rows, payload)
+    print(f"  done in {time.perf_counter() - start:.1f}s")
+
+    print(f"\n{args.lookups:,} random lookups:")
+    run("before (connect + PRAGMA + *)", legacy_get_proposal, ids, args.lookups)
+    run("after (get_proposal)", pm.get_proposal, ids, args.lookups)
+    run("after + payload access", lambda pid: pm.get_proposal(pid)["payload"], ids, args.lookups)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        pm.get_store().close()
+        shutil.rmtree(_tmpdir, ignore_errors=True)
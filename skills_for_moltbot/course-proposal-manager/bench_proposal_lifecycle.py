@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Benchmark: the proposal lifecycle under concurrent load.
+
+Drives N proposals through create -> get -> action, with `--concurrency`
+worker threads per stage. The action is an Ingest tap (callback_handler,
+against a local stub ingest server), a Skip tap, or leaving the proposal to
+expire, a third each. Expiry is then swept with cleanup_expired_proposals.
+Reports ops/sec and p50/p95/p99 latency per stage, and how much the database
+file grew (measured after checkpointing the WAL into it, so the WAL's size
+doesn't count as growth).
+
+Runs against a throwaway database and a stub server, never the live ones:
+
+    python3 bench_proposal_lifecycle.py --proposals 3000 --concurrency 8
+    python3 bench_proposal_lifecycle.py --output after.json --baseline before.json
+
+--baseline compares against an earlier --output run and exits 1 if any
+stage's throughput dropped by more than --tolerance.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from stub_ingest_server import StubIngestServer  # noqa: E402
+
+# Point proposal_manager at a scratch database and the stub before importing it
+_tmpdir = tempfile.mkdtemp(prefix="bench_lifecycle_")
+os.environ["PROPOSALS_DB_PATH"] = os.path.join(_tmpdir, "course_proposals.db")
+_stub = StubIngestServer().start()
+os.environ["COURSE_INGEST_URL"] = _stub.url
+
+import proposal_manager as pm  # noqa: E402
+from callback_handler import handle_proposal_callback  # noqa: E402
+
+ROYAL_SCOT = Path(__file__).parent.parent.parent / "moltbot-courses" / "royal_scot.json"
+CHAT_ID = "bench"
+
+
+def db_bytes() -> int:
+    """Database file size in bytes, after checkpointing and truncating the WAL."""
+    # Own connection: the store's read pool is query_only, and a checkpoint
+    # can't run inside its write transaction
+    pm.init_db()  # Creates and migrates the database on first use
+    conn = sqlite3.connect(str(pm.DB_PATH))
+    try:
+        busy, _, _ = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    finally:
+        conn.close()
+    if busy:
+        raise RuntimeError("WAL checkpoint blocked; database size would include unmerged pages")
+    return os.path.getsize(pm.DB_PATH)
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))]
+
+
+def run_stage(name: str, func, items: list, concurrency: int) -> dict:
+    """Call func(item) for every item on `concurrency` threads; return stats."""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def timed(item):
+        start = time.perf_counter()
+        try:
+            func(item)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            return
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    size_before = db_bytes()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, items))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "stage": name,
+        "ops": len(latencies),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "seconds": wall,
+        "ops_per_sec": len(latencies) / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "db_growth_bytes": db_bytes() - size_before
+    }
+
+
+def make_payloads(count: int, small: bool) -> list:
+    if small or not ROYAL_SCOT.exists():
+        base = {"course": {"id": "course_bench", "name": "Bench", "city": "Lansing", "state": "MI"}}
+    else:
+        base = json.loads(ROYAL_SCOT.read_text())
+    payloads = []
+    for i in range(count):
+        payload = dict(base)
+        payload["course"] = dict(base["course"], id=f"course_bench_{i}", name=f"Bench Course {i}")
+        payloads.append(payload)
+    return payloads
+
+
+def tap(action: str):
+    def run(proposal_id: str):
+        result = handle_proposal_callback(f"proposal:{action}:{proposal_id}", {"chat_id": CHAT_ID})
+        if result.get("error"):
+            raise RuntimeError(result["error"])
+    return run
+
+
+def run_benchmark(proposals: int, concurrency: int, small: bool) -> dict:
+    payloads = make_payloads(proposals, small)
+    ids = [None] * proposals
+
+    def create(i):
+        # Every third proposal is created already due, so the sweep expires it
+        ids[i] = pm.create_proposal(payloads[i], agent_label="bench", expires_hours=0 if i % 3 == 2 else 48)
+
+    size_start = db_bytes()
+    stages = [run_stage("create", create, list(range(proposals)), concurrency)]
+    stages.append(run_stage("get", pm.get_proposal, ids, concurrency))
+    stages.append(run_stage("ingest", tap("ingest"), ids[0::3], concurrency))
+    stages.append(run_stage("skip", tap("skip"), ids[1::3], concurrency))
+    stages.append(run_stage("expire", lambda _: pm.cleanup_expired_proposals(), [None], 1))
+    stages[-1]["rows"] = pm.get_store().fetchone("SELECT COUNT(*) FROM proposals WHERE status = 'expired'")[0]
+
+    return {
+        "proposals": proposals,
+        "concurrency": concurrency,
+        "payload_bytes": len(pm.document_json(payloads[0])),
+        "stub_requests": _stub.requests,
+        "db_bytes": db_bytes(),
+        "db_growth_bytes": db_bytes() - size_start,
+        "stages": stages
+    }
+
+
+def print_report(report: dict):
+    print(f"{report['proposals']:,} proposals, concurrency {report['concurrency']}, "
+          f"payload {report['payload_bytes']:,} bytes\n")
+    print(f"  {'stage':<8} {'ops':>7} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'db +KB':>9} {'errors':>7}")
+    for s in report["stages"]:
+        print(f"  {s['stage']:<8} {s['ops']:>7,} {s['ops_per_sec']:>10,.0f} {s['p50_ms']:>9.2f} "
+              f"{s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f} {s['db_growth_bytes'] / 1024:>9,.0f} {s['errors']:>7}")
+        if s["first_error"]:
+            print(f"           first error: {s['first_error']}")
+    print(f"\n  expired rows: {report['stages'][-1]['rows']:,}   stub ingest requests: {report['stub_requests']:,}")
+    print(f"  database: {report['db_bytes'] / 1024:,.0f} KB (+{report['db_growth_bytes'] / 1024:,.0f} KB)")
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> bool:
+    """Print per-stage deltas against a baseline; return False on a regression."""
+    ok = True
+    before = {s["stage"]: s for s in baseline["stages"]}
+    print(f"\n  vs baseline (tolerance {tolerance:.0%}):")
+    for s in report["stages"]:
+        b = before.get(s["stage"])
+        if not b or not b["ops_per_sec"]:
+            continue
+        change = s["ops_per_sec"] / b["ops_per_sec"] - 1
+        regressed = change < -tolerance
+        ok = ok and not regressed
+        print(f"  {'!!' if regressed else 'ok'} {s['stage']:<8} ops/s {change:+.1%}  "
+              f"p95 {b['p95_ms']:.2f} -> {s['p95_ms']:.2f} ms")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--proposals", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--ingest-latency-ms", type=float, default=0.0, help="Added stub server latency")
+    parser.add_argument("--small", action="store_true", help="Use a minimal payload instead of royal_scot.json")
+    parser.add_argument("--output", help="Write the report as JSON")
+    parser.add_argument("--baseline", help="Compare against a JSON report from --output")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed ops/s drop vs baseline")
+    args = parser.parse_args()
+
+    _stub.latency = args.ingest_latency_ms / 1000.0
+    report = run_benchmark(args.proposals, args.concurrency, args.small)
+    print_report(report)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    if args.baseline and not compare(report, json.loads(Path(args.baseline).read_text()), args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        pm.get_store().close()
+        _stub.stop()
+        shutil.rmtree(_tmpdir, ignore_errors=True)
@@ -8,38 +8,80 @@ Works with both message-based callbacks (callback_data as text) and true Telegra
 
 import os
 import sys
-import json
 from datetime import datetime
-from typing import Dict, Optional, List
+from typing import BinaryIO, Callable, Dict, FrozenSet, Optional, List, Tuple
 
 # Add proposal manager to path
 sys.path.append(os.path.dirname(__file__))
+from ingest_client import CircuitOpenError
 from proposal_manager import (
+    IngestInProgressError,
     ingest_proposal,
+    ingest_service_available,
     skip_proposal,
     get_proposal,
-    format_proposal_message
+    proposal_message_text,
+    record_tap
+)
+from ingest_queue import enqueue_ingest, get_worker, start_worker
+from json_document import json_document
+from tap_limiter import ALLOWED, PROPOSAL_TAP_SHARED, RATE_LIMITED, THROTTLED, TapLimiter
+
+# Callback data format: proposal:{action}:{proposal_id}
+CALLBACK_PREFIX = "proposal:"
+
+# Telegram user IDs allowed to act on proposals (comma-separated
+# PROPOSAL_ALLOWED_USER_IDS; defaults to John's Telegram ID)
+ALLOWED_USER_IDS: FrozenSet[str] = frozenset(
+    user_id.strip()
+    for user_id in os.getenv("PROPOSAL_ALLOWED_USER_IDS", "8372254579").split(",")
+    if user_id.strip()
 )
 
+# Debounce + per-user rate limit, checked before any DB work (see tap_limiter)
+TAP_LIMITER = TapLimiter(shared=record_tap if PROPOSAL_TAP_SHARED else None)
 
-def parse_callback_data(callback_data: str) -> Optional[Dict[str, str]]:
+# handler(proposal_id, proposal, chat_id) -> instruction dict
+ActionHandler = Callable[[str, Dict, str], Dict]
+
+# Action name -> (handler, proposal statuses it may run on); see register_action
+ACTIONS: Dict[str, Tuple[ActionHandler, FrozenSet[str]]] = {}
+
+
+def register_action(action: str, statuses: Tuple[str, ...] = ("pending",)):
     """
-    Parse callback data in format: proposal:{action}:{proposal_id}
+    Decorator registering the handler for proposal:{action}:... callbacks.
     
-    Returns: {"action": "ingest|view_json|skip", "proposal_id": "..."} or None
+    handle_telegram_callback_message only calls it for proposals whose status
+    is in `statuses` (and that haven't expired).
     """
-    if not callback_data or not callback_data.startswith("proposal:"):
+    def decorator(handler: ActionHandler) -> ActionHandler:
+        ACTIONS[action] = (handler, frozenset(statuses))
+        return handler
+    return decorator
+
+
+def _route(callback_data: str) -> Optional[Tuple[str, str, ActionHandler, FrozenSet[str]]]:
+    """Return (action, proposal_id, handler, statuses) for valid callback data, else None."""
+    if not callback_data or not callback_data.startswith(CALLBACK_PREFIX):
         return None
-    
-    parts = callback_data.split(":", 2)
-    if len(parts) != 3:
+    action, sep, proposal_id = callback_data[len(CALLBACK_PREFIX):].partition(":")
+    entry = ACTIONS.get(action) if sep else None
+    if entry is None:
         return None
+    return (action, proposal_id) + entry
+
+
+def parse_callback_data(callback_data: str) -> Optional[Dict[str, str]]:
+    """
+    Parse callback data in format: proposal:{action}:{proposal_id}
     
-    prefix, action, proposal_id = parts
-    if prefix != "proposal" or action not in ["ingest", "view_json", "skip"]:
+    Returns: {"action": <registered action>, "proposal_id": "..."} or None
+    """
+    route = _route(callback_data)
+    if route is None:
         return None
-    
-    return {"action": action, "proposal_id": proposal_id}
+    return {"action": route[0], "proposal_id": route[1]}
 
 
 def handle_proposal_callback(callback_data: str, message_context: Dict = None) -> Dict:
@@ -56,8 +98,8 @@ def handle_proposal_callback(callback_data: str, message_context: Dict = None) -
     Returns:
         Dict with instruction structure (same as handle_telegram_callback_message)
     """
-    parsed = parse_callback_data(callback_data)
-    if not parsed:
+    route = _route(callback_data)
+    if route is None:
         return {
             "kind": "send_message",
             "chat_id": message_context.get("chat_id", "") if message_context else "",
@@ -65,8 +107,7 @@ def handle_proposal_callback(callback_data: str, message_context: Dict = None) -
             "error": f"Invalid callback format: {callback_data}"
         }
     
-    action = parsed["action"]
-    proposal_id = parsed["proposal_id"]
+    _, proposal_id, handler, _ = route
     
     # Get proposal
     proposal = get_proposal(proposal_id)
@@ -80,98 +121,217 @@ def handle_proposal_callback(callback_data: str, message_context: Dict = None) -
         }
     
     chat_id = message_context.get("chat_id", "") if message_context else ""
+    return handler(proposal_id, proposal, chat_id)
+
+
+# A failed ingest may be retried; an in-flight one is settled by the claim in
+# ingest_proposal
+@register_action("ingest", statuses=("pending", "failed", "ingesting"))
+def handle_ingest_action(proposal_id: str, proposal: Dict, chat_id: str) -> Dict:
+    """
+    Handle ingest action - returns instruction dict with both edit and receipt.
     
-    # Handle each action using the new action handlers
-    if action == "ingest":
-        return handle_ingest_action(proposal_id, proposal, chat_id)
-    elif action == "view_json":
-        return handle_view_json_action(proposal_id, proposal, chat_id)
-    elif action == "skip":
-        return handle_skip_action(proposal_id, proposal, chat_id)
+    If an ingest worker is running in this process (see start_ingest_worker),
+    the ingest is queued and an immediate acknowledgement is returned; the
+    edit/receipt instructions are delivered when the job completes. The
+    worker holds queued jobs while the ingest service is down (circuit
+    breaker open) and drains them once it recovers.
     
+    Without a worker nothing would ever run a queued job, so while the service
+    is down the tap fails fast instead: the proposal stays pending and the
+    user is asked to tap again later.
+    """
+    if get_worker() is not None:
+        return queue_ingest_instruction(proposal_id, chat_id, unavailable=not ingest_service_available())
+    if not ingest_service_available():
+        return ingest_unavailable_instruction(proposal_id, chat_id)
+    
+    try:
+        result = ingest_proposal(proposal_id)
+    except CircuitOpenError:
+        # Tripped by this or a concurrent request; the claim was released
+        return ingest_unavailable_instruction(proposal_id, chat_id)
+    except IngestInProgressError:
+        # A concurrent tap won the claim; it reports the outcome
+        return ingest_in_progress_instruction(proposal_id, chat_id)
+    except Exception as e:
+        return ingest_failed_instruction(chat_id, str(e))
+    return ingest_result_instructions(proposal_id, proposal, chat_id, result)
+
+
+def queue_ingest_instruction(proposal_id: str, chat_id: str, unavailable: bool = False) -> Dict:
+    """Queue an ingest job for this process's worker and acknowledge it."""
+    _, created = enqueue_ingest(proposal_id, chat_id)
+    if unavailable:
+        text = f"⏳ Ingest service is unavailable; `{proposal_id}` is queued and will be ingested when it is back"
+    elif created:
+        text = f"⏳ Ingest queued for `{proposal_id}`"
+    else:
+        text = f"⏳ Ingest already queued for `{proposal_id}`"
     return {
         "kind": "send_message",
         "chat_id": chat_id,
-        "text": f"❌ Unknown action: {action}",
-        "error": f"Unknown action: {action}"
+        "text": text
     }
 
 
-def handle_ingest_action(proposal_id: str, proposal: Dict, chat_id: str) -> Dict:
-    """Handle ingest action - returns instruction dict with both edit and receipt."""
-    try:
-        result = ingest_proposal(proposal_id)
-        time_str = datetime.now().strftime("%I:%M%p")
-        
-        # Get original proposal message ID if stored
-        proposal_message_id = proposal.get("proposal_message_id")
-        proposal_chat_id = proposal.get("proposal_chat_id")
-        
-        # Format receipt message
-        receipt_text = f"✅ **Ingested** at {time_str}\nCourse ID: `{result['course_id']}`\nSnapshot: `{result['snapshot_id']}`"
-        
-        # Format updated message text for edit
-        original_text = format_proposal_message(proposal_id, proposal["payload"])
-        updated_text = f"{original_text}\n\n✅ **Ingested** at {time_str}\nCourse ID: `{result['course_id']}`\nSnapshot: `{result['snapshot_id']}`"
-        
-        # Return BOTH edit (if possible) AND receipt message
-        instructions = {
-            "kind": "multiple",
+def ingest_unavailable_instruction(proposal_id: str, chat_id: str) -> Dict:
+    """Instruction for a tap while the ingest service is down and no worker can queue it."""
+    return {
+        "kind": "send_message",
+        "chat_id": chat_id,
+        "text": f"⚠️ Ingest service is unavailable; `{proposal_id}` was not ingested. Tap Ingest again later.",
+        "error": "Ingest service unavailable"
+    }
+
+
+def ingest_in_progress_instruction(proposal_id: str, chat_id: str) -> Dict:
+    """Instruction for a tap on a proposal that is already being ingested."""
+    return {
+        "kind": "send_message",
+        "chat_id": chat_id,
+        "text": f"⏳ Ingest already in progress for `{proposal_id}`"
+    }
+
+
+def status_instruction(proposal: Dict, chat_id: str) -> Dict:
+    """Instruction explaining why a proposal that is no longer pending can't be acted on."""
+    if proposal["status"] == "ingested":
+        return {
+            "kind": "send_message",
             "chat_id": chat_id,
-            "instructions": []
+            "text": f"✅ Already ingested\nCourse ID: `{proposal.get('course_id', 'N/A')}`"
         }
-        
-        # Instruction 1: Edit original proposal message (if we have message ID)
-        if proposal_message_id and proposal_chat_id == chat_id:
-            instructions["instructions"].append({
-                "kind": "edit_message",
-                "chat_id": chat_id,
-                "edit": {
-                    "message_id": proposal_message_id,
-                    "chat_id": chat_id,
-                    "new_text": updated_text,
-                    "reply_markup": {"inline_keyboard": []}  # Clear buttons
-                }
-            })
-        
-        # Instruction 2: Always send receipt message (audit trail)
-        instructions["instructions"].append({
+    elif proposal["status"] == "skipped":
+        return {
             "kind": "send_message",
             "chat_id": chat_id,
-            "text": receipt_text
-        })
-        
-        return instructions
-        
-    except Exception as e:
+            "text": "⏭️ This proposal was already skipped"
+        }
+    elif proposal["status"] == "ingesting":
+        return ingest_in_progress_instruction(proposal["proposal_id"], chat_id)
+    return {
+        "kind": "send_message",
+        "chat_id": chat_id,
+        "text": f"❌ Proposal status: {proposal['status']}",
+        "error": f"Proposal status: {proposal['status']}"
+    }
+
+
+def tap_rejected_instruction(tap: str, chat_id: str) -> Dict:
+    """Instruction for a tap TAP_LIMITER rejected: one notice per streak, otherwise nothing."""
+    if tap == RATE_LIMITED:
         return {
             "kind": "send_message",
             "chat_id": chat_id,
-            "text": f"❌ Failed to ingest: {str(e)}\n\nYou can try again by tapping Ingest.",
-            "error": str(e)
+            "text": "⏳ Too many taps - give it a few seconds.",
+            "error": "Rate limited"
         }
+    # Duplicates and further over-limit taps send nothing
+    return {
+        "kind": "multiple",
+        "chat_id": chat_id,
+        "instructions": [],
+        "error": "Rate limited" if tap == THROTTLED else "Duplicate tap"
+    }
 
 
-def handle_view_json_action(proposal_id: str, proposal: Dict, chat_id: str) -> Dict:
-    """Handle view JSON action - returns instruction dict."""
-    course_id = proposal["payload"]["course"]["id"]
-    filename = f"{course_id}.json"
-    json_content = json.dumps(proposal["payload"], indent=2)
+def ingest_failed_instruction(chat_id: str, error: str) -> Dict:
+    """Instruction reporting a failed ingest."""
+    return {
+        "kind": "send_message",
+        "chat_id": chat_id,
+        "text": f"❌ Failed to ingest: {error}\n\nYou can try again by tapping Ingest.",
+        "error": error
+    }
+
+
+def ingest_result_instructions(proposal_id: str, proposal: Dict, chat_id: str, result: Dict) -> Dict:
+    """Build the edit + receipt instructions for a successful ingest."""
+    time_str = datetime.now().strftime("%I:%M%p")
+    
+    # Get original proposal message ID if stored
+    proposal_message_id = proposal.get("proposal_message_id")
+    proposal_chat_id = proposal.get("proposal_chat_id")
+    
+    # Format receipt message
+    receipt_text = f"✅ **Ingested** at {time_str}\nCourse ID: `{result['course_id']}`\nSnapshot: `{result['snapshot_id']}`"
+    
+    # Format updated message text for edit
+    original_text = proposal_message_text(proposal)
+    updated_text = f"{original_text}\n\n✅ **Ingested** at {time_str}\nCourse ID: `{result['course_id']}`\nSnapshot: `{result['snapshot_id']}`"
+    
+    # Return BOTH edit (if possible) AND receipt message
+    instructions = {
+        "kind": "multiple",
+        "chat_id": chat_id,
+        "instructions": []
+    }
+    
+    # Instruction 1: Edit original proposal message (if we have message ID)
+    if proposal_message_id and proposal_chat_id == chat_id:
+        instructions["instructions"].append({
+            "kind": "edit_message",
+            "chat_id": chat_id,
+            "edit": {
+                "message_id": proposal_message_id,
+                "chat_id": chat_id,
+                "new_text": updated_text,
+                "reply_markup": {"inline_keyboard": []}  # Clear buttons
+            }
+        })
+    
+    # Instruction 2: Always send receipt message (audit trail)
+    instructions["instructions"].append({
+        "kind": "send_message",
+        "chat_id": chat_id,
+        "text": receipt_text
+    })
+    
+    return instructions
+
+
+def start_ingest_worker(deliver: Callable[[Dict], None], **worker_kwargs):
+    """
+    Start a background ingest worker for this process.
+    
+    After this, Ingest taps are queued instead of blocking the callback. When a
+    job finishes, `deliver` is called with the same instruction dict the
+    synchronous path would have returned (kind "multiple" on success,
+    "send_message" with "error" on failure).
+    
+    Args:
+        deliver: Callable that executes an instruction dict (e.g. via the Telegram API)
+        worker_kwargs: Passed to ingest_queue.IngestWorker (concurrency, poll_interval, ...)
+    """
+    def on_complete(job: Dict, result: Optional[Dict], error: Optional[str]):
+        chat_id = job.get("chat_id") or ""
+        if error is not None:
+            deliver(ingest_failed_instruction(chat_id, error))
+            return
+        proposal = get_proposal(job["proposal_id"])
+        deliver(ingest_result_instructions(job["proposal_id"], proposal, chat_id, result))
     
+    return start_worker(on_complete, **worker_kwargs)
+
+
+@register_action("view_json")
+def handle_view_json_action(proposal_id: str, proposal: Dict, chat_id: str) -> Dict:
+    """Handle view JSON action - returns instruction dict (file streamed lazily, see json_document)."""
     return {
         "kind": "send_file",
         "chat_id": chat_id,
-        "file": {
-            "filename": filename,
-            "bytes": json_content.encode('utf-8')
-        },
+        "file": json_document(proposal),
         "text": f"📄 JSON for {proposal['course_name']}"  # Optional accompanying message
     }
 
 
+@register_action("skip")
 def handle_skip_action(proposal_id: str, proposal: Dict, chat_id: str) -> Dict:
     """Handle skip action - returns instruction dict with both edit and receipt."""
-    skip_proposal(proposal_id)
+    if not skip_proposal(proposal_id):
+        # Lost the race to an ingest (or an earlier skip)
+        return status_instruction(get_proposal(proposal_id), chat_id)
     
     # Get original proposal message ID if stored
     proposal_message_id = proposal.get("proposal_message_id")
@@ -181,7 +341,7 @@ def handle_skip_action(proposal_id: str, proposal: Dict, chat_id: str) -> Dict:
     receipt_text = "⏭️ **Skipped**"
     
     # Format updated message text for edit
-    original_text = format_proposal_message(proposal_id, proposal["payload"])
+    original_text = proposal_message_text(proposal)
     updated_text = f"{original_text}\n\n⏭️ **Skipped**"
     
     # Return BOTH edit (if possible) AND receipt message
@@ -241,14 +401,12 @@ def handle_telegram_callback_message(
             "kind": "send_message" | "send_file" | "edit_message",
             "chat_id": str,
             "text": str (if kind == "send_message"),
-            "file": { "filename": str, "bytes": bytes } (if kind == "send_file"),
+            "file": { "filename": str, "open": () -> file, "chunks": () -> Iterator[bytes], ... }
+                (if kind == "send_file", see json_document),
             "edit": { "message_id": int, "chat_id": str, "new_text": str } (if kind == "edit_message"),
             "error": Optional[str] (if failed)
         }
     """
-    # Default allowed user IDs (John's Telegram ID)
-    ALLOWED_USER_IDS = ["8372254579"]
-    
     # Safety check 1: Verify sender
     if str(from_user_id) not in ALLOWED_USER_IDS:
         return {
@@ -258,9 +416,9 @@ def handle_telegram_callback_message(
             "error": "Unauthorized user"
         }
     
-    # Safety check 2: Parse and verify action
-    parsed = parse_callback_data(message_text)
-    if not parsed:
+    # Safety check 2: Parse and look up the action (unknown actions don't route)
+    route = _route(message_text)
+    if route is None:
         return {
             "kind": "send_message",
             "chat_id": chat_id,
@@ -268,19 +426,14 @@ def handle_telegram_callback_message(
             "error": f"Invalid callback format: {message_text}"
         }
     
-    action = parsed["action"]
-    proposal_id = parsed["proposal_id"]
+    action, proposal_id, handler, statuses = route
     
-    # Verify action is valid
-    if action not in ["ingest", "view_json", "skip"]:
-        return {
-            "kind": "send_message",
-            "chat_id": chat_id,
-            "text": f"❌ Unknown action: {action}",
-            "error": f"Unknown action: {action}"
-        }
+    # Safety check 3: Drop repeated taps and rate-limit the user (in memory)
+    tap = TAP_LIMITER.check(str(from_user_id), proposal_id, action)
+    if tap != ALLOWED:
+        return tap_rejected_instruction(tap, chat_id)
     
-    # Safety check 3: Verify proposal exists
+    # Safety check 4: Verify proposal exists
     proposal = get_proposal(proposal_id)
     if not proposal:
         return {
@@ -290,29 +443,12 @@ def handle_telegram_callback_message(
             "error": f"Proposal {proposal_id} not found"
         }
     
-    # Safety check 4: Verify proposal is pending
-    if proposal["status"] != "pending":
-        if proposal["status"] == "ingested":
-            return {
-                "kind": "send_message",
-                "chat_id": chat_id,
-                "text": f"✅ Already ingested\nCourse ID: `{proposal.get('course_id', 'N/A')}`"
-            }
-        elif proposal["status"] == "skipped":
-            return {
-                "kind": "send_message",
-                "chat_id": chat_id,
-                "text": "⏭️ This proposal was already skipped"
-            }
-        else:
-            return {
-                "kind": "send_message",
-                "chat_id": chat_id,
-                "text": f"❌ Proposal status: {proposal['status']}",
-                "error": f"Proposal status: {proposal['status']}"
-            }
+    # Safety check 5: Verify the action may run in the proposal's status
+    # (pending, unless the action registered more)
+    if proposal["status"] not in statuses:
+        return status_instruction(proposal, chat_id)
     
-    # Safety check 5: Verify proposal not expired
+    # Safety check 6: Verify proposal not expired
     expires_at = datetime.fromisoformat(proposal["expires_at"])
     if datetime.now() > expires_at:
         return {
@@ -323,20 +459,7 @@ def handle_telegram_callback_message(
         }
     
     # Handle the action
-    if action == "ingest":
-        return handle_ingest_action(proposal_id, proposal, chat_id)
-    elif action == "view_json":
-        return handle_view_json_action(proposal_id, proposal, chat_id)
-    elif action == "skip":
-        return handle_skip_action(proposal_id, proposal, chat_id)
-    
-    # Should never reach here due to action validation above
-    return {
-        "kind": "send_message",
-        "chat_id": chat_id,
-        "text": f"❌ Unknown action: {action}",
-        "error": f"Unknown action: {action}"
-    }
+    return handler(proposal_id, proposal, chat_id)
 
 
 def handle_telegram_callback_query(callback_query: Dict) -> Dict:
@@ -401,11 +524,13 @@ def execute_telegram_instruction(instruction: Dict):
         )
     
     elif instruction["kind"] == "send_file":
-        send_telegram_document(
-            instruction["chat_id"],
-            document=instruction["file"]["bytes"],
-            filename=instruction["file"]["filename"]
-        )
+        with instruction["file"]["open"]() as document:
+            send_telegram_document(
+                instruction["chat_id"],
+                document,
+                filename=instruction["file"]["filename"],
+                content_type=instruction["file"]["content_type"]
+            )
         # Optionally send accompanying text
         if instruction.get("text"):
             send_telegram_message(instruction["chat_id"], instruction["text"])
@@ -469,7 +594,7 @@ def edit_telegram_message(chat_id: str, message_id: int, text: str, reply_markup
     """Placeholder - replace with your Telegram edit_message_text implementation."""
     pass
 
-def send_telegram_document(chat_id: str, content: bytes, filename: str, content_type: str = "application/json"):
+def send_telegram_document(chat_id: str, content: BinaryIO, filename: str, content_type: str = "application/json"):
     """Placeholder - replace with your Telegram send_document implementation."""
     pass
 
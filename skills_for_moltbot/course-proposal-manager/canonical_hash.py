@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Canonical Hash - Canonical JSON encoding and streaming SHA-256 of payloads.
+
+The canonical form is byte-for-byte what course-ingest's `normalizeJSON`
+(moltbot-courses/course-ingest/src/canonical.js) produces for the same parsed
+JSON, so proposal payload_hash values equal the server's snapshot hashes:
+
+  - object keys sorted by UTF-16 code units (JavaScript's default sort)
+  - no whitespace; strings as JSON.stringify writes them (non-ASCII kept as
+    UTF-8, lone surrogates escaped)
+  - numbers as JavaScript prints them: 70.0 -> 70, 1e-7 -> 1e-7,
+    integers beyond 2**53 rounded to the nearest double, NaN/Infinity -> null
+
+canonical_hash() feeds the encoding to hashlib in bounded chunks, so memory
+grows with nesting depth rather than with payload size.
+"""
+
+import hashlib
+import json
+import re
+from typing import Any, Callable, List
+
+# C-accelerated JSON string escaper (ensure_ascii=False flavour)
+_encode_basestring = json.encoder.encode_basestring
+
+# In a Python str every surrogate code point is unpaired
+_SURROGATE = re.compile("[\ud800-\udfff]")
+
+# Largest magnitude JavaScript holds exactly as an integer
+_MAX_SAFE_INTEGER = 2 ** 53 - 1
+
+# Flush encoded text to the hash once this many characters are buffered
+CHUNK_CHARS = 64 * 1024
+
+
+def _js_string(s: str) -> str:
+    out = _encode_basestring(s)
+    if not s.isascii() and _SURROGATE.search(out):
+        out = _SURROGATE.sub(lambda m: "\\u%04x" % ord(m.group()), out)
+    return out
+
+
+def _js_float(f: float) -> str:
+    """Number.prototype.toString for a double (ECMA-262 Number::toString)."""
+    if f != f or f in (float("inf"), float("-inf")):
+        return "null"  # JSON.stringify(NaN / Infinity)
+    if f == 0:
+        return "0"  # -0 too
+    if f.is_integer() and abs(f) <= _MAX_SAFE_INTEGER:
+        return str(int(f))
+
+    # repr() gives the shortest round-tripping digits, as JavaScript does; only
+    # the layout differs
+    sign = "-" if f < 0 else ""
+    mantissa, _, exp = repr(abs(f)).partition("e")
+    int_part, _, frac_part = mantissa.partition(".")
+    digits = int_part + frac_part
+    point = len(int_part) + int(exp or 0)
+    stripped = digits.lstrip("0")
+    point -= len(digits) - len(stripped)
+    digits = stripped.rstrip("0")
+    k, n = len(digits), point
+
+    if k <= n <= 21:
+        return sign + digits + "0" * (n - k)
+    if 0 < n <= 21:
+        return sign + digits[:n] + "." + digits[n:]
+    if -6 < n <= 0:
+        return sign + "0." + "0" * -n + digits
+    e = n - 1
+    exponent = ("e+" if e >= 0 else "e-") + str(abs(e))
+    if k == 1:
+        return sign + digits + exponent
+    return sign + digits[0] + "." + digits[1:] + exponent
+
+
+def _js_int(i: int) -> str:
+    if -_MAX_SAFE_INTEGER <= i <= _MAX_SAFE_INTEGER:
+        return str(i)
+    try:
+        return _js_float(float(i))
+    except OverflowError:
+        return "null"
+
+
+def _utf16_key(key: str) -> bytes:
+    return key.encode("utf-16-be", "surrogatepass")
+
+
+def _encode(obj: Any, write: Callable[[str], None]):
+    if isinstance(obj, str):
+        write(_js_string(obj))
+    elif obj is None:
+        write("null")
+    elif obj is True:
+        write("true")
+    elif obj is False:
+        write("false")
+    elif isinstance(obj, int):
+        write(_js_int(obj))
+    elif isinstance(obj, float):
+        write(_js_float(obj))
+    elif isinstance(obj, dict):
+        for key in obj:
+            if not isinstance(key, str):
+                raise TypeError(f"keys must be str, not {type(key).__name__}")
+        keys = sorted(obj)
+        if not all(key.isascii() for key in keys):
+            keys.sort(key=_utf16_key)
+        write("{")
+        first = True
+        for key in keys:
+            write(_js_string(key) + ":" if first else "," + _js_string(key) + ":")
+            first = False
+            _encode(obj[key], write)
+        write("}")
+    elif isinstance(obj, (list, tuple)):
+        write("[")
+        first = True
+        for item in obj:
+            if not first:
+                write(",")
+            first = False
+            _encode(item, write)
+        write("]")
+    else:
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def canonical_json(obj: Any) -> str:
+    """Return the canonical JSON text of obj."""
+    parts: List[str] = []
+    _encode(obj, parts.append)
+    return "".join(parts)
+
+
+def canonical_hash(obj: Any) -> str:
+    """SHA-256 hex digest of obj's canonical JSON, without building the full string."""
+    digest = hashlib.sha256()
+    parts: List[str] = []
+    size = 0
+
+    def write(text: str):
+        nonlocal size
+        parts.append(text)
+        size += len(text)
+        if size >= CHUNK_CHARS:
+            digest.update("".join(parts).encode("utf-8"))
+            parts.clear()
+            size = 0
+
+    _encode(obj, write)
+    digest.update("".join(parts).encode("utf-8"))
+    return digest.hexdigest()
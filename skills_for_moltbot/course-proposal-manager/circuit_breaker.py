@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Circuit Breaker - Fail fast while the course-ingest service is down.
+
+After `failure_threshold` consecutive failed ingest calls the breaker opens
+and IngestClient refuses further requests immediately (CircuitOpenError)
+instead of letting every approval wait out connect/read timeouts and
+retries. While open, a background thread probes GET /health every
+`reset_timeout` seconds; the first healthy answer closes the breaker again
+and fires `on_close` (proposal_manager uses it to wake the ingest worker,
+which then drains the jobs queued during the outage).
+
+Callers never wait on a probe: allow() only reads state and, when a probe is
+due, starts one in the background.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from ingest_client import CircuitOpenError
+
+__all__ = ["CircuitBreaker", "CircuitOpenError"]
+
+
+class CircuitBreaker:
+    """Thread-safe consecutive-failure breaker with background health probes."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        probe: Optional[Callable[[], bool]] = None,
+        on_close: Optional[Callable[[], None]] = None
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe = probe
+        self.on_close = on_close
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._probe_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def allow(self) -> bool:
+        """True if a request may be sent now; never blocks."""
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            self.rejected += 1
+            if self.probe is not None and not self._probing and time.monotonic() >= self._probe_at:
+                self._probing = True
+                threading.Thread(target=self._run_probe, name="ingest-health-probe", daemon=True).start()
+            elif self.probe is None and time.monotonic() >= self._probe_at:
+                # No health check available: let one real request through as the probe
+                self._probe_at = time.monotonic() + self.reset_timeout
+                return True
+            return False
+
+    def check(self):
+        """Raise CircuitOpenError unless a request may be sent now."""
+        if not self.allow():
+            raise CircuitOpenError("Ingest service unavailable (circuit open)")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            was_open = self.state == self.OPEN
+            self.state = self.CLOSED
+        if was_open and self.on_close is not None:
+            self.on_close()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.CLOSED and 0 < self.failure_threshold <= self.failures:
+                self.state = self.OPEN
+                self.opened += 1
+                self._probe_at = time.monotonic() + self.reset_timeout
+
+    def _run_probe(self):
+        try:
+            healthy = bool(self.probe())
+        except Exception:
+            healthy = False
+        with self._lock:
+            self._probing = False
+            if not healthy:
+                self._probe_at = time.monotonic() + self.reset_timeout
+        if healthy:
+            self.record_success()
+
+    def stats(self) -> Dict:
+        """State and counters (for logging / health endpoints)."""
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "opened": self.opened,
+                "rejected": self.rejected
+            }
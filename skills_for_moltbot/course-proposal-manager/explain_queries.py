@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Query-plan audit: EXPLAIN QUERY PLAN for every query the proposal skill runs.
+
+Prints each query's plan and flags full table scans ("!!", a SCAN that
+doesn't go through an index) and whole-index walks without a LIMIT ("~~").
+Runs against a freshly migrated scratch database by default, or an existing
+database opened read-only:
+
+    python3 explain_queries.py
+    python3 explain_queries.py --db /home/node/clawd/data/course_proposals.db
+
+Exits 1 if any query needs a full table scan, so it can gate schema changes.
+Keep QUERIES in step with the SQL in proposal_manager, ingest_queue and
+proposal_sweeper.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from proposal_store import migrate  # noqa: E402
+
+NOW = "2026-02-01T12:00:00"
+
+# (label, sql, params)
+QUERIES = [
+    ("get_proposal",
+     "SELECT * FROM proposals WHERE proposal_id = ?",
+     ("RS-20260201-001",)),
+    ("create_proposal: dedupe by payload_hash",
+     "SELECT payload_hash, proposal_id FROM proposals "
+     "WHERE status = 'pending' AND expires_at > ? AND payload_hash IN (?, ?) ORDER BY created_at",
+     (NOW, "a", "b")),
+    ("create_proposal: allocate sequence",
+     "INSERT INTO proposal_sequences (prefix, day, last_seq) VALUES (?, ?, ?) "
+     "ON CONFLICT(prefix, day) DO UPDATE SET last_seq = last_seq + excluded.last_seq",
+     ("RS", "20260201", 1)),
+    ("ingest_proposals: load batch",
+     "SELECT proposal_id, status, payload_json, payload_hash, course_id, snapshot_id "
+     "FROM proposals WHERE proposal_id IN (?, ?)",
+     ("RS-20260201-001", "RS-20260201-002")),
+    ("status update (ingested/failed/skipped)",
+     "UPDATE proposals SET status = 'skipped' WHERE proposal_id = ?",
+     ("RS-20260201-001",)),
+    ("list_pending_proposals: first page",
+     "SELECT proposal_id, course_name, city, state, created_at, agent_label FROM proposals "
+     "WHERE status = 'pending' AND expires_at > ? ORDER BY created_at DESC, proposal_id DESC LIMIT ?",
+     (NOW, 50)),
+    ("list_pending_proposals: next page",
+     "SELECT proposal_id, course_name, city, state, created_at, agent_label FROM proposals "
+     "WHERE status = 'pending' AND expires_at > ? AND (created_at, proposal_id) < (?, ?) "
+     "ORDER BY created_at DESC, proposal_id DESC LIMIT ?",
+     (NOW, "2026-02-01 11:00:00", "RS-20260201-050", 50)),
+    ("cleanup_expired_proposals",
+     "UPDATE proposals SET status = 'expired' WHERE status = 'pending' AND expires_at < ?",
+     (NOW,)),
+    ("enqueue_ingest: outstanding job",
+     "SELECT job_id FROM ingest_jobs WHERE proposal_id = ? AND status IN ('queued', 'running')",
+     ("RS-20260201-001",)),
+    ("claim_jobs",
+     "SELECT * FROM ingest_jobs WHERE status = 'queued' OR (status = 'running' AND lease_expires_at < ?) "
+     "ORDER BY job_id LIMIT ?",
+     (NOW, 2)),
+    ("sweeper: archive candidates",
+     "SELECT payload_json FROM proposals WHERE status IN ('ingested', 'skipped', 'expired') "
+     "AND created_at < ? LIMIT ?",
+     ("2026-01-01 00:00:00", 500)),
+    ("sweeper: purge jobs",
+     "DELETE FROM ingest_jobs WHERE status IN ('done', 'failed') AND created_at < ?",
+     ("2026-01-01 00:00:00",)),
+    ("record_tap",
+     "INSERT INTO callback_taps (user_id, proposal_id, action, tapped_at) VALUES (?, ?, ?, ?) "
+     "ON CONFLICT (user_id, proposal_id, action) DO UPDATE SET tapped_at = excluded.tapped_at "
+     "WHERE callback_taps.tapped_at <= ?",
+     ("8372254579", "RS-20260201-001", "ingest", 1767225600.0, 1767225597.0)),
+    ("sweeper: purge taps",
+     "DELETE FROM callback_taps WHERE tapped_at < ?",
+     (1767139200.0,)),
+]
+
+
+def is_full_scan(detail: str) -> bool:
+    return detail.startswith("SCAN ") and "INDEX" not in detail
+
+
+def is_index_walk(sql: str, detail: str) -> bool:
+    # An ordered SCAN of an index is fine when LIMIT stops it early
+    return detail.startswith("SCAN ") and "INDEX" in detail and "LIMIT" not in sql
+
+
+def audit(conn: sqlite3.Connection) -> int:
+    """Print every plan and return the number of queries with a full scan."""
+    flagged = 0
+    for label, sql, params in QUERIES:
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        scans = [detail for detail in plan if is_full_scan(detail)]
+        walks = [detail for detail in plan if is_index_walk(sql, detail)]
+        flagged += bool(scans)
+        print(f"{'!!' if scans else '~~' if walks else 'ok'}  {label}")
+        for detail in plan:
+            print(f"      {detail}")
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="Audit this database (read-only) instead of a scratch one")
+    args = parser.parse_args()
+
+    if args.db:
+        conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+        flagged = audit(conn)
+    else:
+        with tempfile.TemporaryDirectory(prefix="explain_proposals_") as tmpdir:
+            conn = sqlite3.connect(os.path.join(tmpdir, "course_proposals.db"), isolation_level=None)
+            migrate(conn)
+            flagged = audit(conn)
+            conn.close()
+
+    print(f"\n{len(QUERIES) - flagged}/{len(QUERIES)} queries use an index")
+    sys.exit(1 if flagged else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,7 @@ script_dir = Path(__file__).parent
 sys.path.insert(0, str(script_dir))
 
 from callback_handler import handle_telegram_callback_message
+from telegram_executor import get_executor, log_failures, send_instruction
 
 def execute_telegram_instruction(instruction, telegram_api=None):
     """
@@ -27,42 +28,15 @@ def execute_telegram_instruction(instruction, telegram_api=None):
             - send_document(chat_id, document, filename=None, **kwargs)
             - edit_message_text(chat_id, message_id, text, parse_mode=None, reply_markup=None, **kwargs)
     """
-    if instruction["kind"] == "send_message":
-        if telegram_api:
-            telegram_api.send_message(
-                instruction["chat_id"],
-                instruction["text"],
-                parse_mode="Markdown"
-            )
-        else:
-            print(f"[TELEGRAM] Send message to {instruction['chat_id']}: {instruction['text'][:100]}...")
-    
+    if telegram_api:
+        send_instruction(telegram_api, instruction)
+    elif instruction["kind"] == "send_message":
+        print(f"[TELEGRAM] Send message to {instruction['chat_id']}: {instruction['text'][:100]}...")
     elif instruction["kind"] == "send_file":
-        if telegram_api:
-            telegram_api.send_document(
-                instruction["chat_id"],
-                document=instruction["file"]["bytes"],
-                filename=instruction["file"]["filename"]
-            )
-            if instruction.get("text"):
-                telegram_api.send_message(instruction["chat_id"], instruction["text"])
-        else:
-            print(f"[TELEGRAM] Send file to {instruction['chat_id']}: {instruction['file']['filename']}")
-    
+        print(f"[TELEGRAM] Send file to {instruction['chat_id']}: {instruction['file']['filename']}")
     elif instruction["kind"] == "edit_message":
         edit = instruction["edit"]
-        if telegram_api:
-            edit_params = {
-                "chat_id": edit["chat_id"],
-                "message_id": edit["message_id"],
-                "text": edit["new_text"],
-                "parse_mode": "Markdown"
-            }
-            if "reply_markup" in edit:
-                edit_params["reply_markup"] = edit["reply_markup"]
-            telegram_api.edit_message_text(**edit_params)
-        else:
-            print(f"[TELEGRAM] Edit message {edit['message_id']} in chat {edit['chat_id']}")
+        print(f"[TELEGRAM] Edit message {edit['message_id']} in chat {edit['chat_id']}")
 
 
 def handle_proposal_message(message_text, chat_id, from_user_id, message_id=None, telegram_api=None):
@@ -77,7 +51,9 @@ def handle_proposal_message(message_text, chat_id, from_user_id, message_id=None
         telegram_api: Optional Telegram API object for sending messages
     
     Returns:
-        Dict with "handled" boolean indicating if message was processed
+        Dict with "handled" boolean indicating if message was processed, and
+        with a telegram_api, "sent" (False if any Telegram call failed; the
+        failures are logged)
     """
     if not message_text.startswith("proposal:"):
         return {"handled": False}
@@ -90,8 +66,11 @@ def handle_proposal_message(message_text, chat_id, from_user_id, message_id=None
         message_id=message_id
     )
     
-    # Execute instructions
-    if result["kind"] == "multiple":
+    # Execute instructions (rate-limited per chat when sending for real)
+    if telegram_api:
+        sent = log_failures(get_executor(telegram_api).execute([result]))
+        return {"handled": True, "sent": sent}
+    elif result["kind"] == "multiple":
         for instruction in result["instructions"]:
             execute_telegram_instruction(instruction, telegram_api)
     else:
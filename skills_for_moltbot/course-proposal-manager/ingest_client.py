@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+Ingest Client - Keep-alive HTTP client for the course-ingest service.
+
+Connections to COURSE_INGEST_URL are pooled and reused between requests, so
+back-to-back ingests cost one round trip each instead of a TCP (and TLS)
+handshake per POST. Large request bodies are gzip-compressed, gzip and
+deflate responses are decoded, and 5xx / connection failures are retried
+with exponential backoff and jitter (safe because the ingest API
+deduplicates on the payload hash). An optional circuit_breaker.CircuitBreaker
+makes requests fail fast while the service is down.
+
+AsyncIngestClient is the asyncio equivalent, built on asyncio streams.
+"""
+
+import asyncio
+import gzip
+import http.client
+import json
+import queue
+import random
+import socket
+import ssl
+import time
+import urllib.parse
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+# Errors raised when a pooled keep-alive connection was closed by the server
+# while idle; the request is resent once on a fresh connection
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    BrokenPipeError,
+    ConnectionResetError,
+)
+
+
+class IngestError(Exception):
+    """Base class for ingest client failures."""
+
+
+class IngestHTTPError(IngestError):
+    """The ingest service answered with a non-2xx status."""
+
+    def __init__(self, status: int, body: str):
+        super().__init__(f"HTTP {status} - {body}")
+        self.status = status
+        self.body = body
+
+
+class IngestConnectionError(IngestError):
+    """The ingest service could not be reached (after retries)."""
+
+
+class CircuitOpenError(IngestError):
+    """The ingest service is marked unavailable; the request was not sent."""
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff delay for a retry attempt (1-based)."""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+def prepare_request(
+    token: str,
+    body: Optional[bytes],
+    headers: Optional[Dict[str, str]],
+    gzip_min_bytes: int
+) -> Tuple[Optional[bytes], Dict[str, str]]:
+    """Add auth, accept compressed responses, and gzip the body when it reaches gzip_min_bytes (0 disables)."""
+    headers = {"Authorization": f"Bearer {token}", "Accept-Encoding": "gzip, deflate", **(headers or {})}
+    if body is not None and gzip_min_bytes and len(body) >= gzip_min_bytes:
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+
+def decode_content(content_encoding: Optional[str], data: bytes) -> bytes:
+    """Undo a response's Content-Encoding (gzip, deflate or identity, possibly stacked)."""
+    codings = [c.strip().lower() for c in (content_encoding or "").split(",") if c.strip()]
+    try:
+        for coding in reversed(codings):
+            if coding in ("gzip", "x-gzip"):
+                data = gzip.decompress(data)
+            elif coding == "deflate":
+                # zlib-wrapped per the RFC, but some servers send raw deflate
+                try:
+                    data = zlib.decompress(data)
+                except zlib.error:
+                    data = zlib.decompress(data, -zlib.MAX_WBITS)
+            elif coding != "identity":
+                raise IngestError(f"Unsupported response Content-Encoding: {coding}")
+    except (OSError, EOFError, zlib.error) as e:
+        raise IngestError(f"Undecodable {content_encoding} response body: {e}") from e
+    return data
+
+
+def json_headers(idempotency_key: Optional[str]) -> Dict[str, str]:
+    headers = {"Content-Type": "application/json"}
+    if idempotency_key:
+        headers["Idempotency-Key"] = idempotency_key
+    return headers
+
+
+def _record_outcome(breaker, status: Optional[int]):
+    """Feed one attempt to the breaker: no answer or a 5xx counts as a failure."""
+    if breaker is None:
+        return
+    if status is None or status >= 500:
+        breaker.record_failure()
+    else:
+        # Any 2xx-4xx answer means the service is up
+        breaker.record_success()
+
+
+def _may_retry(client, attempt: int, started: float) -> bool:
+    """
+    Whether a client may retry after failed attempt `attempt` (0-based): within
+    max_retries, and (unless retry_budget is 0) only if the next attempt, with
+    its longest backoff and a full read timeout, still ends within
+    retry_budget seconds of the first. So a hung server can't hold the caller
+    for (max_retries + 1) read timeouts.
+    """
+    if attempt >= client.max_retries:
+        return False
+    if not client.retry_budget:
+        return True
+    longest_backoff = min(client.backoff_max, client.backoff_base * (2 ** attempt))
+    return time.monotonic() - started + longest_backoff + client.read_timeout <= client.retry_budget
+
+
+def _stop_if_open(breaker):
+    """Don't keep retrying once failures (here or in other requests) opened the breaker."""
+    if breaker is not None and breaker.is_open:
+        raise CircuitOpenError("Ingest service unavailable (circuit open)")
+
+
+class IngestClient:
+    """Pooled keep-alive HTTP client with retries for the course-ingest API."""
+
+    def __init__(
+        self,
+        base_url: str,
+        token: str,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        gzip_min_bytes: int = 64 * 1024,
+        pool_size: int = 4,
+        breaker=None,
+        retry_budget: float = 45.0
+    ):
+        parts = urllib.parse.urlsplit(base_url)
+        self.scheme = parts.scheme or "http"
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port
+        self.base_path = parts.path.rstrip("/")
+        self.token = token
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.gzip_min_bytes = gzip_min_bytes
+        self.breaker = breaker
+        self._pool: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize=pool_size)
+
+    # Connection pool
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        conn_class = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        conn = conn_class(self.host, self.port, timeout=self.connect_timeout)
+        conn.connect()
+        # Connect with the short timeout, then wait up to read_timeout for responses
+        conn.sock.settimeout(self.read_timeout)
+        # Small request/response pairs: don't let Nagle hold back partial writes
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def _acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        """Return (connection, reused)."""
+        try:
+            return self._pool.get_nowait(), True
+        except queue.Empty:
+            return self._new_connection(), False
+
+    def _release(self, conn: http.client.HTTPConnection):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        """Close all idle pooled connections."""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    # Requests
+
+    def _send_once(self, method: str, path: str, body: Optional[bytes], headers: Dict) -> Tuple[int, bytes]:
+        """Send one request, reusing a pooled connection when possible."""
+        conn, reused = self._acquire()
+        try:
+            try:
+                conn.request(method, self.base_path + path, body=body, headers=headers)
+                response = conn.getresponse()
+            except STALE_CONNECTION_ERRORS:
+                if not reused:
+                    raise
+                conn.close()
+                conn = self._new_connection()
+                conn.request(method, self.base_path + path, body=body, headers=headers)
+                response = conn.getresponse()
+            data = response.read()
+        except BaseException:
+            conn.close()
+            raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+        return response.status, decode_content(response.getheader("Content-Encoding"), data)
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> Tuple[int, bytes]:
+        """
+        Send a request and return (status, body).
+
+        5xx responses and connection errors are retried up to max_retries times,
+        as long as a further attempt fits in retry_budget seconds (0: no cap).
+        Raises IngestHTTPError for non-2xx responses, IngestConnectionError
+        when the service cannot be reached, and CircuitOpenError (without
+        sending) while the breaker is open.
+        """
+        body, headers = prepare_request(self.token, body, headers, self.gzip_min_bytes)
+        if self.breaker is not None:
+            self.breaker.check()
+
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                status, data = self._send_once(method, path, body, headers)
+            except (OSError, http.client.HTTPException) as e:
+                # socket.timeout, refused/reset connections, malformed responses
+                _record_outcome(self.breaker, None)
+                if not _may_retry(self, attempt, started):
+                    raise IngestConnectionError(str(e)) from e
+            else:
+                _record_outcome(self.breaker, status)
+                if 200 <= status < 300:
+                    return status, data
+                if status < 500 or not _may_retry(self, attempt, started):
+                    raise IngestHTTPError(status, data.decode("utf-8", errors="replace"))
+            attempt += 1
+            _stop_if_open(self.breaker)
+            time.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_max))
+
+    def post_json(self, path: str, payload_bytes: bytes, idempotency_key: Optional[str] = None) -> Dict:
+        """POST an already-serialised JSON body and return the decoded response."""
+        _, data = self.request("POST", path, body=payload_bytes, headers=json_headers(idempotency_key))
+        return json.loads(data.decode("utf-8"))
+
+    def health(self) -> bool:
+        """One GET /health, bypassing retries and the breaker; True if it answered 2xx."""
+        try:
+            status, _ = self._send_once("GET", "/health", None, {"Authorization": f"Bearer {self.token}"})
+        except (OSError, http.client.HTTPException):
+            return False
+        return 200 <= status < 300
+
+
+class AsyncIngestClient:
+    """
+    asyncio counterpart of IngestClient (same pooling, retry and gzip rules).
+
+    Built on asyncio streams, so it needs no third-party HTTP library. A client
+    is bound to the event loop it is first used on.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        token: str,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        gzip_min_bytes: int = 64 * 1024,
+        pool_size: int = 4,
+        breaker=None,
+        retry_budget: float = 45.0
+    ):
+        parts = urllib.parse.urlsplit(base_url)
+        self.scheme = parts.scheme or "http"
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or (443 if self.scheme == "https" else 80)
+        self.base_path = parts.path.rstrip("/")
+        self.token = token
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.gzip_min_bytes = gzip_min_bytes
+        self.breaker = breaker
+        self.pool_size = pool_size
+        self._pool: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def _open(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        ssl_context = ssl.create_default_context() if self.scheme == "https" else None
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=ssl_context),
+            self.connect_timeout
+        )
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return reader, writer
+
+    def _release(self, conn: Tuple[asyncio.StreamReader, asyncio.StreamWriter]):
+        if len(self._pool) < self.pool_size:
+            self._pool.append(conn)
+        else:
+            conn[1].close()
+
+    async def close(self):
+        """Close all idle pooled connections."""
+        pool, self._pool = self._pool, []
+        for _, writer in pool:
+            writer.close()
+
+    async def _exchange(self, conn, method: str, path: str, body: Optional[bytes], headers: Dict):
+        reader, writer = conn
+        host = self.host if self.port in (80, 443) else f"{self.host}:{self.port}"
+        lines = [f"{method} {self.base_path + path} HTTP/1.1", f"Host: {host}"]
+        lines += [f"{k}: {v}" for k, v in headers.items()]
+        lines.append(f"Content-Length: {len(body) if body is not None else 0}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body or b""))
+        await writer.drain()
+        return await asyncio.wait_for(_read_response(reader, method), self.read_timeout)
+
+    async def _send_once(self, method: str, path: str, body: Optional[bytes], headers: Dict) -> Tuple[int, bytes]:
+        reused = bool(self._pool)
+        conn = self._pool.pop() if reused else await self._open()
+        try:
+            try:
+                status, response_headers, data = await self._exchange(conn, method, path, body, headers)
+            except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError):
+                if not reused:
+                    raise
+                # Idle keep-alive connection was closed by the server; resend once
+                conn[1].close()
+                conn = await self._open()
+                status, response_headers, data = await self._exchange(conn, method, path, body, headers)
+        except BaseException:
+            conn[1].close()
+            raise
+
+        if response_headers.get("connection", "").lower() == "close":
+            conn[1].close()
+        else:
+            self._release(conn)
+        return status, decode_content(response_headers.get("content-encoding"), data)
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> Tuple[int, bytes]:
+        """Async version of IngestClient.request (same retries, retry budget, errors and breaker)."""
+        body, headers = prepare_request(self.token, body, headers, self.gzip_min_bytes)
+        if self.breaker is not None:
+            self.breaker.check()
+
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                status, data = await self._send_once(method, path, body, headers)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                _record_outcome(self.breaker, None)
+                if not _may_retry(self, attempt, started):
+                    raise IngestConnectionError(str(e) or type(e).__name__) from e
+            else:
+                _record_outcome(self.breaker, status)
+                if 200 <= status < 300:
+                    return status, data
+                if status < 500 or not _may_retry(self, attempt, started):
+                    raise IngestHTTPError(status, data.decode("utf-8", errors="replace"))
+            attempt += 1
+            _stop_if_open(self.breaker)
+            await asyncio.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_max))
+
+    async def post_json(self, path: str, payload_bytes: bytes, idempotency_key: Optional[str] = None) -> Dict:
+        """POST an already-serialised JSON body and return the decoded response."""
+        _, data = await self.request("POST", path, body=payload_bytes, headers=json_headers(idempotency_key))
+        return json.loads(data.decode("utf-8"))
+
+
+async def _read_head(reader: asyncio.StreamReader) -> Tuple[str, int, Dict[str, str]]:
+    """Read a status line and headers: (HTTP version, status, lower-cased headers)."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise asyncio.IncompleteReadError(b"", None)
+    parts = status_line.decode("latin-1").split(" ", 2)
+    if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+        raise ValueError(f"Malformed status line: {status_line!r}")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return parts[0], int(parts[1]), headers
+
+
+async def _read_response(reader: asyncio.StreamReader, method: str = "GET") -> Tuple[int, Dict[str, str], bytes]:
+    """
+    Read one HTTP/1.1 response: (status, lower-cased headers, body).
+
+    Interim 1xx responses are skipped. 1xx, 204, 304 and HEAD responses have
+    no body whatever their headers say. A body delimited only by EOF (and an
+    HTTP/1.0 response without keep-alive) marks the connection "close", so
+    it is never pooled.
+    """
+    version, status, headers = await _read_head(reader)
+    while 100 <= status < 200 and status != 101:
+        version, status, headers = await _read_head(reader)
+    if status == 101 or (version == "HTTP/1.0" and headers.get("connection", "").lower() != "keep-alive"):
+        headers["connection"] = "close"
+
+    if method == "HEAD" or status < 200 or status in (204, 304):
+        body = b""
+    elif headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";", 1)[0].strip(), 16)
+            if size == 0:
+                # Skip trailers up to the terminating blank line
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)  # CRLF after each chunk
+        body = b"".join(chunks)
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    else:
+        body = await reader.read()
+        headers["connection"] = "close"
+    return status, headers, body
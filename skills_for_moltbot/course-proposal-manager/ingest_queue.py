@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Ingest Queue - Durable ingest jobs with a background worker.
+
+Approvals are written to the `ingest_jobs` table (next to `proposals`) and
+drained by IngestWorker with bounded concurrency, so the Telegram callback path
+only pays for one INSERT. Jobs survive restarts: a job left 'running' by a
+crashed worker is picked up again once its lease expires. While the ingest
+circuit breaker is open the worker stops claiming jobs, and a job that hits
+the open breaker goes back to 'queued' without counting as an attempt. A job
+whose proposal another caller is already ingesting finishes as a no-op; that
+caller reports the outcome.
+"""
+
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ingest_client import CircuitOpenError
+from proposal_manager import IngestInProgressError, get_store, ingest_proposal, ingest_service_available
+
+# Called as on_complete(job, result, error) when a job finishes; exactly one of
+# result / error is set
+CompletionCallback = Callable[[Dict, Optional[Dict], Optional[str]], None]
+
+JOB_COLUMNS = (
+    "job_id", "proposal_id", "chat_id", "status", "attempts",
+    "lease_expires_at", "last_error", "result_json", "created_at", "finished_at"
+)
+
+# Worker running in this process, if any (see start_worker)
+_worker: Optional["IngestWorker"] = None
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_ingest(proposal_id: str, chat_id: Optional[str] = None) -> Tuple[int, bool]:
+    """
+    Queue an ingest job for a proposal.
+
+    Returns (job_id, created). If the proposal already has a queued or running
+    job, that job's ID is returned with created=False.
+    """
+    with get_store().transaction() as conn:
+        row = conn.execute("""
+            SELECT job_id FROM ingest_jobs
+            WHERE proposal_id = ? AND status IN ('queued', 'running')
+        """, (proposal_id,)).fetchone()
+        if row:
+            return row[0], False
+        job_id = conn.execute(
+            "INSERT INTO ingest_jobs (proposal_id, chat_id) VALUES (?, ?) RETURNING job_id",
+            (proposal_id, chat_id)
+        ).fetchone()[0]
+
+    if _worker is not None:
+        _worker.notify()
+    return job_id, True
+
+
+def get_job(job_id: int) -> Optional[Dict]:
+    """Get an ingest job by ID."""
+    row = get_store().fetchone(
+        f"SELECT {', '.join(JOB_COLUMNS)} FROM ingest_jobs WHERE job_id = ?",
+        (job_id,)
+    )
+    return dict(zip(JOB_COLUMNS, row)) if row else None
+
+
+def claim_jobs(limit: int, lease_seconds: float) -> List[Dict]:
+    """
+    Atomically move up to `limit` runnable jobs to 'running' and return them.
+
+    Runnable means queued, or running with an expired lease (worker crashed).
+    """
+    now = datetime.now()
+    lease_expires_at = (now + timedelta(seconds=lease_seconds)).isoformat()
+    with get_store().transaction() as conn:
+        rows = conn.execute(f"""
+            SELECT {', '.join(JOB_COLUMNS)} FROM ingest_jobs
+            WHERE status = 'queued'
+               OR (status = 'running' AND lease_expires_at < ?)
+            ORDER BY job_id
+            LIMIT ?
+        """, (now.isoformat(), limit)).fetchall()
+        jobs = [dict(zip(JOB_COLUMNS, row)) for row in rows]
+        conn.executemany("""
+            UPDATE ingest_jobs
+            SET status = 'running', attempts = attempts + 1, lease_expires_at = ?
+            WHERE job_id = ?
+        """, [(lease_expires_at, job["job_id"]) for job in jobs])
+    for job in jobs:
+        job["status"] = "running"
+        job["attempts"] += 1
+        job["lease_expires_at"] = lease_expires_at
+    return jobs
+
+
+def _finish_job(job_id: int, result: Optional[Dict], error: Optional[str]):
+    get_store().execute("""
+        UPDATE ingest_jobs
+        SET status = ?, result_json = ?, last_error = ?, finished_at = ?, lease_expires_at = NULL
+        WHERE job_id = ?
+    """, (
+        "done" if error is None else "failed",
+        json.dumps(result) if result is not None else None,
+        error,
+        datetime.now().isoformat(),
+        job_id
+    ))
+
+
+def _requeue_job(job_id: int):
+    """Return a claimed job to the queue, as if it had never been attempted."""
+    get_store().execute("""
+        UPDATE ingest_jobs
+        SET status = 'queued', attempts = attempts - 1, lease_expires_at = NULL
+        WHERE job_id = ? AND status = 'running'
+    """, (job_id,))
+
+
+def run_job(job: Dict, on_complete: Optional[CompletionCallback] = None):
+    """Ingest one claimed job, record the outcome and notify on_complete."""
+    result = None
+    error = None
+    try:
+        result = ingest_proposal(job["proposal_id"])
+    except CircuitOpenError:
+        # Ingest service is down; retry once the breaker closes
+        _requeue_job(job["job_id"])
+        job["status"] = "queued"
+        return
+    except IngestInProgressError:
+        # Someone else holds the proposal's lease (a direct tap, another
+        # worker); requeueing would only spin until it expires
+        _finish_job(job["job_id"], None, None)
+        job["status"] = "done"
+        return
+    except Exception as e:
+        error = str(e)
+    _finish_job(job["job_id"], result, error)
+    job["status"] = "done" if error is None else "failed"
+    if on_complete is not None:
+        on_complete(job, result, error)
+
+
+class IngestWorker:
+    """Background thread that drains ingest_jobs with bounded concurrency."""
+
+    def __init__(
+        self,
+        on_complete: Optional[CompletionCallback] = None,
+        concurrency: int = 2,
+        poll_interval: float = 1.0,
+        lease_seconds: float = 300.0
+    ):
+        self.on_complete = on_complete
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._slots = threading.Semaphore(concurrency)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ingest-job")
+        self._thread = threading.Thread(target=self._loop, name="ingest-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True):
+        """Stop claiming jobs; with wait=True, let in-flight jobs finish."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def notify(self):
+        """Wake the worker (a job was enqueued)."""
+        self._wake.set()
+
+    def _run(self, job: Dict):
+        try:
+            run_job(job, self.on_complete)
+        finally:
+            self._slots.release()
+            self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            if not ingest_service_available():
+                # Breaker open (this call also schedules its /health probe);
+                # closing it wakes us
+                self._wake.wait(self.poll_interval)
+                continue
+            # Claim only as many jobs as there are free slots
+            free = 0
+            while self._slots.acquire(blocking=False):
+                free += 1
+            try:
+                jobs = claim_jobs(free, self.lease_seconds) if free else []
+            except Exception:
+                # Database busy or unavailable; give the slots back and retry
+                logger.warning("Claiming ingest jobs failed", exc_info=True)
+                jobs = []
+            for _ in range(free - len(jobs)):
+                self._slots.release()
+            for job in jobs:
+                self._executor.submit(self._run, job)
+            if not jobs or len(jobs) < free:
+                self._wake.wait(self.poll_interval)
+
+
+def start_worker(on_complete: Optional[CompletionCallback] = None, **kwargs) -> IngestWorker:
+    """Start (or return) this process's ingest worker."""
+    global _worker
+    if _worker is None or not _worker.running:
+        _worker = IngestWorker(on_complete, **kwargs)
+        _worker.start()
+    return _worker
+
+
+def stop_worker(wait: bool = True):
+    """Stop this process's ingest worker, if one is running."""
+    global _worker
+    if _worker is not None:
+        _worker.stop(wait=wait)
+        _worker = None
+
+
+def get_worker() -> Optional[IngestWorker]:
+    """Return this process's running ingest worker, or None."""
+    return _worker if _worker is not None and _worker.running else None
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+JSON Document - The View JSON file, streamed instead of built in memory.
+
+json_document() returns the "file" part of a send_file instruction. It holds
+a lazy byte source rather than the document bytes:
+
+  - pretty-printed output (the default) is encoded incrementally from the
+    parsed payload, never as one string; the parse is a one-off copy, not
+    cached on the (possibly cached) proposal
+  - with PROPOSAL_JSON_PRETTY=false the stored compact JSON is sent as is,
+    inflated straight from the database column without parsing it
+  - payloads whose stored JSON is PROPOSAL_JSON_GZIP_MIN_BYTES or larger
+    are gzipped on the fly and sent as NAME.json.gz
+  - open() spools the bytes into a temp file that stays in memory up to
+    PROPOSAL_JSON_SPOOL_BYTES and moves to disk beyond that
+
+So a view_json request holds at most one chunk plus the spool's memory
+budget, whatever the size of the course.
+
+    file = instruction["file"]
+    with file["open"]() as document:           # rewound binary file
+        send_document(chat_id, document=document, filename=file["filename"])
+
+    for chunk in file["chunks"]():             # or stream the bytes
+        ...
+"""
+
+import json
+import os
+import tempfile
+import zlib
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional
+
+# Pretty-print (indent=2) or send the stored compact JSON unchanged
+PROPOSAL_JSON_PRETTY = os.getenv("PROPOSAL_JSON_PRETTY", "true").lower() == "true"
+# Gzip the file at or above this stored payload size (0 disables)
+PROPOSAL_JSON_GZIP_MIN_BYTES = int(os.getenv("PROPOSAL_JSON_GZIP_MIN_BYTES", str(1024 * 1024)))
+# Spooled file size kept in memory before it is moved to disk
+PROPOSAL_JSON_SPOOL_BYTES = int(os.getenv("PROPOSAL_JSON_SPOOL_BYTES", str(1024 * 1024)))
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _batched(pieces: Iterable[str], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Join the encoder's small string pieces into UTF-8 chunks of ~chunk_size."""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield "".join(buffer).encode('utf-8')
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer).encode('utf-8')
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip a byte stream incrementally."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def spool(chunks: Iterable[bytes], max_size: int = PROPOSAL_JSON_SPOOL_BYTES) -> BinaryIO:
+    """Write a byte stream to a spooled temp file and return it rewound (caller closes)."""
+    document = tempfile.SpooledTemporaryFile(max_size=max_size)
+    try:
+        for chunk in chunks:
+            document.write(chunk)
+    except BaseException:
+        document.close()
+        raise
+    document.seek(0)
+    return document
+
+
+def json_document(
+    proposal: Dict,
+    pretty: Optional[bool] = None,
+    gzip_min_bytes: Optional[int] = None,
+    spool_bytes: Optional[int] = None
+) -> Dict:
+    """
+    Describe a proposal's payload as a lazily produced file.
+
+    Returns:
+        {
+            "filename": str,            # COURSE_ID.json, or .json.gz when gzipped
+            "content_type": str,
+            "gzip": bool,
+            "chunks": () -> Iterator[bytes],
+            "open": () -> BinaryIO      # spooled and rewound; close it when done
+        }
+    """
+    pretty = PROPOSAL_JSON_PRETTY if pretty is None else pretty
+    gzip_min_bytes = PROPOSAL_JSON_GZIP_MIN_BYTES if gzip_min_bytes is None else gzip_min_bytes
+    spool_bytes = PROPOSAL_JSON_SPOOL_BYTES if spool_bytes is None else spool_bytes
+
+    course_id = proposal["summary"].get("course_id") or proposal.decode_payload()["course"]["id"]
+    compressed = bool(gzip_min_bytes) and proposal.payload_size() >= gzip_min_bytes
+
+    def chunks() -> Iterator[bytes]:
+        if pretty:
+            source = _batched(json.JSONEncoder(indent=2).iterencode(proposal.decode_payload()))
+        else:
+            source = proposal.payload_chunks(CHUNK_SIZE)
+        return gzip_chunks(source) if compressed else source
+
+    def open_document() -> BinaryIO:
+        return spool(chunks(), spool_bytes)
+
+    return {
+        "filename": f"{course_id}.json.gz" if compressed else f"{course_id}.json",
+        "content_type": "application/gzip" if compressed else "application/json",
+        "gzip": compressed,
+        "chunks": chunks,
+        "open": open_document
+    }
@@ -13,7 +13,7 @@ from pathlib import Path
 hook_dir = Path(__file__).parent
 sys.path.insert(0, str(hook_dir))
 
-from callback_handler import handle_telegram_callback_message
+from callback_handler import CALLBACK_PREFIX, handle_telegram_callback_message
 
 
 def message_received_hook(message):
@@ -35,10 +35,11 @@ def message_received_hook(message):
             - handled: bool - True if message was handled, False to continue processing
             - response: Optional dict with Telegram API calls to make
     """
-    text = message.get("text", "")
+    text = message.get("text") or ""
     
-    # Only handle proposal: prefixed messages
-    if not text.startswith("proposal:"):
+    # Only handle proposal: prefixed messages; everything else in a busy chat
+    # costs this one prefix check
+    if not text.startswith(CALLBACK_PREFIX):
         return {"handled": False}
     
     # Extract message details
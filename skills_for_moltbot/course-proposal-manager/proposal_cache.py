@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Proposal Cache - Bounded in-process LRU cache of decoded proposals.
+
+proposal_manager reads through this cache and invalidates entries on every
+write it makes, so one Telegram tap costs at most one DB read. Entries also
+expire after a short TTL to bound staleness from writes made by other
+processes sharing the database.
+
+A reader that missed takes generation() before its DB read and passes it to
+put(). Every invalidation bumps the generation, so a row read before a
+concurrent write is dropped instead of being cached for a full TTL (at the
+cost of an occasional skipped fill while other proposals are written).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+
+class ProposalCache:
+    """Thread-safe LRU cache keyed by proposal_id, with hit/miss/eviction counters."""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._generation = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, proposal_id: str) -> Optional[Dict]:
+        """Return the cached proposal (marking it recently used), or None."""
+        with self._lock:
+            entry = self._entries.get(proposal_id)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(proposal_id)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[proposal_id]
+            self.misses += 1
+            return None
+
+    def generation(self) -> int:
+        """The invalidation count; take it before reading a proposal to put()."""
+        with self._lock:
+            return self._generation
+
+    def put(self, proposal_id: str, proposal: Dict, generation: Optional[int] = None):
+        """Cache a proposal, unless anything was invalidated since `generation`."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[proposal_id] = (proposal, time.monotonic())
+            self._entries.move_to_end(proposal_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, proposal_ids: Iterable[str]) -> int:
+        """Drop entries and return the new generation."""
+        with self._lock:
+            self._generation += 1
+            for proposal_id in proposal_ids:
+                self._entries.pop(proposal_id, None)
+            return self._generation
+
+    def clear(self) -> int:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            return self._generation
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self.maxsize
+            }
@@ -2,129 +2,366 @@
 """
 Course Proposal Manager - Handles confirm-then-ingest workflow for golf courses.
 
-Stores proposals in SQLite, handles ingestion, and manages proposal lifecycle.
+Stores proposals in SQLite (or Postgres, see proposal_store.open_store),
+handles ingestion, and manages proposal lifecycle.
 """
 
 import os
 import json
-import sqlite3
-import urllib.request
-import urllib.error
 import hashlib
+import logging
+import time
+import zlib
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Iterator, Optional, Dict, List, Tuple
 import uuid
 
+import canonical_hash
+from circuit_breaker import CircuitBreaker
+from ingest_client import CircuitOpenError, IngestClient, IngestError
+from proposal_cache import ProposalCache
+from proposal_store import ProposalStore, allocate_sequence, open_store
+
+logger = logging.getLogger(__name__)
+
 # Database path
-DB_PATH = Path("/home/node/clawd/data/course_proposals.db")
+DB_PATH = Path(os.getenv("PROPOSALS_DB_PATH", "/home/node/clawd/data/course_proposals.db"))
 DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
+# Lock contention between processes sharing the database: seconds to wait for
+# the write lock, then how many more times to retry a busy statement
+PROPOSALS_BUSY_TIMEOUT = float(os.getenv("PROPOSALS_BUSY_TIMEOUT", "10"))
+PROPOSALS_WRITE_RETRIES = int(os.getenv("PROPOSALS_WRITE_RETRIES", "3"))
+
+# postgresql://... to share one Postgres database between gateway replicas
+# instead of the local SQLite file (needs psycopg2)
+PROPOSALS_DATABASE_URL = os.getenv("PROPOSALS_DATABASE_URL", "")
+PROPOSALS_PG_POOL_SIZE = int(os.getenv("PROPOSALS_PG_POOL_SIZE", "5"))
+
+# Shared store (one connection or pool per process), see get_store()
+_store: Optional[ProposalStore] = None
+
+# Decoded proposals by ID; every write below invalidates the rows it touches
+PROPOSAL_CACHE_SIZE = int(os.getenv("PROPOSAL_CACHE_SIZE", "256"))
+PROPOSAL_CACHE_TTL = float(os.getenv("PROPOSAL_CACHE_TTL", "30"))
+_cache = ProposalCache(PROPOSAL_CACHE_SIZE, PROPOSAL_CACHE_TTL)
+
 # Environment variables
 COURSE_INGEST_URL = os.getenv("COURSE_INGEST_URL", "http://host.docker.internal:8088")
 # Fallback token for testing if env var not set (matches docker-compose.courses.yml AUTH_TOKEN)
 COURSE_INGEST_TOKEN = os.getenv("COURSE_INGEST_TOKEN") or "8-iVeTs0dZWb_Hw3PtzXV14wJlEkw3t29BzJw52Qc5Y"
 AUTO_INGEST = os.getenv("AUTO_INGEST", "false").lower() == "true"
+COURSE_INGEST_CONNECT_TIMEOUT = float(os.getenv("COURSE_INGEST_CONNECT_TIMEOUT", "5"))
+COURSE_INGEST_READ_TIMEOUT = float(os.getenv("COURSE_INGEST_READ_TIMEOUT", "30"))
+COURSE_INGEST_MAX_RETRIES = int(os.getenv("COURSE_INGEST_MAX_RETRIES", "3"))
+# No retry starts unless it could time out within this many seconds of the
+# first attempt (0 disables), so a hung server costs about one read timeout
+COURSE_INGEST_RETRY_BUDGET = float(os.getenv("COURSE_INGEST_RETRY_BUDGET", "45"))
+# Request bodies at least this large are sent gzip-compressed (0 disables)
+COURSE_INGEST_GZIP_MIN_BYTES = int(os.getenv("COURSE_INGEST_GZIP_MIN_BYTES", str(64 * 1024)))
+
+# Batch ingest bounds: proposals per request and uncompressed body size
+# (course-ingest's Fastify bodyLimit is 1 MiB)
+COURSE_INGEST_BATCH_SIZE = int(os.getenv("COURSE_INGEST_BATCH_SIZE", "25"))
+COURSE_INGEST_BATCH_MAX_BYTES = int(os.getenv("COURSE_INGEST_BATCH_MAX_BYTES", str(768 * 1024)))
+
+# Shared keep-alive client, see get_ingest_client()
+_ingest_client: Optional[IngestClient] = None
+
+# Consecutive failed ingest attempts that open the circuit breaker (0 disables),
+# and seconds between /health probes while it is open
+COURSE_INGEST_BREAKER_THRESHOLD = int(os.getenv("COURSE_INGEST_BREAKER_THRESHOLD", "5"))
+COURSE_INGEST_BREAKER_RESET = float(os.getenv("COURSE_INGEST_BREAKER_RESET", "30"))
+
+# Shared by the sync and async clients, see get_ingest_breaker()
+_ingest_breaker: Optional[CircuitBreaker] = None
+
+# Payload JSON at least this long is stored zlib-compressed (0 disables)
+PAYLOAD_COMPRESS_MIN_BYTES = int(os.getenv("PROPOSALS_COMPRESS_MIN_BYTES", "4096"))
+
+# Sequence numbers to try before giving up on a colliding proposal ID
+MAX_ID_ATTEMPTS = 5
+
+# Seconds an 'ingesting' claim is honoured; a caller that dies mid-ingest
+# blocks further attempts for at most this long
+PROPOSALS_INGEST_LEASE = float(os.getenv("PROPOSALS_INGEST_LEASE", "300"))
+
+
+class IngestInProgressError(Exception):
+    """Another caller holds the proposal's ingest lease."""
+
+
+def get_store() -> ProposalStore:
+    """Return the process-wide proposal store (opened lazily)."""
+    global _store
+    if _store is None:
+        _store = open_store(
+            DB_PATH, PROPOSALS_DATABASE_URL,
+            PROPOSALS_BUSY_TIMEOUT, PROPOSALS_WRITE_RETRIES, PROPOSALS_PG_POOL_SIZE
+        )
+    return _store
+
+
+def ingest_client_options() -> Dict:
+    """Constructor arguments for IngestClient / AsyncIngestClient from the environment."""
+    return {
+        "base_url": COURSE_INGEST_URL,
+        "token": COURSE_INGEST_TOKEN,
+        "connect_timeout": COURSE_INGEST_CONNECT_TIMEOUT,
+        "read_timeout": COURSE_INGEST_READ_TIMEOUT,
+        "max_retries": COURSE_INGEST_MAX_RETRIES,
+        "retry_budget": COURSE_INGEST_RETRY_BUDGET,
+        "gzip_min_bytes": COURSE_INGEST_GZIP_MIN_BYTES,
+        "breaker": get_ingest_breaker()
+    }
+
+
+def get_ingest_breaker() -> CircuitBreaker:
+    """Return the process-wide circuit breaker for COURSE_INGEST_URL."""
+    global _ingest_breaker
+    if _ingest_breaker is None:
+        _ingest_breaker = CircuitBreaker(
+            COURSE_INGEST_BREAKER_THRESHOLD,
+            COURSE_INGEST_BREAKER_RESET,
+            probe=lambda: get_ingest_client().health(),
+            on_close=_wake_ingest_worker
+        )
+    return _ingest_breaker
+
+
+def _wake_ingest_worker():
+    """Let this process's ingest worker drain jobs queued during an outage."""
+    import ingest_queue  # Imports this module; only needed once the service recovers
+    worker = ingest_queue.get_worker()
+    if worker is not None:
+        worker.notify()
+
+
+def ingest_service_available() -> bool:
+    """
+    False while the ingest circuit breaker is open (never blocks).
+    
+    Callers should not attempt the ingest: queue it (ingest_queue.enqueue_ingest)
+    if an ingest worker will run it, otherwise report the service unavailable
+    and leave the proposal as it is.
+    """
+    return get_ingest_breaker().allow()
+
+
+def get_ingest_client() -> IngestClient:
+    """Return the process-wide keep-alive client for COURSE_INGEST_URL."""
+    global _ingest_client
+    if _ingest_client is None:
+        _ingest_client = IngestClient(**ingest_client_options())
+    return _ingest_client
 
 
 def init_db():
     """Initialize the proposals database."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS proposals (
-            proposal_id TEXT PRIMARY KEY,
-            payload_json TEXT NOT NULL,
-            payload_hash TEXT,
-            course_name TEXT,
-            city TEXT,
-            state TEXT,
-            created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            expires_at TIMESTAMPTZ NOT NULL,
-            status TEXT DEFAULT 'pending',
-            ingested_at TIMESTAMPTZ,
-            snapshot_id TEXT,
-            course_id TEXT,
-            agent_label TEXT,
-            run_id TEXT,
-            proposal_message_id INTEGER,
-            proposal_chat_id TEXT
-        )
-    """)
-    # Add payload_hash column if it doesn't exist (migration)
-    try:
-        conn.execute("ALTER TABLE proposals ADD COLUMN payload_hash TEXT")
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    # Add proposal_message_id and proposal_chat_id if they don't exist (migration)
-    try:
-        conn.execute("ALTER TABLE proposals ADD COLUMN proposal_message_id INTEGER")
-        conn.execute("ALTER TABLE proposals ADD COLUMN proposal_chat_id TEXT")
-    except sqlite3.OperationalError:
-        pass  # Columns already exist
-    conn.execute("CREATE INDEX IF NOT EXISTS proposals_status_idx ON proposals(status)")
-    conn.execute("CREATE INDEX IF NOT EXISTS proposals_expires_at_idx ON proposals(expires_at)")
-    conn.commit()
-    conn.close()
+    get_store().connection()
 
 
-def generate_proposal_id(course_json: Dict) -> str:
-    """Generate a human-readable proposal ID."""
+def proposal_id_prefix(course_json: Dict) -> str:
+    """Return the two-letter proposal ID prefix for a course payload."""
     course_id = course_json.get("course", {}).get("id", "")
     if course_id:
         # Extract prefix from course_id (e.g., "course_royal_scot" -> "RS")
         parts = course_id.replace("course_", "").split("_")
-        prefix = "".join([p[0].upper() for p in parts[:2]])[:2]
-    else:
-        prefix = "CO"
-    
-    date_str = datetime.now().strftime("%Y%m%d")
-    
-    # Get next sequence number for today
-    conn = sqlite3.connect(DB_PATH)
-    today_prefix = f"{prefix}-{date_str}-"
-    count = conn.execute(
-        "SELECT COUNT(*) FROM proposals WHERE proposal_id LIKE ?",
-        (f"{today_prefix}%",)
-    ).fetchone()[0]
-    conn.close()
-    
-    seq = count + 1
+        return "".join([p[0].upper() for p in parts[:2]])[:2]
+    return "CO"
+
+
+def _next_proposal_id(conn, prefix: str, date_str: str) -> str:
+    """Allocate the next ID for prefix+date inside the caller's transaction."""
+    seq = allocate_sequence(conn, prefix, date_str)
     return f"{prefix}-{date_str}-{seq:03d}"
 
 
+def generate_proposal_id(course_json: Dict) -> str:
+    """Generate (and reserve) a human-readable proposal ID."""
+    prefix = proposal_id_prefix(course_json)
+    date_str = datetime.now().strftime("%Y%m%d")
+    with get_store().transaction() as conn:
+        return _next_proposal_id(conn, prefix, date_str)
+
+
+def document_json(payload: Dict) -> str:
+    """
+    Serialise a payload for storage: compact, but keys and numbers as given.
+
+    This is what View JSON shows and what is POSTed; course-ingest normalises
+    it before hashing, so only payload_hash needs the canonical form.
+    """
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False)
+
+
 def compute_payload_hash(payload: Dict) -> str:
     """Compute a deterministic hash of the payload for idempotency."""
-    # Normalize JSON (sort keys, no whitespace) for consistent hashing
-    normalized = json.dumps(payload, sort_keys=True, separators=(',', ':'))
-    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+    # Streams the canonical form into the hash; never builds the whole string
+    return canonical_hash.canonical_hash(payload)
 
 
-def create_proposal(
+def encode_payload_json(document: str):
+    """Return the stored form of a payload: text, or zlib bytes (BLOB) when large."""
+    if not get_store().compress_payloads:
+        return document
+    if PAYLOAD_COMPRESS_MIN_BYTES and len(document) >= PAYLOAD_COMPRESS_MIN_BYTES:
+        return zlib.compress(document.encode('utf-8'), 6)
+    return document
+
+
+def decode_payload_json(stored) -> str:
+    """Inverse of encode_payload_json: the stored payload as JSON text."""
+    if isinstance(stored, bytes):
+        return zlib.decompress(stored).decode('utf-8')
+    return stored or ""
+
+
+class Proposal(dict):
+    """
+    Proposal row as a dict, with the payload decoded lazily.
+
+    "payload_json" (JSON text) and "payload" (parsed dict) are only
+    decompressed / parsed the first time they are read, so actions that
+    never look at the payload (skip, status checks) don't pay for it.
+    "summary" (see proposal_summary) comes from the stored summary_json;
+    only rows created before it existed derive it from the payload.
+    """
+
+    LAZY_KEYS = ("payload_json", "payload", "summary")
+
+    def __init__(self, row: Dict):
+        stored = row.pop("payload_json", None)
+        super().__init__(row)
+        self._stored_payload = stored
+        self._payload_size = None
+
+    def payload_bytes(self) -> bytes:
+        """Stored payload JSON as UTF-8 bytes (no parse)."""
+        return self["payload_json"].encode('utf-8')
+
+    def payload_chunks(self, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """
+        Stored payload JSON as UTF-8 chunks, without building the whole text.
+        
+        Compressed payloads are inflated `chunk_size` bytes at a time.
+        """
+        if dict.__contains__(self, "payload_json") or not isinstance(self._stored_payload, bytes):
+            text = self["payload_json"]
+            for start in range(0, len(text), chunk_size):
+                yield text[start:start + chunk_size].encode('utf-8')
+            return
+        decompressor = zlib.decompressobj()
+        data = self._stored_payload
+        while data:
+            chunk = decompressor.decompress(data, chunk_size)
+            data = decompressor.unconsumed_tail
+            if chunk:
+                yield chunk
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+    def payload_size(self) -> int:
+        """Size in bytes of the stored payload JSON (streamed, not materialised)."""
+        if self._payload_size is None:
+            self._payload_size = sum(len(chunk) for chunk in self.payload_chunks())
+        return self._payload_size
+
+    def decode_payload(self) -> Dict:
+        """
+        Parse the payload without keeping the result on the proposal.
+
+        For one-off reads (the View JSON file) of proposals that may sit in
+        the proposal cache: self["payload"] would pin the parsed dict there.
+        """
+        if dict.__contains__(self, "payload"):
+            return self["payload"]
+        data = b"".join(self.payload_chunks())
+        return json.loads(data) if data else {}
+
+    def __missing__(self, key):
+        if key == "payload_json":
+            value = decode_payload_json(self._stored_payload)
+        elif key == "payload":
+            payload_json = self["payload_json"]
+            value = json.loads(payload_json) if payload_json else {}
+        elif key == "summary":
+            summary_json = super().get("summary_json")
+            value = json.loads(summary_json) if summary_json else proposal_summary(self["payload"])
+        else:
+            raise KeyError(key)
+        self[key] = value
+        return value
+
+    def get(self, key, default=None):
+        if key in self.LAZY_KEYS:
+            return self[key]
+        return super().get(key, default)
+
+    def __contains__(self, key):
+        return key in self.LAZY_KEYS or super().__contains__(key)
+
+
+# Fixed projection for proposal lookups (no catalog read or SELECT * per call)
+PROPOSAL_COLUMNS = (
+    "proposal_id", "payload_json", "payload_hash", "course_name", "city", "state",
+    "created_at", "expires_at", "status", "ingested_at", "snapshot_id", "course_id",
+    "agent_label", "run_id", "proposal_message_id", "proposal_chat_id", "summary_json"
+)
+SELECT_PROPOSAL_SQL = f"SELECT {', '.join(PROPOSAL_COLUMNS)} FROM proposals WHERE proposal_id = ?"
+
+INSERT_PROPOSAL_SQL = """
+    INSERT INTO proposals (
+        proposal_id, payload_json, payload_hash, course_name, city, state,
+        expires_at, agent_label, run_id, proposal_message_id, proposal_chat_id, summary_json
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _insert_proposal(conn, prefix: str, date_str: str, values: tuple) -> str:
+    """Insert one proposal row (everything but the ID) and return its new ID."""
+    integrity_error = get_store().IntegrityError
+    for _ in range(MAX_ID_ATTEMPTS):
+        proposal_id = _next_proposal_id(conn, prefix, date_str)
+        # Savepoint per attempt: Postgres aborts the whole transaction on a
+        # failed statement unless it is rolled back to a savepoint
+        conn.execute("SAVEPOINT insert_proposal")
+        try:
+            conn.execute(INSERT_PROPOSAL_SQL, (proposal_id,) + values)
+        except integrity_error:
+            # ID taken by a row the counter doesn't know about; take the next one
+            conn.execute("ROLLBACK TO insert_proposal")
+            conn.execute("RELEASE insert_proposal")
+            continue
+        conn.execute("RELEASE insert_proposal")
+        return proposal_id
+    raise RuntimeError(f"Could not allocate a proposal ID for {prefix}-{date_str}")
+
+
+def get_or_create_proposal(
     payload: Dict,
     agent_label: str = "unknown",
     run_id: Optional[str] = None,
     expires_hours: int = 48,
     proposal_message_id: Optional[int] = None,
     proposal_chat_id: Optional[str] = None
-) -> str:
-    """Create a new proposal and return proposal_id."""
-    init_db()
+) -> Tuple[str, bool]:
+    """
+    Create a proposal unless an identical one is already pending.
     
-    proposal_id = generate_proposal_id(payload)
+    Returns (proposal_id, created). When a pending, unexpired proposal has the
+    same payload_hash, its ID is returned with created=False and nothing is
+    inserted, so callers can skip posting a second Telegram message.
+    """
     course = payload.get("course", {})
     payload_hash = compute_payload_hash(payload)
     
-    expires_at = datetime.now() + timedelta(hours=expires_hours)
-    
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("""
-        INSERT INTO proposals (
-            proposal_id, payload_json, payload_hash, course_name, city, state,
-            expires_at, agent_label, run_id, proposal_message_id, proposal_chat_id
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        proposal_id,
-        json.dumps(payload),
+    now = datetime.now()
+    expires_at = now + timedelta(hours=expires_hours)
+    values = (
+        encode_payload_json(document_json(payload)),
         payload_hash,
         course.get("name"),
         course.get("city"),
@@ -133,181 +370,566 @@ def create_proposal(
         agent_label,
         run_id,
         proposal_message_id,
-        proposal_chat_id
-    ))
-    conn.commit()
-    conn.close()
+        proposal_chat_id,
+        encode_summary(payload)
+    )
+    
+    # Dedupe, allocate the ID and insert in one write transaction so concurrent
+    # creators can never hand out the same sequence number or both insert the
+    # same payload
+    with get_store().transaction() as conn:
+        existing = _pending_ids_by_hash(conn, [payload_hash], now)
+        if payload_hash in existing:
+            return existing[payload_hash], False
+        return _insert_proposal(conn, proposal_id_prefix(payload), now.strftime("%Y%m%d"), values), True
+
+
+def create_proposal(
+    payload: Dict,
+    agent_label: str = "unknown",
+    run_id: Optional[str] = None,
+    expires_hours: int = 48,
+    proposal_message_id: Optional[int] = None,
+    proposal_chat_id: Optional[str] = None
+) -> str:
+    """
+    Create a new proposal and return proposal_id.
+    
+    If an identical payload is already pending, that proposal's ID is returned
+    instead (see get_or_create_proposal).
+    """
+    return get_or_create_proposal(
+        payload, agent_label, run_id, expires_hours, proposal_message_id, proposal_chat_id
+    )[0]
+
+
+def _pending_ids_by_hash(conn, payload_hashes: List[str], now: datetime) -> Dict[str, str]:
+    """Map payload_hash -> proposal_id for pending, unexpired proposals."""
+    found = {}
+    unique_hashes = list(dict.fromkeys(payload_hashes))
+    # Chunk to stay under SQLite's bound-parameter limit
+    for i in range(0, len(unique_hashes), 500):
+        chunk = unique_hashes[i:i + 500]
+        placeholders = ",".join("?" * len(chunk))
+        rows = conn.execute(f"""
+            SELECT payload_hash, proposal_id
+            FROM proposals
+            WHERE status = 'pending' AND expires_at > ? AND payload_hash IN ({placeholders})
+            ORDER BY created_at
+        """, [now.isoformat()] + chunk).fetchall()
+        for payload_hash, proposal_id in rows:
+            found.setdefault(payload_hash, proposal_id)
+    return found
+
+
+def create_proposals(
+    payloads: List[Dict],
+    agent_label: str = "unknown",
+    run_id: Optional[str] = None,
+    expires_hours: int = 48
+) -> Dict:
+    """
+    Create proposals for a batch of course payloads in one transaction.
+    
+    Payloads whose hash matches a pending proposal (or an earlier payload in the
+    same batch) are not inserted again.
+    
+    Returns:
+        {
+            "proposal_ids": [str, ...],  # One per payload; the existing ID for duplicates
+            "duplicates": [{"index": int, "proposal_id": str}, ...]
+        }
+    """
+    now = datetime.now()
+    date_str = now.strftime("%Y%m%d")
+    expires_at = (now + timedelta(hours=expires_hours)).isoformat()
+    
+    # Serialise and hash every payload once, outside the write lock
+    rows = []
+    for payload in payloads:
+        course = payload.get("course", {})
+        rows.append((
+            encode_payload_json(document_json(payload)),
+            compute_payload_hash(payload),
+            course.get("name"),
+            course.get("city"),
+            course.get("state"),
+            expires_at,
+            agent_label,
+            run_id,
+            None,
+            None,
+            encode_summary(payload)
+        ))
+    
+    proposal_ids: List[Optional[str]] = [None] * len(payloads)
+    duplicates = []
+    
+    with get_store().transaction() as conn:
+        existing = _pending_ids_by_hash(conn, [r[1] for r in rows], now)
+        
+        # Split into duplicates and new rows grouped by ID prefix
+        first_index_by_hash = {}
+        duplicate_of_index = {}
+        new_by_prefix: Dict[str, List[int]] = {}
+        for i, row in enumerate(rows):
+            payload_hash = row[1]
+            if payload_hash in existing:
+                proposal_ids[i] = existing[payload_hash]
+                duplicates.append({"index": i, "proposal_id": existing[payload_hash]})
+            elif payload_hash in first_index_by_hash:
+                duplicate_of_index[i] = first_index_by_hash[payload_hash]
+            else:
+                first_index_by_hash[payload_hash] = i
+                new_by_prefix.setdefault(proposal_id_prefix(payloads[i]), []).append(i)
+        
+        # Reserve a contiguous block of sequence numbers per prefix
+        for prefix, indexes in new_by_prefix.items():
+            last_seq = allocate_sequence(conn, prefix, date_str, len(indexes))
+            first_seq = last_seq - len(indexes) + 1
+            for seq, i in enumerate(indexes, start=first_seq):
+                proposal_ids[i] = f"{prefix}-{date_str}-{seq:03d}"
+        
+        new_indexes = sorted(first_index_by_hash.values())
+        conn.execute("SAVEPOINT create_proposals")
+        try:
+            conn.executemany(
+                INSERT_PROPOSAL_SQL,
+                [(proposal_ids[i],) + rows[i] for i in new_indexes]
+            )
+        except get_store().IntegrityError:
+            # A reserved ID collided with a row the counter doesn't know about;
+            # fall back to row-by-row inserts that retry with fresh IDs
+            conn.execute("ROLLBACK TO create_proposals")
+            for i in new_indexes:
+                proposal_ids[i] = _insert_proposal(
+                    conn, proposal_id_prefix(payloads[i]), date_str, rows[i]
+                )
+        conn.execute("RELEASE create_proposals")
+        
+        for i, first in duplicate_of_index.items():
+            proposal_ids[i] = proposal_ids[first]
+            duplicates.append({"index": i, "proposal_id": proposal_ids[first]})
     
-    return proposal_id
+    duplicates.sort(key=lambda d: d["index"])
+    return {"proposal_ids": proposal_ids, "duplicates": duplicates}
 
 
 def update_proposal_message_id(proposal_id: str, message_id: int, chat_id: str):
     """Update the stored Telegram message ID for a proposal."""
-    init_db()
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("""
+    get_store().execute("""
         UPDATE proposals
         SET proposal_message_id = ?, proposal_chat_id = ?
         WHERE proposal_id = ?
     """, (message_id, chat_id, proposal_id))
-    conn.commit()
-    conn.close()
+    _cache.invalidate([proposal_id])
 
 
 def get_proposal(proposal_id: str) -> Optional[Dict]:
-    """Get a proposal by ID."""
-    init_db()
-    conn = sqlite3.connect(DB_PATH)
-    
-    # Get column names first (PRAGMA table_info returns: cid, name, type, notnull, dflt_value, pk)
-    cursor = conn.execute("PRAGMA table_info(proposals)")
-    columns = [desc[1] for desc in cursor.fetchall()]  # desc[1] is the column name
-    
-    # Get the row
-    row = conn.execute(
-        "SELECT * FROM proposals WHERE proposal_id = ?",
-        (proposal_id,)
-    ).fetchone()
+    """Get a proposal by ID (served from the in-process cache when hot)."""
+    generation = _cache.generation()
+    proposal = _cache.get(proposal_id)
+    if proposal is not None:
+        return proposal
     
+    row = get_store().fetchone(SELECT_PROPOSAL_SQL, (proposal_id,))
     if not row:
-        conn.close()
         return None
     
-    # Create dict from row
-    proposal = dict(zip(columns, row))
-    conn.close()
-    
-    # Parse payload JSON
-    if "payload_json" in proposal and proposal["payload_json"]:
-        proposal["payload"] = json.loads(proposal["payload_json"])
-    else:
-        proposal["payload"] = {}
-    
+    # Create dict from row (payload is decoded on first access, then cached with it)
+    proposal = Proposal(dict(zip(PROPOSAL_COLUMNS, row)))
+    # Not cached if a write invalidated anything since the read began
+    _cache.put(proposal_id, proposal, generation)
     return proposal
 
 
-def ingest_proposal(proposal_id: str) -> Dict:
-    """Ingest a proposal and return result."""
+def proposal_cache_stats() -> Dict:
+    """Hit/miss/eviction counters and size of the proposal cache."""
+    return _cache.stats()
+
+
+def invalidate_proposal_cache(proposal_ids: Optional[List[str]] = None):
+    """Drop cached proposals (all of them if no IDs are given)."""
+    if proposal_ids is None:
+        _cache.clear()
+    else:
+        _cache.invalidate(proposal_ids)
+
+
+# Status transitions are single conditional UPDATEs (compare-and-set), so
+# concurrent taps can't both act on the same proposal:
+#   pending/failed -> ingesting         claim_ingest, with a lease
+#   ingesting      -> ingested/failed   outcome of the claimed POST
+#   pending/failed -> skipped           skip_proposal
+#   pending        -> expired           cleanup_expired_proposals
+# An 'ingesting' claim whose lease has run out can be claimed again.
+CLAIMABLE_SQL = """
+    (status IN ('pending', 'failed') OR (status = 'ingesting' AND ingest_lease_expires_at < ?))
+"""
+
+
+def claim_ingest(proposal_id: str) -> Tuple[Proposal, Optional[str]]:
+    """
+    Move a proposal to 'ingesting' and return (proposal, lease).
+    
+    Only the caller that wins the claim gets a lease and may POST the
+    ingest_body of the proposal; it then reports the outcome with
+    record_ingested, mark_ingest_failed (POST failed) or release_ingest_claim
+    (nothing sent). An already ingested proposal is returned with lease None;
+    already_ingested_result(proposal) is its ingest result.
+    
+    Raises:
+        IngestInProgressError: Another caller holds an unexpired claim
+        ValueError: The proposal doesn't exist or can't be ingested (skipped, expired)
+    """
+    now = datetime.now()
+    lease = (now + timedelta(seconds=PROPOSALS_INGEST_LEASE)).isoformat()
+    rows = get_store().fetchall(f"""
+        UPDATE proposals
+        SET status = 'ingesting', ingest_lease_expires_at = ?
+        WHERE proposal_id = ? AND {CLAIMABLE_SQL}
+        RETURNING {', '.join(PROPOSAL_COLUMNS)}
+    """, (lease, proposal_id, now.isoformat()))
+    generation = _cache.invalidate([proposal_id])
+    if rows:
+        proposal = Proposal(dict(zip(PROPOSAL_COLUMNS, rows[0])))
+        _cache.put(proposal_id, proposal, generation)
+        return proposal, lease
+    
     proposal = get_proposal(proposal_id)
     if not proposal:
         raise ValueError(f"Proposal {proposal_id} not found")
-    
     if proposal["status"] == "ingested":
-        return {
-            "ok": True,
-            "course_id": proposal["course_id"],
-            "snapshot_id": proposal["snapshot_id"],
-            "already_ingested": True
-        }
-    
-    payload = proposal["payload"]
-    payload_hash = proposal.get("payload_hash") or compute_payload_hash(payload)
+        return proposal, None
+    if proposal["status"] == "ingesting":
+        raise IngestInProgressError(f"Ingest of {proposal_id} is already in progress")
+    raise ValueError(f"Proposal {proposal_id} status: {proposal['status']}")
+
+
+def already_ingested_result(proposal: Dict) -> Dict:
+    """The ingest result for a proposal that was ingested earlier."""
+    return {
+        "ok": True,
+        "course_id": proposal["course_id"],
+        "snapshot_id": proposal["snapshot_id"],
+        "already_ingested": True
+    }
+
+
+def ingest_body(proposal: Proposal) -> tuple:
+    """
+    Return (payload_bytes, idempotency_key) for POSTing a proposal.
     
-    # POST to ingest API with idempotency key
-    url = f"{COURSE_INGEST_URL}/v1/courses/ingest"
+    Inflates a compressed payload, so async callers run it off the event loop.
+    """
+    # The stored JSON is the request body; no parse/re-serialise round trip
+    payload_hash = proposal.get("payload_hash") or compute_payload_hash(proposal["payload"])
+    return proposal.payload_bytes(), payload_hash
+
+
+# A successful POST is authoritative even if the claim was lost meanwhile
+# (lease ran out and a retry failed): the course exists upstream
+RECORD_INGESTED_SQL = """
+    UPDATE proposals
+    SET status = 'ingested',
+        ingested_at = ?,
+        course_id = ?,
+        snapshot_id = ?,
+        ingest_lease_expires_at = NULL
+    WHERE proposal_id = ? AND status IN ('ingesting', 'failed', 'pending')
+"""
+
+# Only the current claim holder may report failure, so a stale caller can't
+# clobber a newer attempt
+MARK_FAILED_SQL = """
+    UPDATE proposals
+    SET status = 'failed', ingest_lease_expires_at = NULL
+    WHERE proposal_id = ? AND status = 'ingesting' AND ingest_lease_expires_at = ?
+"""
+
+# Give back a claim whose ingest was never attempted (same claim-holder guard)
+RELEASE_CLAIM_SQL = """
+    UPDATE proposals
+    SET status = 'pending', ingest_lease_expires_at = NULL
+    WHERE proposal_id = ? AND status = 'ingesting' AND ingest_lease_expires_at = ?
+"""
+
+
+def record_ingested(proposal_id: str, result: Dict) -> Dict:
+    """Store a successful ingest response and return the ingest result."""
+    get_store().execute(RECORD_INGESTED_SQL, (
+        datetime.now().isoformat(),
+        result.get("courseId"),
+        result.get("snapshotId"),
+        proposal_id
+    ))
+    _cache.invalidate([proposal_id])
     
-    # Prepare request data
-    payload_bytes = json.dumps(payload).encode('utf-8')
-    headers = {
-        "Authorization": f"Bearer {COURSE_INGEST_TOKEN}",
-        "Content-Type": "application/json",
-        "Idempotency-Key": payload_hash  # Use payload hash as idempotency key
+    return {
+        "ok": True,
+        "course_id": result.get("courseId"),
+        "snapshot_id": result.get("snapshotId")
     }
+
+
+def ingest_proposal(proposal_id: str) -> Dict:
+    """
+    Ingest a proposal and return result.
+    
+    Raises IngestInProgressError when another caller is already ingesting it,
+    so repeated taps send at most one POST, and CircuitOpenError (within
+    milliseconds, leaving the proposal ingestable) while the ingest service is
+    down.
+    """
+    get_ingest_breaker().check()
+    proposal, lease = claim_ingest(proposal_id)
+    if lease is None:
+        return already_ingested_result(proposal)
+    
+    # POST to ingest API with idempotency key (payload hash)
+    payload_bytes, payload_hash = ingest_body(proposal)
     
     try:
-        # Create request
-        req = urllib.request.Request(url, data=payload_bytes, headers=headers, method='POST')
-        
-        # Make request with timeout
-        with urllib.request.urlopen(req, timeout=30) as response:
-            response_data = response.read().decode('utf-8')
-            result = json.loads(response_data)
-        
-        # Update proposal status
-        conn = sqlite3.connect(DB_PATH)
-        conn.execute("""
-            UPDATE proposals
-            SET status = 'ingested',
-                ingested_at = ?,
-                course_id = ?,
-                snapshot_id = ?
-            WHERE proposal_id = ?
-        """, (
-            datetime.now().isoformat(),
-            result.get("courseId"),
-            result.get("snapshotId"),
-            proposal_id
-        ))
-        conn.commit()
-        conn.close()
-        
-        return {
-            "ok": True,
-            "course_id": result.get("courseId"),
-            "snapshot_id": result.get("snapshotId")
-        }
-    except urllib.error.HTTPError as e:
-        # HTTP error (4xx, 5xx)
-        error_body = e.read().decode('utf-8') if e.fp else str(e)
-        # Mark as failed but keep ingestable
-        conn = sqlite3.connect(DB_PATH)
-        conn.execute("""
-            UPDATE proposals
-            SET status = 'failed'
-            WHERE proposal_id = ?
-        """, (proposal_id,))
-        conn.commit()
-        conn.close()
-        raise Exception(f"Ingest failed: HTTP {e.code} - {error_body}")
-    except urllib.error.URLError as e:
-        # Network/connection error
-        conn = sqlite3.connect(DB_PATH)
-        conn.execute("""
-            UPDATE proposals
-            SET status = 'failed'
-            WHERE proposal_id = ?
-        """, (proposal_id,))
-        conn.commit()
-        conn.close()
-        raise Exception(f"Ingest failed: {str(e)}")
+        result = get_ingest_client().post_json(
+            "/v1/courses/ingest", payload_bytes, idempotency_key=payload_hash
+        )
+        return record_ingested(proposal_id, result)
+    except CircuitOpenError:
+        # Not sent (the service is marked down): hand the proposal back untouched
+        release_ingest_claim(proposal_id, lease)
+        raise
     except Exception as e:
-        # Other errors
-        conn = sqlite3.connect(DB_PATH)
-        conn.execute("""
-            UPDATE proposals
-            SET status = 'failed'
-            WHERE proposal_id = ?
-        """, (proposal_id,))
-        conn.commit()
-        conn.close()
+        # HTTP error (4xx, 5xx after retries), network error or bad response;
+        # mark as failed but keep ingestable
+        mark_ingest_failed(proposal_id, lease)
         raise Exception(f"Ingest failed: {str(e)}")
 
 
+def _batch_bodies(items: List[tuple]) -> List[List[tuple]]:
+    """Split (proposal_id, payload_hash, payload_bytes) items into size-bounded batches."""
+    batches = []
+    current = []
+    current_bytes = 0
+    for item in items:
+        size = len(item[2]) + 1
+        if current and (
+            len(current) >= COURSE_INGEST_BATCH_SIZE
+            or current_bytes + size > COURSE_INGEST_BATCH_MAX_BYTES
+        ):
+            batches.append(current)
+            current = []
+            current_bytes = 0
+        current.append(item)
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def ingest_proposals(proposal_ids: List[str]) -> Dict[str, Dict]:
+    """
+    Ingest many proposals via POST /v1/courses/ingest/batch.
+    
+    Proposals are grouped into batches bounded by COURSE_INGEST_BATCH_SIZE and
+    COURSE_INGEST_BATCH_MAX_BYTES; each batch is one request. The server dedupes
+    every item on its payload hash (the same value used as the per-proposal
+    Idempotency-Key), and the batch request carries a key derived from its items
+    so a retried batch is recognisable. Proposals are claimed (see claim_ingest)
+    before anything is sent, and all outcomes are written in a single
+    transaction; if anything fails part-way, claims that were never sent go
+    back to pending and the rest are marked failed.
+    
+    Returns: {proposal_id: result}, where result is shaped like ingest_proposal's
+    return value, or {"ok": False, "error": str} for proposals that failed.
+    """
+    results: Dict[str, Dict] = {}
+    store = get_store()
+    unique_ids = list(dict.fromkeys(proposal_ids))
+    
+    # Claim every ingestable proposal up front (see claim_ingest)
+    now = datetime.now()
+    lease = (now + timedelta(seconds=PROPOSALS_INGEST_LEASE)).isoformat()
+    claimed = set()
+    with store.transaction() as conn:
+        for i in range(0, len(unique_ids), 500):
+            chunk = unique_ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            claimed.update(row[0] for row in conn.execute(f"""
+                UPDATE proposals
+                SET status = 'ingesting', ingest_lease_expires_at = ?
+                WHERE proposal_id IN ({placeholders}) AND {CLAIMABLE_SQL}
+                RETURNING proposal_id
+            """, [lease] + chunk + [now.isoformat()]).fetchall())
+    _cache.invalidate(list(claimed))
+    
+    ingested = []
+    failed = []
+    sent = set()
+    try:
+        rows = {}
+        for i in range(0, len(unique_ids), 500):
+            chunk = unique_ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for row in store.fetchall(f"""
+                SELECT proposal_id, status, payload_json, payload_hash, course_id, snapshot_id
+                FROM proposals
+                WHERE proposal_id IN ({placeholders})
+            """, chunk):
+                rows[row[0]] = row
+        
+        items = []
+        for proposal_id in unique_ids:
+            row = rows.get(proposal_id)
+            if row is None:
+                results[proposal_id] = {"ok": False, "error": f"Proposal {proposal_id} not found"}
+                continue
+            _, status, stored_payload, payload_hash, course_id, snapshot_id = row
+            if status == "ingested":
+                results[proposal_id] = {
+                    "ok": True,
+                    "course_id": course_id,
+                    "snapshot_id": snapshot_id,
+                    "already_ingested": True
+                }
+            elif proposal_id not in claimed:
+                error = "Ingest already in progress" if status == "ingesting" else f"Proposal status: {status}"
+                results[proposal_id] = {"ok": False, "error": error}
+            else:
+                # Stored payload_json is already the JSON body; send it as-is
+                payload_json = decode_payload_json(stored_payload)
+                payload_hash = payload_hash or compute_payload_hash(json.loads(payload_json))
+                items.append((proposal_id, payload_hash, payload_json.encode("utf-8")))
+        
+        client = get_ingest_client()
+        for batch in _batch_bodies(items):
+            body = b"[" + b",".join(item[2] for item in batch) + b"]"
+            batch_key = hashlib.sha256("".join(item[1] for item in batch).encode("utf-8")).hexdigest()
+            try:
+                response = client.post_json("/v1/courses/ingest/batch", body, idempotency_key=batch_key)
+            except CircuitOpenError:
+                # Not sent; released back to pending below
+                for proposal_id, _, _ in batch:
+                    results[proposal_id] = {"ok": False, "error": "Ingest service unavailable"}
+                continue
+            except Exception as e:
+                for proposal_id, _, _ in batch:
+                    results[proposal_id] = {"ok": False, "error": f"Ingest failed: {str(e)}"}
+                    failed.append((proposal_id, lease))
+                continue
+            sent.update(item[0] for item in batch)
+            
+            # Map per-item results back by their index in the request body
+            by_index = {r["index"]: r for r in response.get("results", [])}
+            errors = {e["index"]: e for e in response.get("errors") or []}
+            now = datetime.now().isoformat()
+            for index, (proposal_id, _, _) in enumerate(batch):
+                item = by_index.get(index)
+                if item and item.get("ok"):
+                    results[proposal_id] = {
+                        "ok": True,
+                        "course_id": item.get("courseId"),
+                        "snapshot_id": item.get("snapshotId")
+                    }
+                    ingested.append((now, item.get("courseId"), item.get("snapshotId"), proposal_id))
+                else:
+                    error = errors.get(index, {})
+                    message = error.get("message") or error.get("error") or "no result returned"
+                    results[proposal_id] = {"ok": False, "error": f"Ingest failed: {message}"}
+                    failed.append((proposal_id, lease))
+    finally:
+        # Claims without an outcome (an error above, or the breaker refused
+        # their batch) must not sit in 'ingesting' until the lease expires:
+        # unsent ones go back to pending, sent ones of unknown fate to failed
+        settled = {row[-1] for row in ingested} | {row[0] for row in failed}
+        unsettled = [proposal_id for proposal_id in claimed if proposal_id not in settled]
+        failed.extend((proposal_id, lease) for proposal_id in unsettled if proposal_id in sent)
+        released = [(proposal_id, lease) for proposal_id in unsettled if proposal_id not in sent]
+        if ingested or failed or released:
+            with store.transaction() as conn:
+                conn.executemany(RECORD_INGESTED_SQL, ingested)
+                conn.executemany(MARK_FAILED_SQL, failed)
+                conn.executemany(RELEASE_CLAIM_SQL, released)
+            _cache.invalidate([row[-1] for row in ingested] + [row[0] for row in failed + released])
+    
+    return results
+
+
+def mark_ingest_failed(proposal_id: str, lease: str):
+    """Release an ingest claim as failed (the proposal stays ingestable)."""
+    get_store().execute(MARK_FAILED_SQL, (proposal_id, lease))
+    _cache.invalidate([proposal_id])
+
+
+def release_ingest_claim(proposal_id: str, lease: str):
+    """Return a claimed proposal to 'pending' when nothing was sent for it."""
+    get_store().execute(RELEASE_CLAIM_SQL, (proposal_id, lease))
+    _cache.invalidate([proposal_id])
+
+
 def skip_proposal(proposal_id: str) -> bool:
-    """Mark a proposal as skipped."""
-    init_db()
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("""
+    """
+    Mark a proposal as skipped.
+    
+    Returns False (and changes nothing) unless it was pending or failed, e.g.
+    when an ingest claimed it first.
+    """
+    count = get_store().execute("""
         UPDATE proposals
         SET status = 'skipped'
-        WHERE proposal_id = ?
-    """, (proposal_id,))
-    conn.commit()
-    conn.close()
-    return True
+        WHERE proposal_id = ? AND status IN ('pending', 'failed')
+    """, (proposal_id,)).rowcount
+    _cache.invalidate([proposal_id])
+    return count == 1
 
 
-def list_pending_proposals() -> List[Dict]:
-    """List all pending proposals."""
-    init_db()
-    conn = sqlite3.connect(DB_PATH)
-    rows = conn.execute("""
+# Accept the tap unless the same one was accepted within the window
+RECORD_TAP_SQL = """
+    INSERT INTO callback_taps (user_id, proposal_id, action, tapped_at)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (user_id, proposal_id, action) DO UPDATE SET tapped_at = excluded.tapped_at
+    WHERE callback_taps.tapped_at <= ?
+"""
+
+
+def record_tap(user_id: str, proposal_id: str, action: str, window: float) -> bool:
+    """
+    Record a button tap shared across processes (see tap_limiter).
+    
+    Returns False if any process recorded the same (user, proposal, action)
+    less than `window` seconds ago. One upsert; no read-then-write race.
+    """
+    now = time.time()
+    return get_store().execute(
+        RECORD_TAP_SQL, (user_id, proposal_id, action, now, now - window)
+    ).rowcount == 1
+
+
+def list_pending_proposals(
+    limit: Optional[int] = None,
+    after: Optional[Tuple[str, str]] = None
+) -> List[Dict]:
+    """
+    List pending proposals, newest first.
+
+    For paging, pass `limit` and then `after=(created_at, proposal_id)` of the
+    last proposal on the previous page. Pages are read straight from the
+    pending index (keyset pagination), so later pages cost the same as the
+    first.
+    """
+    sql = """
         SELECT proposal_id, course_name, city, state, created_at, agent_label
         FROM proposals
         WHERE status = 'pending' AND expires_at > ?
-        ORDER BY created_at DESC
-    """, (datetime.now().isoformat(),)).fetchall()
-    conn.close()
+    """
+    params = [datetime.now().isoformat()]
+    if after is not None:
+        sql += " AND (created_at, proposal_id) < (?, ?)"
+        params.extend(after)
+    sql += " ORDER BY created_at DESC, proposal_id DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    rows = get_store().fetchall(sql, params)
     
     return [
         {
@@ -324,44 +946,93 @@ def list_pending_proposals() -> List[Dict]:
 
 def cleanup_expired_proposals() -> int:
     """Remove expired proposals and return count."""
-    init_db()
-    conn = sqlite3.connect(DB_PATH)
-    count = conn.execute("""
+    count = get_store().execute("""
         UPDATE proposals
         SET status = 'expired'
         WHERE status = 'pending' AND expires_at < ?
     """, (datetime.now().isoformat(),)).rowcount
-    conn.commit()
-    conn.close()
+    if count:
+        _cache.clear()
     return count
 
 
-def format_proposal_message(proposal_id: str, course_json: Dict) -> str:
-    """Format a human-readable proposal message for Telegram."""
-    course = course_json.get("course", {})
-    tee_sets = course_json.get("teeSets", [])
-    holes = course_json.get("holes", [])
-    amenities = course_json.get("amenities", [])
-    
-    # Extract course types
-    course_types = course_json.get("courseTypes", [])
-    access = next((ct["typeKey"] for ct in course_types if ct["groupKey"] == "access"), "unknown")
-    tech = next((ct["typeKey"] for ct in course_types if ct["groupKey"] == "tech"), "none")
-    alt_types = [ct["typeKey"] for ct in course_types if ct["groupKey"] == "alternative_golf"]
-    
-    # Format address
-    address = course.get("address", {})
-    address_str = address.get("formatted") or address.get("line1", "")
-    
-    # Build message
+def proposal_summary(course_json: Dict) -> Dict:
+    """
+    Extract the fields the proposal message shows from a course payload.
+    
+    Walks courseTypes and counts teeSets / holes / amenities once, so the
+    result can be stored with the proposal and every later message (and
+    edit) is plain templating.
+    """
+    course = course_json.get("course")
+    if not isinstance(course, dict):
+        course = {}
+    
+    # Research output varies: skip courseTypes entries that aren't
+    # {"groupKey", "typeKey"} objects rather than failing on them
+    course_types = course_json.get("courseTypes")
+    type_pairs = [
+        (ct.get("groupKey"), ct.get("typeKey"))
+        for ct in (course_types if isinstance(course_types, list) else [])
+        if isinstance(ct, dict) and "typeKey" in ct
+    ]
+    
+    # Address is either an object or already a single line
+    address = course.get("address")
+    if isinstance(address, dict):
+        address_str = address.get("formatted") or address.get("line1", "")
+    else:
+        address_str = address or ""
+    
+    playability = course.get("playability")
+    
+    def count(key: str) -> int:
+        value = course_json.get(key)
+        return len(value) if isinstance(value, list) else 0
+    
+    return {
+        "course_id": course.get("id"),
+        "name": course.get("name", "Unnamed Course"),
+        "city": course.get("city", ""),
+        "state": course.get("state", ""),
+        "holes": playability.get("holes", "?") if isinstance(playability, dict) else "?",
+        "access": next((key for group, key in type_pairs if group == "access"), "unknown"),
+        "tech": next((key for group, key in type_pairs if group == "tech"), "none"),
+        "alt_types": [key for group, key in type_pairs if group == "alternative_golf"],
+        "address": address_str,
+        "phone": course.get("phone", "N/A"),
+        "domain": course.get("domain", "N/A"),
+        "tee_sets": count("teeSets"),
+        "holes_data": count("holes"),
+        "amenities": count("amenities")
+    }
+
+
+def encode_summary(course_json: Dict) -> Optional[str]:
+    """
+    proposal_summary as the compact JSON stored in summary_json.
+    
+    Returns None (stored as NULL; messages then render from the payload) if
+    the summary can't be built, so it never blocks creating a proposal.
+    """
+    try:
+        return json.dumps(proposal_summary(course_json), ensure_ascii=False, separators=(",", ":"))
+    except Exception:
+        logger.warning("Could not summarise proposal payload; storing it without a summary", exc_info=True)
+        return None
+
+
+def render_proposal_message(proposal_id: str, summary: Dict) -> str:
+    """Format the proposal message from a proposal_summary dict."""
+    alt_types = summary["alt_types"]
     lines = [
-        f"**{course.get('name', 'Unnamed Course')}** ({course.get('city', '')}, {course.get('state', '')})",
+        f"**{summary['name']}** ({summary['city']}, {summary['state']})",
         "",
-        f"• {course.get('playability', {}).get('holes', '?')} holes • {access} • tech: {tech}" + 
-        (f" • alt: {', '.join(alt_types)}" if alt_types else ""),
-        f"• {address_str}",
-        f"• {course.get('phone', 'N/A')} • {course.get('domain', 'N/A')}",
-        f"• Tee sets: {len(tee_sets)} • Holes data: {len(holes)} • Amenities: {len(amenities)}",
+        f"• {summary['holes']} holes • {summary['access']} • tech: {summary['tech']}" + 
+        (f" • alt: {', '.join(str(t) for t in alt_types)}" if alt_types else ""),
+        f"• {summary['address']}",
+        f"• {summary['phone']} • {summary['domain']}",
+        f"• Tee sets: {summary['tee_sets']} • Holes data: {summary['holes_data']} • Amenities: {summary['amenities']}",
         "",
         f"Proposal: `{proposal_id}`"
     ]
@@ -369,32 +1040,28 @@ def format_proposal_message(proposal_id: str, course_json: Dict) -> str:
     return "\n".join(lines)
 
 
+def format_proposal_message(proposal_id: str, course_json: Dict) -> str:
+    """Format a human-readable proposal message for Telegram."""
+    return render_proposal_message(proposal_id, proposal_summary(course_json))
+
+
+def proposal_message_text(proposal: Dict) -> str:
+    """Proposal message for a stored proposal, from its summary (no payload parse)."""
+    return render_proposal_message(proposal["proposal_id"], proposal["summary"])
+
+
 def auto_ingest_if_enabled(course_json: Dict) -> Optional[Dict]:
     """Auto-ingest if AUTO_INGEST is enabled, otherwise return None."""
     if not AUTO_INGEST:
         return None
     
-    url = f"{COURSE_INGEST_URL}/v1/courses/ingest"
-    
-    # Prepare request data
     payload_bytes = json.dumps(course_json).encode('utf-8')
-    headers = {
-        "Authorization": f"Bearer {COURSE_INGEST_TOKEN}",
-        "Content-Type": "application/json"
-    }
     
     try:
-        # Create request
-        req = urllib.request.Request(url, data=payload_bytes, headers=headers, method='POST')
-        
-        # Make request with timeout
-        with urllib.request.urlopen(req, timeout=30) as response:
-            response_data = response.read().decode('utf-8')
-            return json.loads(response_data)
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode('utf-8') if e.fp else str(e)
-        raise Exception(f"Auto-ingest failed: HTTP {e.code} - {error_body}")
-    except urllib.error.URLError as e:
+        return get_ingest_client().post_json(
+            "/v1/courses/ingest", payload_bytes, idempotency_key=compute_payload_hash(course_json)
+        )
+    except IngestError as e:
         raise Exception(f"Auto-ingest failed: {str(e)}")
 
 
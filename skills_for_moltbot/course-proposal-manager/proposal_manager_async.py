@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Async Proposal Manager - asyncio facade over proposal_manager.
+
+Same functions and semantics as proposal_manager, as coroutines. SQLite work
+runs on one dedicated DB thread (so the event loop never blocks on the store
+lock or disk), and ingest POSTs go through AsyncIngestClient, so one event loop
+can serve many concurrent proposal callbacks without a thread per request.
+
+    import proposal_manager_async as apm
+
+    proposal_id = await apm.create_proposal(course_json, "golf-course-research")
+    result = await apm.ingest_proposal(proposal_id)
+"""
+
+import asyncio
+import functools
+import json
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import proposal_manager as pm
+from ingest_client import AsyncIngestClient, CircuitOpenError, IngestError
+
+# Single thread that owns all blocking SQLite calls made from async code
+_db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="proposal-db")
+
+# asyncio streams are bound to a loop, so keep one client per event loop
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncIngestClient]" = weakref.WeakKeyDictionary()
+
+
+async def _run_db(func, *args, **kwargs):
+    """Run a blocking proposal_manager call on the DB thread."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(func, *args, **kwargs))
+
+
+def get_ingest_client() -> AsyncIngestClient:
+    """Return the keep-alive ingest client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = AsyncIngestClient(**pm.ingest_client_options())
+        _clients[loop] = client
+    return client
+
+
+async def create_proposal(
+    payload: Dict,
+    agent_label: str = "unknown",
+    run_id: Optional[str] = None,
+    expires_hours: int = 48,
+    proposal_message_id: Optional[int] = None,
+    proposal_chat_id: Optional[str] = None
+) -> str:
+    """Create a new proposal and return proposal_id."""
+    return await _run_db(
+        pm.create_proposal, payload, agent_label, run_id, expires_hours,
+        proposal_message_id, proposal_chat_id
+    )
+
+
+async def get_or_create_proposal(
+    payload: Dict,
+    agent_label: str = "unknown",
+    run_id: Optional[str] = None,
+    expires_hours: int = 48,
+    proposal_message_id: Optional[int] = None,
+    proposal_chat_id: Optional[str] = None
+) -> Tuple[str, bool]:
+    """Create a proposal unless an identical one is pending; return (proposal_id, created)."""
+    return await _run_db(
+        pm.get_or_create_proposal, payload, agent_label, run_id, expires_hours,
+        proposal_message_id, proposal_chat_id
+    )
+
+
+async def create_proposals(
+    payloads: List[Dict],
+    agent_label: str = "unknown",
+    run_id: Optional[str] = None,
+    expires_hours: int = 48
+) -> Dict:
+    """Create proposals for a batch of course payloads (see proposal_manager.create_proposals)."""
+    return await _run_db(pm.create_proposals, payloads, agent_label, run_id, expires_hours)
+
+
+async def update_proposal_message_id(proposal_id: str, message_id: int, chat_id: str):
+    """Update the stored Telegram message ID for a proposal."""
+    return await _run_db(pm.update_proposal_message_id, proposal_id, message_id, chat_id)
+
+
+async def get_proposal(proposal_id: str) -> Optional[Dict]:
+    """Get a proposal by ID."""
+    return await _run_db(pm.get_proposal, proposal_id)
+
+
+async def skip_proposal(proposal_id: str) -> bool:
+    """Mark a proposal as skipped."""
+    return await _run_db(pm.skip_proposal, proposal_id)
+
+
+async def list_pending_proposals(
+    limit: Optional[int] = None,
+    after: Optional[Tuple[str, str]] = None
+) -> List[Dict]:
+    """List pending proposals, newest first (see proposal_manager.list_pending_proposals)."""
+    return await _run_db(pm.list_pending_proposals, limit, after)
+
+
+async def cleanup_expired_proposals() -> int:
+    """Mark expired proposals and return count."""
+    return await _run_db(pm.cleanup_expired_proposals)
+
+
+async def ingest_proposal(proposal_id: str) -> Dict:
+    """Ingest a proposal and return result (see proposal_manager.ingest_proposal)."""
+    pm.get_ingest_breaker().check()
+    proposal, lease = await _run_db(pm.claim_ingest, proposal_id)
+    if lease is None:
+        return pm.already_ingested_result(proposal)
+
+    # Inflating a large compressed payload would stall the event loop
+    payload_bytes, payload_hash = await _run_db(pm.ingest_body, proposal)
+
+    try:
+        result = await get_ingest_client().post_json(
+            "/v1/courses/ingest", payload_bytes, idempotency_key=payload_hash
+        )
+        return await _run_db(pm.record_ingested, proposal_id, result)
+    except CircuitOpenError:
+        # Not sent: hand the proposal back untouched
+        await _run_db(pm.release_ingest_claim, proposal_id, lease)
+        raise
+    except Exception as e:
+        # Mark as failed but keep ingestable
+        await _run_db(pm.mark_ingest_failed, proposal_id, lease)
+        raise Exception(f"Ingest failed: {str(e)}")
+
+
+async def ingest_proposals(proposal_ids: List[str]) -> Dict[str, Dict]:
+    """
+    Batch ingest (see proposal_manager.ingest_proposals).
+
+    Runs the synchronous batch path on a worker thread: it is a handful of
+    large requests, so the thread hop is negligible.
+    """
+    return await asyncio.to_thread(pm.ingest_proposals, proposal_ids)
+
+
+async def auto_ingest_if_enabled(course_json: Dict) -> Optional[Dict]:
+    """Auto-ingest if AUTO_INGEST is enabled, otherwise return None."""
+    if not pm.AUTO_INGEST:
+        return None
+
+    payload_bytes = json.dumps(course_json).encode('utf-8')
+
+    try:
+        return await get_ingest_client().post_json(
+            "/v1/courses/ingest", payload_bytes, idempotency_key=pm.compute_payload_hash(course_json)
+        )
+    except IngestError as e:
+        raise Exception(f"Auto-ingest failed: {str(e)}")
@@ -0,0 +1,562 @@
+#!/usr/bin/env python3
+"""
+Proposal Store - Storage backends for the proposals database.
+
+ProposalStore is the interface proposal_manager, ingest_queue and
+proposal_sweeper use; open_store() picks the backend from configuration:
+
+  - SQLiteProposalStore (default): a local file, see below
+  - PostgresProposalStore (proposal_store_pg): a shared Postgres database, for
+    several gateway replicas
+
+SQLiteProposalStore opens one write connection per process and shares it
+between threads (guarded by a lock). Pending schema migrations (see
+MIGRATIONS) run once when it is opened, and the database is switched to WAL
+journaling. SELECTs run on a small pool of separate read connections, so
+readers never block on the writer - not even on a thread of this process
+that is waiting for another process's write lock.
+
+Several processes (message hook, research agent, scripts) share the file.
+Writers wait up to `busy_timeout` seconds for the write lock, and a statement
+that still finds the database busy is retried with jittered backoff up to
+`write_retries` times, so contention serialises writers instead of failing
+them with "database is locked".
+"""
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Iterator, List, Optional, TypeVar, Union
+
+from canonical_hash import canonical_hash
+
+# Connection tuning (applied once per connection)
+PRAGMAS = (
+    "PRAGMA auto_vacuum = INCREMENTAL",  # Only takes effect on a new database
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",  # Safe with WAL; fsync only at checkpoints
+    "PRAGMA cache_size = -8000",    # 8 MB page cache
+    "PRAGMA temp_store = MEMORY",
+)
+
+# Read connections: tuning only (the write connection sets up the file)
+READ_PRAGMAS = (
+    "PRAGMA cache_size = -8000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA query_only = ON",
+)
+
+# Idle read connections kept open per process
+READ_POOL_SIZE = 4
+
+# SQLite primary result codes that mean "another connection holds the lock"
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+# Backoff between busy retries: full jitter, base * 2**attempt, capped
+BUSY_BACKOFF_BASE = 0.05
+BUSY_BACKOFF_MAX = 1.0
+
+T = TypeVar("T")
+
+
+def is_busy_error(error: BaseException) -> bool:
+    """True if error is SQLite reporting lock contention (BUSY / LOCKED)."""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in (SQLITE_BUSY, SQLITE_LOCKED)
+    message = str(error)
+    return "locked" in message or "busy" in message
+
+
+class ProposalStore(ABC):
+    """
+    Storage backend interface.
+
+    SQL is written once, in the dialect both backends accept, with `?`
+    placeholders. Connections yielded by transaction() offer sqlite3-style
+    execute() / executemany() returning cursors with fetchone(), fetchall()
+    and rowcount. Backends implement every abstract method; close() is
+    optional.
+    """
+
+    # "sqlite" or "postgres", for the few maintenance statements that differ
+    dialect = ""
+    # Exception raised on unique/primary-key violations
+    IntegrityError: type = Exception
+    # False when the database already compresses large values itself
+    compress_payloads = True
+
+    @abstractmethod
+    def transaction(self) -> ContextManager[Any]:
+        """
+        Run a block of statements as one write transaction (a context manager
+        yielding the connection; implementations use @contextmanager).
+
+        Write transactions are serialised: only one runs at a time across every
+        process sharing the store, so read-then-write logic inside the block
+        (sequence counters, dedupe lookups, job claims) cannot be raced.
+        """
+
+    @abstractmethod
+    def execute(self, sql: str, params=()):
+        """Run a single statement (autocommit) and return its cursor."""
+
+    @abstractmethod
+    def fetchone(self, sql: str, params=()):
+        """Run a query and return the first row."""
+
+    @abstractmethod
+    def fetchall(self, sql: str, params=()):
+        """Run a query and return all rows."""
+
+    def close(self):
+        """Close connections (they are reopened on next use)."""
+
+
+def _is_select(sql: str) -> bool:
+    """True for plain queries, which may run on a read connection."""
+    return sql.lstrip()[:6].upper() == "SELECT"
+
+
+class SQLiteProposalStore(ProposalStore):
+    """One shared write connection per process, plus pooled read connections."""
+
+    dialect = "sqlite"
+    IntegrityError = sqlite3.IntegrityError
+
+    def __init__(self, db_path: Union[str, Path], busy_timeout: float = 10.0, write_retries: int = 3):
+        self.db_path = Path(db_path)
+        self.busy_timeout = busy_timeout
+        self.write_retries = write_retries
+        self.busy_retries = 0  # statements retried after SQLITE_BUSY, for monitoring
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._local = threading.local()
+
+    def connection(self) -> sqlite3.Connection:
+        """Return the shared connection, opening it (and the schema) on first use."""
+        # Reopen after fork: SQLite connections must not cross process boundaries
+        if self._conn is not None and self._pid == os.getpid():
+            return self._conn
+
+        with self._lock:
+            if self._conn is None or self._pid != os.getpid():
+                self.db_path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(
+                    self.db_path,
+                    timeout=self.busy_timeout,  # SQLite busy handler
+                    check_same_thread=False,
+                    isolation_level=None  # Explicit transactions via transaction()
+                )
+                try:
+                    # Switching to WAL and migrating both need the write lock
+                    self._retry_busy(lambda: self._prepare(conn))
+                except BaseException:
+                    conn.close()
+                    raise
+                with self._readers_lock:
+                    self._readers = []  # A parent process's connections aren't ours to use
+                self._conn = conn
+                self._pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def _prepare(conn: sqlite3.Connection):
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        migrate(conn)
+
+    def _retry_busy(self, func: Callable[[], T]) -> T:
+        """
+        Call func, retrying with backoff while SQLite reports the database busy.
+
+        Only for operations that have no effect when they fail (a single
+        statement, or BEGIN): a busy error means nothing was written.
+        """
+        for attempt in range(self.write_retries + 1):
+            try:
+                return func()
+            except sqlite3.OperationalError as e:
+                if not is_busy_error(e) or attempt == self.write_retries:
+                    raise
+                self.busy_retries += 1
+                time.sleep(random.uniform(0, min(BUSY_BACKOFF_MAX, BUSY_BACKOFF_BASE * 2 ** attempt)))
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Run a block of statements as one write transaction.
+
+        BEGIN IMMEDIATE takes the write lock up front, so reads inside the block
+        (e.g. sequence counters) cannot be raced by another process, and the
+        block itself never meets a busy database. Waiting for the lock is
+        bounded by busy_timeout and write_retries.
+        """
+        with self._lock:
+            conn = self.connection()
+            self._retry_busy(lambda: conn.execute("BEGIN IMMEDIATE"))
+            self._local.in_transaction = True
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._local.in_transaction = False
+            conn.execute("COMMIT")
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a read connection (opened on demand; idle ones are pooled)."""
+        self.connection()  # Schema and WAL are set up by the write connection
+        pid = os.getpid()
+        conn = None
+        with self._readers_lock:
+            if self._pid == pid and self._readers:
+                conn = self._readers.pop()
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=self.busy_timeout,
+                check_same_thread=False,
+                isolation_level=None
+            )
+            for pragma in READ_PRAGMAS:
+                conn.execute(pragma)
+        try:
+            yield conn
+        finally:
+            with self._readers_lock:
+                if self._pid == pid and len(self._readers) < READ_POOL_SIZE:
+                    self._readers.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def _query(self, sql: str, params, fetch: Callable[[sqlite3.Cursor], T]) -> T:
+        # A thread inside transaction() must see its own uncommitted writes, and
+        # writes (e.g. UPDATE ... RETURNING) stay on the write connection
+        if _is_select(sql) and not getattr(self._local, "in_transaction", False):
+            with self._reader() as conn:
+                return self._retry_busy(lambda: fetch(conn.execute(sql, params)))
+        with self._lock:
+            conn = self.connection()
+            return self._retry_busy(lambda: fetch(conn.execute(sql, params)))
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        """Run a single statement (autocommit) on the shared connection."""
+        with self._lock:
+            conn = self.connection()
+            return self._retry_busy(lambda: conn.execute(sql, params))
+
+    def executescript(self, sql: str):
+        """Run statements to completion (e.g. PRAGMA incremental_vacuum, which
+        execute() would only step once). The script may be retried when the
+        database is busy, so it must be safe to run twice."""
+        with self._lock:
+            conn = self.connection()
+            self._retry_busy(lambda: conn.executescript(sql))
+
+    def fetchone(self, sql: str, params=()):
+        """Run a query and return the first row (SELECTs don't wait for writers)."""
+        return self._query(sql, params, lambda cursor: cursor.fetchone())
+
+    def fetchall(self, sql: str, params=()):
+        """Run a query and return all rows (SELECTs don't wait for writers)."""
+        return self._query(sql, params, lambda cursor: cursor.fetchall())
+
+    def close(self):
+        """Close the shared connections (they are reopened on next use)."""
+        with self._lock:
+            with self._readers_lock:
+                if self._pid == os.getpid():
+                    for reader in self._readers:
+                        reader.close()
+                self._readers = []
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+            self._pid = None
+
+
+def _add_column_if_missing(conn: sqlite3.Connection, table: str, column: str, decl: str):
+    """ALTER TABLE ADD COLUMN, skipping columns added by pre-versioned databases."""
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _migration_001_create_proposals(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS proposals (
+            proposal_id TEXT PRIMARY KEY,
+            payload_json TEXT NOT NULL,
+            payload_hash TEXT,
+            course_name TEXT,
+            city TEXT,
+            state TEXT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMPTZ NOT NULL,
+            status TEXT DEFAULT 'pending',
+            ingested_at TIMESTAMPTZ,
+            snapshot_id TEXT,
+            course_id TEXT,
+            agent_label TEXT,
+            run_id TEXT,
+            proposal_message_id INTEGER,
+            proposal_chat_id TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS proposals_status_idx ON proposals(status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS proposals_expires_at_idx ON proposals(expires_at)")
+
+
+def _migration_002_payload_hash(conn: sqlite3.Connection):
+    _add_column_if_missing(conn, "proposals", "payload_hash", "TEXT")
+
+
+def _migration_003_proposal_message(conn: sqlite3.Connection):
+    _add_column_if_missing(conn, "proposals", "proposal_message_id", "INTEGER")
+    _add_column_if_missing(conn, "proposals", "proposal_chat_id", "TEXT")
+
+
+def _migration_004_proposal_sequences(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS proposal_sequences (
+            prefix TEXT NOT NULL,
+            day TEXT NOT NULL,
+            last_seq INTEGER NOT NULL,
+            PRIMARY KEY (prefix, day)
+        ) WITHOUT ROWID
+    """)
+    # Seed counters from existing IDs ({PREFIX}-{YYYYMMDD}-{SEQ}) so new
+    # allocations continue after them
+    counters = {}
+    for (proposal_id,) in conn.execute("SELECT proposal_id FROM proposals"):
+        parts = proposal_id.rsplit("-", 2)
+        if len(parts) != 3 or not parts[2].isdigit():
+            continue
+        key = (parts[0], parts[1])
+        counters[key] = max(counters.get(key, 0), int(parts[2]))
+    conn.executemany(
+        "INSERT OR REPLACE INTO proposal_sequences (prefix, day, last_seq) VALUES (?, ?, ?)",
+        [(prefix, day, seq) for (prefix, day), seq in counters.items()]
+    )
+
+
+def _migration_005_ingest_jobs(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_jobs (
+            job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            proposal_id TEXT NOT NULL,
+            chat_id TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            lease_expires_at TIMESTAMPTZ,
+            last_error TEXT,
+            result_json TEXT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMPTZ
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS ingest_jobs_status_idx ON ingest_jobs(status, job_id)")
+    # At most one outstanding job per proposal (double taps reuse it)
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ingest_jobs_active_proposal_idx
+        ON ingest_jobs(proposal_id) WHERE status IN ('queued', 'running')
+    """)
+
+
+def _migration_006_proposals_archive(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS proposals_archive (
+            proposal_id TEXT PRIMARY KEY,
+            payload_zlib BLOB,
+            payload_hash TEXT,
+            course_name TEXT,
+            city TEXT,
+            state TEXT,
+            created_at TIMESTAMPTZ,
+            expires_at TIMESTAMPTZ,
+            status TEXT,
+            ingested_at TIMESTAMPTZ,
+            snapshot_id TEXT,
+            course_id TEXT,
+            agent_label TEXT,
+            run_id TEXT,
+            archived_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS proposals_created_at_idx ON proposals(created_at)")
+
+
+def _migration_007_pending_indexes(conn: sqlite3.Connection):
+    # Covering index for the pending listing, newest first with proposal_id as
+    # the tie-breaker for keyset pagination. status is the trailing column so
+    # SQLite can answer the whole query from the index.
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS proposals_pending_listing_idx
+        ON proposals(created_at, proposal_id, expires_at, course_name, city, state, agent_label, status)
+        WHERE status = 'pending'
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS proposals_pending_expires_idx
+        ON proposals(expires_at) WHERE status = 'pending'
+    """)
+    # Superseded by the partial indexes above: status alone is too coarse to
+    # help, and every status change had to rewrite both
+    conn.execute("DROP INDEX IF EXISTS proposals_status_idx")
+    conn.execute("DROP INDEX IF EXISTS proposals_expires_at_idx")
+
+
+def _migration_008_pending_hash_index(conn: sqlite3.Connection):
+    # Dedupe-on-create looks up pending proposals by payload hash. Not UNIQUE:
+    # older databases can already hold duplicates, and a pending row past its
+    # expiry (not yet swept) must not block a fresh proposal. Creates run under
+    # BEGIN IMMEDIATE, so lookup-then-insert is already atomic.
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS proposals_pending_hash_idx
+        ON proposals(payload_hash, expires_at) WHERE status = 'pending'
+    """)
+
+
+def _migration_009_rehash_active_payloads(conn: sqlite3.Connection):
+    # payload_hash moved from json.dumps(sort_keys=True) to the canonical form
+    # shared with course-ingest; rehash proposals that can still be deduped
+    # against or ingested
+    rows = conn.execute(
+        "SELECT proposal_id, payload_json FROM proposals WHERE status IN ('pending', 'failed')"
+    ).fetchall()
+    updates = []
+    for proposal_id, stored in rows:
+        text = zlib.decompress(stored).decode("utf-8") if isinstance(stored, bytes) else stored
+        if text:
+            updates.append((canonical_hash(json.loads(text)), proposal_id))
+    conn.executemany("UPDATE proposals SET payload_hash = ? WHERE proposal_id = ?", updates)
+
+
+def _migration_010_ingest_lease(conn: sqlite3.Connection):
+    # Expiry of the 'ingesting' claim; a claim past it may be taken over
+    _add_column_if_missing(conn, "proposals", "ingest_lease_expires_at", "TIMESTAMPTZ")
+
+
+def _migration_011_summary_json(conn: sqlite3.Connection):
+    # Message fields extracted from the payload at creation (see
+    # proposal_manager.proposal_summary); NULL for older rows, which fall back
+    # to the payload
+    _add_column_if_missing(conn, "proposals", "summary_json", "TEXT")
+
+
+def _migration_012_callback_taps(conn: sqlite3.Connection):
+    # Last accepted tap per (user, proposal, action), for debouncing across
+    # processes (tap_limiter, PROPOSAL_TAP_SHARED); tapped_at is epoch seconds
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS callback_taps (
+            user_id TEXT NOT NULL,
+            proposal_id TEXT NOT NULL,
+            action TEXT NOT NULL,
+            tapped_at REAL NOT NULL,
+            PRIMARY KEY (user_id, proposal_id, action)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS callback_taps_tapped_at_idx ON callback_taps(tapped_at)")
+
+
+# Numbered schema migrations; entry N upgrades the database to user_version N.
+# Append only - never edit or reorder an entry once it has shipped.
+MIGRATIONS = (
+    _migration_001_create_proposals,
+    _migration_002_payload_hash,
+    _migration_003_proposal_message,
+    _migration_004_proposal_sequences,
+    _migration_005_ingest_jobs,
+    _migration_006_proposals_archive,
+    _migration_007_pending_indexes,
+    _migration_008_pending_hash_index,
+    _migration_009_rehash_active_payloads,
+    _migration_010_ingest_lease,
+    _migration_011_summary_json,
+    _migration_012_callback_taps,
+)
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def _schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Apply pending migrations and return the number applied.
+
+    The version is tracked in PRAGMA user_version, so a current database costs
+    one pragma read and takes no write lock.
+    """
+    if _schema_version(conn) >= SCHEMA_VERSION:
+        return 0
+
+    # Take the write lock up front, then re-check: another process may have
+    # migrated while we were waiting
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        current = _schema_version(conn)
+        for version in range(current + 1, SCHEMA_VERSION + 1):
+            MIGRATIONS[version - 1](conn)
+        if current < SCHEMA_VERSION:
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+    return max(SCHEMA_VERSION - current, 0)
+
+
+def allocate_sequence(conn, prefix: str, day: str, count: int = 1) -> int:
+    """
+    Reserve `count` sequence numbers for prefix+day and return the last one.
+
+    Works on either backend. Must run inside a write transaction
+    (ProposalStore.transaction) so the reservation commits or rolls back
+    together with the rows that use it.
+    """
+    conn.execute("""
+        INSERT INTO proposal_sequences (prefix, day, last_seq) VALUES (?, ?, ?)
+        ON CONFLICT (prefix, day) DO UPDATE SET last_seq = proposal_sequences.last_seq + excluded.last_seq
+    """, (prefix, day, count))
+    return conn.execute(
+        "SELECT last_seq FROM proposal_sequences WHERE prefix = ? AND day = ?",
+        (prefix, day)
+    ).fetchone()[0]
+
+
+def open_store(
+    db_path: Union[str, Path],
+    database_url: Optional[str] = None,
+    busy_timeout: float = 10.0,
+    write_retries: int = 3,
+    pool_size: int = 5
+) -> ProposalStore:
+    """
+    Return the configured backend: Postgres when database_url is a
+    postgres:// or postgresql:// URL, otherwise SQLite at db_path.
+    """
+    if database_url and database_url.startswith(("postgres://", "postgresql://")):
+        # Imported lazily: psycopg2 is only needed for this backend
+        from proposal_store_pg import PostgresProposalStore
+        return PostgresProposalStore(database_url, pool_size=pool_size)
+    if database_url:
+        raise ValueError(f"Unsupported proposals database URL: {database_url.split(':', 1)[0]}://...")
+    return SQLiteProposalStore(db_path, busy_timeout, write_retries)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Proposal Sweeper - Expiry, archival and compaction for course_proposals.db.
+
+One sweep:
+  1. marks overdue pending proposals 'expired' (cleanup_expired_proposals)
+  2. moves ingested/skipped/expired proposals older than the retention window
+     into `proposals_archive`, with the payload zlib-compressed
+  3. deletes finished ingest jobs older than the retention window, and
+     callback_taps rows older than a day
+  4. returns freed pages to the filesystem with PRAGMA incremental_vacuum
+     (SQLite only)
+
+Run it periodically in-process (start_sweeper) or from cron:
+
+    python3 proposal_sweeper.py --retention-days 30
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Optional
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from proposal_manager import (
+    cleanup_expired_proposals,
+    get_store,
+    invalidate_proposal_cache
+)
+
+RETENTION_DAYS = int(os.getenv("PROPOSALS_RETENTION_DAYS", "30"))
+SWEEP_INTERVAL_SECONDS = float(os.getenv("PROPOSALS_SWEEP_INTERVAL", "3600"))
+
+# Terminal statuses that are safe to archive
+ARCHIVABLE_STATUSES = ("ingested", "skipped", "expired")
+
+ARCHIVE_COLUMNS = (
+    "proposal_id", "payload_hash", "course_name", "city", "state", "created_at",
+    "expires_at", "status", "ingested_at", "snapshot_id", "course_id", "agent_label", "run_id"
+)
+
+# Re-archiving an ID overwrites the old archive row
+ARCHIVE_UPSERT_SET = ", ".join(
+    f"{column} = excluded.{column}" for column in ("payload_zlib",) + ARCHIVE_COLUMNS[1:]
+)
+
+# Sweeper thread running in this process, if any (see start_sweeper)
+_sweeper: Optional["ProposalSweeper"] = None
+
+
+def retention_cutoff(retention_days: int) -> str:
+    """created_at value (UTC, CURRENT_TIMESTAMP format) retention_days ago."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    return cutoff.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def archive_proposals(retention_days: int = RETENTION_DAYS, batch_size: int = 500) -> int:
+    """
+    Move terminal proposals created more than retention_days ago into
+    proposals_archive and return how many were moved.
+
+    Works in batches so the write lock is never held for long.
+    """
+    store = get_store()
+    placeholders = ",".join("?" * len(ARCHIVABLE_STATUSES))
+    moved = 0
+    while True:
+        with store.transaction() as conn:
+            rows = conn.execute(f"""
+                SELECT payload_json, {', '.join(ARCHIVE_COLUMNS)}
+                FROM proposals
+                WHERE status IN ({placeholders}) AND created_at < ?
+                LIMIT ?
+            """, (*ARCHIVABLE_STATUSES, retention_cutoff(retention_days), batch_size)).fetchall()
+            if not rows:
+                break
+
+            archived = []
+            for row in rows:
+                stored = row[0]
+                # Large payloads are already stored compressed
+                payload_zlib = stored if isinstance(stored, bytes) else zlib.compress((stored or "").encode("utf-8"), 9)
+                archived.append((payload_zlib,) + tuple(row[1:]))
+            conn.executemany(f"""
+                INSERT INTO proposals_archive (payload_zlib, {', '.join(ARCHIVE_COLUMNS)})
+                VALUES ({','.join('?' * (len(ARCHIVE_COLUMNS) + 1))})
+                ON CONFLICT (proposal_id) DO UPDATE SET {ARCHIVE_UPSERT_SET}
+            """, archived)
+            ids = [(row[1],) for row in rows]
+            conn.executemany("DELETE FROM proposals WHERE proposal_id = ?", ids)
+
+        invalidate_proposal_cache([i[0] for i in ids])
+        moved += len(rows)
+        if len(rows) < batch_size:
+            break
+    return moved
+
+
+def purge_ingest_jobs(retention_days: int = RETENTION_DAYS) -> int:
+    """Delete finished ingest jobs older than retention_days; return count."""
+    return get_store().execute("""
+        DELETE FROM ingest_jobs
+        WHERE status IN ('done', 'failed') AND created_at < ?
+    """, (retention_cutoff(retention_days),)).rowcount
+
+
+def purge_callback_taps(max_age_seconds: float = 86400) -> int:
+    """Delete recorded taps (shared debounce) older than max_age_seconds; return count."""
+    return get_store().execute(
+        "DELETE FROM callback_taps WHERE tapped_at < ?", (time.time() - max_age_seconds,)
+    ).rowcount
+
+
+def incremental_vacuum(max_pages: int = 0) -> int:
+    """
+    Release free pages back to the filesystem; return the number of free pages
+    before vacuuming.
+
+    Databases created before auto_vacuum was enabled are converted once with a
+    full VACUUM (needs a moment of exclusive access). A no-op on Postgres,
+    whose autovacuum handles this.
+    """
+    store = get_store()
+    if store.dialect != "sqlite":
+        return 0
+    if store.fetchone("PRAGMA auto_vacuum")[0] != 2:  # 2 = INCREMENTAL
+        store.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        store.execute("VACUUM")
+        return 0
+    free_pages = store.fetchone("PRAGMA freelist_count")[0]
+    if free_pages:
+        store.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+    return free_pages
+
+
+def get_archived_proposal(proposal_id: str) -> Optional[Dict]:
+    """Look up an archived proposal (payload decompressed into "payload")."""
+    row = get_store().fetchone(
+        f"SELECT payload_zlib, {', '.join(ARCHIVE_COLUMNS)}, archived_at FROM proposals_archive WHERE proposal_id = ?",
+        (proposal_id,)
+    )
+    if not row:
+        return None
+    proposal = dict(zip(ARCHIVE_COLUMNS + ("archived_at",), row[1:]))
+    proposal["payload"] = json.loads(zlib.decompress(row[0]).decode("utf-8")) if row[0] else {}
+    return proposal
+
+
+def sweep(retention_days: int = RETENTION_DAYS, vacuum_pages: int = 0) -> Dict:
+    """Run one full sweep and return counts for each step."""
+    return {
+        "expired": cleanup_expired_proposals(),
+        "archived": archive_proposals(retention_days),
+        "jobs_purged": purge_ingest_jobs(retention_days),
+        "taps_purged": purge_callback_taps(),
+        "free_pages": incremental_vacuum(vacuum_pages)
+    }
+
+
+class ProposalSweeper:
+    """Background thread that runs sweep() every `interval` seconds."""
+
+    def __init__(self, interval: float = SWEEP_INTERVAL_SECONDS, retention_days: int = RETENTION_DAYS):
+        self.interval = interval
+        self.retention_days = retention_days
+        self.last_result: Optional[Dict] = None
+        self.last_error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="proposal-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.last_result = sweep(self.retention_days)
+                self.last_error = None
+            except Exception as e:
+                # Keep sweeping on the next tick (e.g. database briefly locked)
+                self.last_error = str(e)
+            self._stop.wait(self.interval)
+
+
+def start_sweeper(interval: float = SWEEP_INTERVAL_SECONDS, retention_days: int = RETENTION_DAYS) -> ProposalSweeper:
+    """Start (or return) this process's periodic sweeper."""
+    global _sweeper
+    if _sweeper is None:
+        _sweeper = ProposalSweeper(interval, retention_days)
+    _sweeper.start()
+    return _sweeper
+
+
+def stop_sweeper():
+    """Stop this process's sweeper, if one is running."""
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.stop()
+        _sweeper = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Expire, archive and compact course proposals.")
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS)
+    parser.add_argument("--vacuum-pages", type=int, default=0, help="Max pages to free (0 = all)")
+    args = parser.parse_args()
+
+    result = sweep(args.retention_days, args.vacuum_pages)
+    print(json.dumps(result))
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Stress test: several processes writing to one proposals database at once.
+
+Starts `--processes` writer processes on a fresh scratch database, all at the
+same instant (so they also race to create and migrate the schema). Each one
+runs a mix of creates, message-ID updates, skips, ingest enqueues and expiry
+sweeps, the way the message hook, the research agent and ad-hoc scripts do.
+A lock-hog process meanwhile keeps grabbing the write lock and holding it for
+`--hold-ms`.
+
+Passes when no operation failed (in particular no "database is locked") and
+the database is consistent: one row per successful create, gap-free proposal
+sequence numbers, and a clean integrity_check.
+
+Finally, while another process holds the write lock and a thread of this
+process waits for it in transaction(), reads through the same store must
+still return immediately.
+
+    python3 stress_proposal_store.py --processes 6 --ops 300
+    python3 stress_proposal_store.py --busy-timeout 0.05   # lean on the retries
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+
+def worker(worker_id: int, ops: int, start_at: float):
+    """Run `ops` mixed writes and print a JSON summary line."""
+    sys.path.insert(0, str(HERE))
+    import proposal_manager as pm
+    from ingest_queue import enqueue_ingest
+
+    time.sleep(max(0.0, start_at - time.time()))
+    created = []
+    latencies = []
+    errors = []
+    for i in range(ops):
+        start = time.perf_counter()
+        try:
+            kind = i % 6
+            if kind in (0, 1, 2) or not created:
+                payload = {"course": {"id": f"course_stress_{worker_id}_{i}", "name": f"Stress {worker_id}-{i}",
+                                      "city": "Lansing", "state": "MI"}}
+                created.append(pm.create_proposal(payload, agent_label=f"stress-{worker_id}"))
+            elif kind == 3:
+                pm.update_proposal_message_id(created[-1], 1000 + i, "stress")
+                pm.get_proposal(created[-1])
+            elif kind == 4:
+                target = created[len(created) // 2]
+                if i % 12 == 4:
+                    pm.skip_proposal(target)
+                else:
+                    enqueue_ingest(target, "stress")
+            else:
+                pm.cleanup_expired_proposals()
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+        latencies.append(time.perf_counter() - start)
+
+    print(json.dumps({
+        "worker": worker_id,
+        "created": len(created),
+        "errors": errors,
+        "latencies": latencies,
+        "busy_retries": pm.get_store().busy_retries
+    }))
+
+
+def lock_hog(db_path: str, hold_ms: float, stop_at: float):
+    """Repeatedly take the write lock and sit on it."""
+    while not os.path.exists(db_path) and time.time() < stop_at:
+        time.sleep(0.01)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    holds = 0
+    while time.time() < stop_at:
+        conn.execute("BEGIN IMMEDIATE")
+        time.sleep(hold_ms / 1000.0)
+        conn.execute("COMMIT")
+        holds += 1
+        time.sleep(hold_ms / 1000.0)
+    print(json.dumps({"holds": holds}))
+
+
+def check_database(db_path: str) -> list:
+    """Return a list of consistency problems (empty when the database is sound)."""
+    problems = []
+    conn = sqlite3.connect(db_path)
+    if conn.execute("PRAGMA integrity_check").fetchone()[0] != "ok":
+        problems.append("integrity_check failed")
+    per_day = {}
+    for (proposal_id,) in conn.execute("SELECT proposal_id FROM proposals"):
+        prefix_day, _, seq = proposal_id.rpartition("-")
+        per_day.setdefault(prefix_day, []).append(int(seq))
+    for prefix_day, seqs in per_day.items():
+        if sorted(seqs) != list(range(1, len(seqs) + 1)):
+            problems.append(f"{prefix_day}: sequence numbers are not 1..{len(seqs)}")
+    active = conn.execute("""
+        SELECT proposal_id FROM ingest_jobs WHERE status IN ('queued', 'running')
+        GROUP BY proposal_id HAVING COUNT(*) > 1
+    """).fetchall()
+    if active:
+        problems.append(f"{len(active)} proposals have more than one active ingest job")
+    conn.close()
+    return problems
+
+
+def check_reads_during_write_wait(db_path: str, hold: float = 1.5) -> list:
+    """
+    Hold the write lock from another connection while one thread of a store
+    waits for it in transaction(); reads on the same store must not wait.
+    """
+    sys.path.insert(0, str(HERE))
+    import threading
+    from proposal_store import SQLiteProposalStore
+
+    store = SQLiteProposalStore(db_path, busy_timeout=hold * 4, write_retries=0)
+    store.connection()
+    other = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    writer_waited = []
+
+    def writer():
+        start = time.perf_counter()
+        with store.transaction() as conn:
+            conn.execute("UPDATE proposals SET agent_label = agent_label WHERE 0")
+        writer_waited.append(time.perf_counter() - start)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    time.sleep(0.2)  # Writer is now blocked in BEGIN IMMEDIATE, holding the store's lock
+    start = time.perf_counter()
+    store.fetchone("SELECT COUNT(*) FROM proposals")
+    store.fetchall("SELECT proposal_id FROM proposals LIMIT 5")
+    read_time = time.perf_counter() - start
+    time.sleep(max(0.0, hold - 0.2))
+    other.execute("COMMIT")
+    thread.join()
+    other.close()
+    store.close()
+
+    problems = []
+    if read_time > 0.1:
+        problems.append(f"reads waited {read_time:.2f}s behind a writer waiting for the lock")
+    if not writer_waited or writer_waited[0] < hold * 0.5:
+        problems.append("writer did not wait for the external lock (check is not exercising anything)")
+    print(f"  read while a writer waits {hold:g}s for the lock: {read_time * 1000:.1f} ms")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=6)
+    parser.add_argument("--ops", type=int, default=300, help="Operations per process")
+    parser.add_argument("--hold-ms", type=float, default=20.0, help="Lock-hog hold time (0 disables)")
+    parser.add_argument("--busy-timeout", type=float, help="PROPOSALS_BUSY_TIMEOUT for the writers")
+    parser.add_argument("--write-retries", type=int, help="PROPOSALS_WRITE_RETRIES for the writers")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--lock-hog", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--start-at", type=float, help=argparse.SUPPRESS)
+    parser.add_argument("--stop-at", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        worker(args.worker, args.ops, args.start_at)
+        return
+    if args.lock_hog:
+        lock_hog(os.environ["PROPOSALS_DB_PATH"], args.hold_ms, args.stop_at)
+        return
+
+    tmpdir = tempfile.mkdtemp(prefix="stress_proposals_")
+    db_path = os.path.join(tmpdir, "course_proposals.db")
+    env = dict(os.environ, PROPOSALS_DB_PATH=db_path, PROPOSAL_CACHE_SIZE="0")
+    if args.busy_timeout is not None:
+        env["PROPOSALS_BUSY_TIMEOUT"] = str(args.busy_timeout)
+    if args.write_retries is not None:
+        env["PROPOSALS_WRITE_RETRIES"] = str(args.write_retries)
+
+    try:
+        start_at = time.time() + 1.0  # let every interpreter finish starting
+        script = str(Path(__file__).resolve())
+        writers = [
+            subprocess.Popen(
+                [sys.executable, script, "--worker", str(i), "--ops", str(args.ops), "--start-at", str(start_at)],
+                env=env, stdout=subprocess.PIPE, text=True
+            )
+            for i in range(args.processes)
+        ]
+        hog = None
+        if args.hold_ms > 0:
+            hog = subprocess.Popen(
+                [sys.executable, script, "--lock-hog", "--hold-ms", str(args.hold_ms),
+                 "--stop-at", str(start_at + 3600)],
+                env=env, stdout=subprocess.PIPE, text=True
+            )
+
+        results = []
+        for proc in writers:
+            out, _ = proc.communicate()
+            results.append(json.loads(out.strip().splitlines()[-1]) if proc.returncode == 0 else
+                           {"created": 0, "errors": [f"worker exited {proc.returncode}"], "latencies": [],
+                            "busy_retries": 0})
+        elapsed = time.time() - start_at
+        if hog is not None:
+            hog.terminate()
+            hog.wait()
+
+        latencies = sorted(l for r in results for l in r["latencies"])
+        errors = [e for r in results for e in r["errors"]]
+        created = sum(r["created"] for r in results)
+        rows = sqlite3.connect(db_path).execute("SELECT COUNT(*) FROM proposals").fetchone()[0]
+        problems = check_database(db_path)
+        if rows != created:
+            problems.append(f"{created} creates succeeded but {rows} proposals exist")
+        problems += check_reads_during_write_wait(db_path)
+
+        print(f"{args.processes} processes x {args.ops} ops in {elapsed:.1f}s "
+              f"({len(latencies) / elapsed:,.0f} ops/s), lock hog holding {args.hold_ms:g} ms")
+        if latencies:
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            print(f"  latency p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+                  f"p99 {p99 * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+        print(f"  proposals created: {created:,}   busy retries: {sum(r['busy_retries'] for r in results):,}")
+        print(f"  failed operations: {len(errors)}")
+        for error in sorted(set(errors))[:5]:
+            print(f"    {error}")
+        for problem in problems:
+            print(f"  ❌ {problem}")
+        if errors or problems:
+            sys.exit(1)
+        print("  ✅ writers serialised cleanly; database consistent")
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
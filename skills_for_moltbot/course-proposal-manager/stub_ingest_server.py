@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Stub course-ingest server for benchmarks and local testing.
+
+Speaks just enough of the course-ingest API for proposal_manager:
+POST /v1/courses/ingest, POST /v1/courses/ingest/batch and GET /health, with
+optional added latency and a failure rate (503s). Accepts gzip request
+bodies like the real server, can gzip its responses, and can close idle
+keep-alive connections after a timeout. Never touches a database.
+
+    server = StubIngestServer(latency_ms=20).start()
+    os.environ["COURSE_INGEST_URL"] = server.url
+    ...
+    server.stop()
+
+Or standalone:
+
+    python3 stub_ingest_server.py --port 8088 --latency-ms 20
+"""
+
+import argparse
+import gzip
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like Fastify
+    disable_nagle_algorithm = True
+    server: "_Server"
+
+    def setup(self):
+        # An idle keep-alive connection is closed once this read timeout passes
+        self.timeout = self.server.stub.keepalive_timeout
+        self.server.stub.record_connection()
+        super().setup()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if self.server.stub.gzip_responses and "gzip" in self.headers.get("Accept-Encoding", ""):
+            data = gzip.compress(data)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return json.loads(body)
+
+    def _ingest_result(self, payload: dict) -> dict:
+        return {
+            "ok": True,
+            "courseId": (payload.get("course") or {}).get("id"),
+            "snapshotId": f"snap-{next(self.server.snapshot_ids)}",
+            "idempotent": False
+        }
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"ok": True})
+        else:
+            self._send_json(404, {"error": "not_found"})
+
+    def do_POST(self):
+        stub = self.server.stub
+        payload = self._read_json()
+        stub.record_request()
+        if stub.latency:
+            time.sleep(stub.latency)
+        if stub.should_fail():
+            self._send_json(503, {"error": "unavailable"})
+        elif self.path == "/v1/courses/ingest":
+            self._send_json(200, self._ingest_result(payload))
+        elif self.path == "/v1/courses/ingest/batch":
+            results = [dict(self._ingest_result(p), index=i) for i, p in enumerate(payload)]
+            self._send_json(200, {"ok": True, "results": results, "errors": None})
+        else:
+            self._send_json(404, {"error": "not_found"})
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # benchmarks open many connections at once
+
+    stub: "StubIngestServer"
+    snapshot_ids: "itertools.count"
+
+    def handle_error(self, request, client_address):
+        # Clients that time out on a slow stub hang up mid-response; that's expected
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class StubIngestServer:
+    """In-process stub ingest API on 127.0.0.1."""
+
+    def __init__(
+        self,
+        port: int = 0,
+        latency_ms: float = 0.0,
+        fail_rate: float = 0.0,
+        gzip_responses: bool = False,
+        keepalive_timeout: Optional[float] = None
+    ):
+        self.latency = latency_ms / 1000.0
+        self.fail_rate = fail_rate
+        self.gzip_responses = gzip_responses
+        self.keepalive_timeout = keepalive_timeout
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(0)
+        self._server = _Server(("127.0.0.1", port), _Handler)
+        self._server.stub = self
+        self._server.snapshot_ids = itertools.count(1)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self.fail_rate > 0 and self._random.random() < self.fail_rate
+
+    def start(self) -> "StubIngestServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-ingest", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub course-ingest API.")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = StubIngestServer(args.port, args.latency_ms, args.fail_rate).start()
+    print(f"Stub ingest server on {server.url} (Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
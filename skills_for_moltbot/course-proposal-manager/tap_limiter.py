@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Tap Limiter - Debounce and rate-limit proposal button taps.
+
+A double-tapped (or impatiently re-tapped) button arrives as several
+identical callbacks. Without a guard each one runs the full safety-check
+chain - a proposal lookup at least, an ingest claim at worst.
+callback_handler checks every authorized, well-formed tap here first, before
+any DB or network work:
+
+  - a tap repeating the same (user, proposal, action) within
+    PROPOSAL_TAP_DEBOUNCE seconds is a duplicate and dropped silently
+  - each user has a token bucket (PROPOSAL_TAP_RATE taps/s, bursts of
+    PROPOSAL_TAP_BURST); the first tap over it gets a "slow down" notice,
+    further ones in the same streak are dropped silently
+
+Both checks are in-memory and take microseconds. Processes that each see
+only some taps (one process per message, several replicas) can also share
+the debounce through the proposals database (PROPOSAL_TAP_SHARED=true, see
+proposal_manager.record_tap); that check runs only for taps that passed the
+in-memory ones.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from token_bucket import TokenBucket
+
+PROPOSAL_TAP_DEBOUNCE = float(os.getenv("PROPOSAL_TAP_DEBOUNCE", "3"))
+PROPOSAL_TAP_RATE = float(os.getenv("PROPOSAL_TAP_RATE", "1"))
+PROPOSAL_TAP_BURST = int(os.getenv("PROPOSAL_TAP_BURST", "5"))
+PROPOSAL_TAP_SHARED = os.getenv("PROPOSAL_TAP_SHARED", "false").lower() == "true"
+
+# check() outcomes
+ALLOWED = "allowed"
+DUPLICATE = "duplicate"  # Same tap within the debounce window
+RATE_LIMITED = "rate_limited"  # First tap over the user's rate (worth a notice)
+THROTTLED = "throttled"  # Later taps while still over it
+
+# shared(user_id, proposal_id, action, window) -> True unless another process
+# saw the same tap within `window` seconds
+SharedDebounce = Callable[[str, str, str, float], bool]
+
+
+class TapLimiter:
+    """Thread-safe per-(user, proposal, action) debounce plus per-user token buckets."""
+
+    def __init__(
+        self,
+        debounce_window: float = PROPOSAL_TAP_DEBOUNCE,
+        user_rate: float = PROPOSAL_TAP_RATE,
+        user_burst: int = PROPOSAL_TAP_BURST,
+        shared: Optional[SharedDebounce] = None,
+        max_keys: int = 4096
+    ):
+        self.debounce_window = debounce_window
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.shared = shared
+        self.max_keys = max_keys
+        self.duplicates = 0
+        self.rate_limited = 0
+        self._taps: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._throttled = set()
+        self._lock = threading.Lock()
+
+    def check(self, user_id: str, proposal_id: str, action: str) -> str:
+        """Record a tap and return ALLOWED, DUPLICATE, RATE_LIMITED or THROTTLED."""
+        key = (user_id, proposal_id, action)
+        now = time.monotonic()
+        with self._lock:
+            last = self._taps.get(key)
+            if last is not None and now - last < self.debounce_window:
+                self.duplicates += 1
+                return DUPLICATE
+
+            if self.user_rate > 0:
+                bucket = self._buckets.get(user_id)
+                if bucket is None:
+                    bucket = self._buckets[user_id] = TokenBucket(self.user_rate, max(1, self.user_burst))
+                if not bucket.try_acquire():
+                    self.rate_limited += 1
+                    if user_id in self._throttled:
+                        return THROTTLED
+                    self._throttled.add(user_id)
+                    return RATE_LIMITED
+                self._throttled.discard(user_id)
+
+            self._taps[key] = now
+            self._taps.move_to_end(key)
+            # Oldest first: drop taps past the window, and any beyond max_keys
+            while self._taps:
+                tapped_at = next(iter(self._taps.values()))
+                if len(self._taps) <= self.max_keys and now - tapped_at < self.debounce_window:
+                    break
+                self._taps.popitem(last=False)
+
+        if self.shared is not None and not self.shared(user_id, proposal_id, action, self.debounce_window):
+            with self._lock:
+                self.duplicates += 1
+            return DUPLICATE
+        return ALLOWED
+
+    def clear(self):
+        """Forget all taps and buckets."""
+        with self._lock:
+            self._taps.clear()
+            self._buckets.clear()
+            self._throttled.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "tracked_taps": len(self._taps),
+                "users": len(self._buckets),
+                "duplicates": self.duplicates,
+                "rate_limited": self.rate_limited
+            }
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Telegram Executor - Runs callback instruction lists within Telegram's rate limits.
+
+Takes the instruction dicts returned by callback_handler (single or
+kind "multiple") for any number of chats and sends them through a Telegram
+API object (send_message / send_document / edit_message_text, as in
+handle_proposal_callback.execute_telegram_instruction):
+
+  - edits of the same message are coalesced; only the last text is sent
+  - each chat has a token bucket (about 1 message/s, 20/minute in groups),
+    and all chats share a global bucket (about 30 messages/s per bot)
+  - chats run concurrently; instructions within a chat keep their order
+  - a 429 is retried after its retry_after, and pauses that chat meanwhile
+
+    executor = TelegramExecutor(telegram_api)
+    executor.execute([callback_result, other_result, ...])
+
+Or as the ingest worker's delivery callback:
+start_ingest_worker(TelegramExecutor(telegram_api).deliver).
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+
+from token_bucket import TokenBucket
+
+# Telegram's documented limits: ~1 message per second per chat (short bursts
+# tolerated), 20 per minute in a group, ~30 per second across all chats
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+TELEGRAM_GROUP_RATE = float(os.getenv("TELEGRAM_GROUP_RATE", str(20 / 60)))
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "5"))
+
+logger = logging.getLogger(__name__)
+
+
+def retry_after_of(error: Exception) -> Optional[float]:
+    """
+    Seconds to wait if `error` is a Telegram 429, else None.
+
+    Understands the common client libraries: a `retry_after` attribute
+    (python-telegram-bot, aiogram; seconds or timedelta) or `error_code`
+    429 with `result_json["parameters"]["retry_after"]` (pyTelegramBotAPI).
+    """
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is None and getattr(error, "error_code", None) == 429:
+        result = getattr(error, "result_json", None) or {}
+        retry_after = (result.get("parameters") or {}).get("retry_after", 1)
+    if retry_after is None:
+        return None
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+def flatten_instructions(results: Iterable[Dict]) -> List[Dict]:
+    """Expand kind "multiple" results into their instructions, in order."""
+    flat = []
+    for result in results:
+        if result.get("kind") == "multiple":
+            flat.extend(result["instructions"])
+        else:
+            flat.append(result)
+    return flat
+
+
+def coalesce_edits(instructions: List[Dict]) -> List[Dict]:
+    """Keep one edit per (chat, message): the latest text, at the first edit's position."""
+    latest = {}
+    for instruction in instructions:
+        if instruction["kind"] == "edit_message":
+            edit = instruction["edit"]
+            latest[(str(edit["chat_id"]), edit["message_id"])] = instruction
+    coalesced = []
+    for instruction in instructions:
+        if instruction["kind"] == "edit_message":
+            edit = instruction["edit"]
+            key = (str(edit["chat_id"]), edit["message_id"])
+            if key not in latest:
+                continue  # Already emitted
+            instruction = latest.pop(key)
+        coalesced.append(instruction)
+    return coalesced
+
+
+def split_calls(instruction: Dict) -> List[Dict]:
+    """
+    One instruction per Telegram API call, so each takes its own token and is
+    retried on its own: a send_file with text becomes the file, then the text
+    as a plain (not Markdown) message marked "follows_file".
+    """
+    if instruction["kind"] != "send_file" or not instruction.get("text"):
+        return [instruction]
+    document = {key: value for key, value in instruction.items() if key != "text"}
+    caption = {"kind": "send_message", "chat_id": instruction["chat_id"], "text": instruction["text"],
+               "parse_mode": None, "follows_file": True}
+    return [document, caption]
+
+
+def send_instruction(telegram_api, instruction: Dict):
+    """Make the Telegram API call(s) for one instruction."""
+    if instruction["kind"] == "send_message":
+        telegram_api.send_message(instruction["chat_id"], instruction["text"],
+                                  parse_mode=instruction.get("parse_mode", "Markdown"))
+
+    elif instruction["kind"] == "send_file":
+        # Spooled per attempt, so a retried send streams the file again
+        with instruction["file"]["open"]() as document:
+            telegram_api.send_document(
+                instruction["chat_id"],
+                document=document,
+                filename=instruction["file"]["filename"]
+            )
+        if instruction.get("text"):
+            telegram_api.send_message(instruction["chat_id"], instruction["text"])
+
+    elif instruction["kind"] == "edit_message":
+        edit = instruction["edit"]
+        edit_params = {
+            "chat_id": edit["chat_id"],
+            "message_id": edit["message_id"],
+            "text": edit["new_text"],
+            "parse_mode": "Markdown"
+        }
+        if "reply_markup" in edit:
+            edit_params["reply_markup"] = edit["reply_markup"]
+        telegram_api.edit_message_text(**edit_params)
+
+    else:
+        raise ValueError(f"Unknown instruction kind: {instruction['kind']}")
+
+
+class TelegramExecutor:
+    """Sends instruction lists concurrently per chat under per-chat and global rate limits."""
+
+    def __init__(
+        self,
+        telegram_api,
+        chat_rate: float = TELEGRAM_CHAT_RATE,
+        chat_burst: int = TELEGRAM_CHAT_BURST,
+        group_rate: float = TELEGRAM_GROUP_RATE,
+        global_rate: float = TELEGRAM_GLOBAL_RATE,
+        max_retries: int = TELEGRAM_MAX_RETRIES,
+        max_chats: int = 8
+    ):
+        self.telegram_api = telegram_api
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        # A global rate below 1/s still has to hold one whole message
+        self.global_bucket = TokenBucket(global_rate, max(1.0, global_rate))
+        self.rate_limited = 0
+        self._chat_buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def chat_bucket(self, chat_id: str) -> TokenBucket:
+        """The bucket for a chat (group chats have negative IDs and a lower rate)."""
+        with self._lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                rate = self.group_rate if chat_id.startswith("-") else self.chat_rate
+                bucket = self._chat_buckets[chat_id] = TokenBucket(rate, max(1, self.chat_burst))
+            return bucket
+
+    def _send(self, instruction: Dict) -> Dict:
+        """Send one single-call instruction (see split_calls), retrying 429s; return its outcome."""
+        chat_id = str(instruction["chat_id"])
+        bucket = self.chat_bucket(chat_id)
+        attempt = 0
+        while True:
+            attempt += 1
+            bucket.acquire()
+            self.global_bucket.acquire()
+            try:
+                send_instruction(self.telegram_api, instruction)
+                return {"kind": instruction["kind"], "chat_id": chat_id, "ok": True, "attempts": attempt}
+            except Exception as e:
+                retry_after = retry_after_of(e)
+                if retry_after is None or attempt > self.max_retries:
+                    return {"kind": instruction["kind"], "chat_id": chat_id, "ok": False,
+                            "attempts": attempt, "error": str(e)}
+                with self._lock:
+                    self.rate_limited += 1
+                # The chat's next token (this retry) waits out retry_after
+                bucket.pause(retry_after)
+
+    def _run_chat(self, instructions: List[Dict]) -> List[Dict]:
+        outcomes = []
+        for instruction in instructions:
+            if instruction.get("follows_file") and outcomes and not outcomes[-1]["ok"]:
+                # Don't send a file's text without the file
+                outcomes.append({"kind": instruction["kind"], "chat_id": str(instruction["chat_id"]),
+                                 "ok": False, "attempts": 0, "error": "File not sent"})
+                continue
+            outcomes.append(self._send(instruction))
+        return outcomes
+
+    def execute(self, results: Iterable[Dict]) -> List[Dict]:
+        """
+        Send every instruction in `results` (handler return values) and wait.
+
+        Returns one outcome per API call (after coalescing, and with a file's
+        text as its own send_message, see split_calls), grouped by chat:
+        {"kind", "chat_id", "ok", "attempts", "error"?}.
+        Failures other than 429s are reported, not raised, so one bad chat
+        doesn't stop the rest.
+        """
+        by_chat: Dict[str, List[Dict]] = {}
+        for instruction in coalesce_edits(flatten_instructions(results)):
+            by_chat.setdefault(str(instruction["chat_id"]), []).extend(split_calls(instruction))
+        if len(by_chat) <= 1:
+            return [outcome for chat in by_chat.values() for outcome in self._run_chat(chat)]
+        with ThreadPoolExecutor(max_workers=min(self.max_chats, len(by_chat)),
+                                thread_name_prefix="telegram-chat") as pool:
+            return [outcome for outcomes in pool.map(self._run_chat, by_chat.values()) for outcome in outcomes]
+
+    def deliver(self, result: Dict):
+        """Send one handler result (usable as start_ingest_worker's `deliver`)."""
+        log_failures(self.execute([result]))
+
+
+def log_failures(outcomes: List[Dict]) -> bool:
+    """Log every failed outcome from execute(); return True if all succeeded."""
+    ok = True
+    for outcome in outcomes:
+        if not outcome["ok"]:
+            ok = False
+            logger.warning("Telegram %s to chat %s failed after %d attempt(s): %s",
+                           outcome["kind"], outcome["chat_id"], outcome["attempts"], outcome.get("error"))
+    return ok
+
+
+# One executor per Telegram API object, so rate limits carry across calls
+_executors: Dict[int, TelegramExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(telegram_api) -> TelegramExecutor:
+    """Return the shared executor for a Telegram API object."""
+    with _executors_lock:
+        executor = _executors.get(id(telegram_api))
+        # The executor holds a reference to the API object, so its id can't be reused
+        if executor is None:
+            executor = _executors[id(telegram_api)] = TelegramExecutor(telegram_api)
+        return executor
@@ -7,19 +7,62 @@ Run this to test the proposal callback handler end-to-end.
 
 import sys
 import os
+import asyncio
+import gzip
+import hashlib
 import json
+import logging
+import shutil
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+import uuid
+import zlib
 from pathlib import Path
 
 # Add proposal manager to path
 sys.path.insert(0, str(Path(__file__).parent))
 
+import ingest_queue
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from ingest_client import AsyncIngestClient, IngestClient, IngestConnectionError, IngestHTTPError, decode_content
+from proposal_cache import ProposalCache
+from proposal_store import MIGRATIONS, SCHEMA_VERSION, ProposalStore, SQLiteProposalStore, migrate
+from stub_ingest_server import StubIngestServer
+import proposal_manager
+import proposal_manager_async
+import proposal_sweeper
 from proposal_manager import (
+    claim_ingest,
+    compute_payload_hash,
     create_proposal,
+    create_proposals,
     format_proposal_message,
+    get_ingest_breaker,
+    get_or_create_proposal,
+    ingest_proposals,
     get_proposal,
+    get_store,
+    invalidate_proposal_cache,
+    record_tap,
+    skip_proposal,
+    proposal_message_text,
     update_proposal_message_id
 )
-from callback_handler import handle_telegram_callback_message
+import callback_handler
+from callback_handler import (
+    ACTIONS,
+    TAP_LIMITER,
+    handle_telegram_callback_message,
+    parse_callback_data,
+    register_action
+)
+from handle_proposal_callback import handle_proposal_message
+from json_document import json_document
+from tap_limiter import ALLOWED, DUPLICATE, RATE_LIMITED, THROTTLED, TapLimiter
+from telegram_executor import TelegramExecutor, coalesce_edits
+from token_bucket import TokenBucket
 
 # Load test payload (Royal Scot)
 royal_scot_path = Path(__file__).parent.parent.parent / "moltbot-courses" / "royal_scot.json"
@@ -47,6 +90,8 @@ print(f"   ✅ Created proposal: {proposal_id}")
 print("\n2. Formatting proposal message...")
 message_text = format_proposal_message(proposal_id, payload)
 print(f"   Message preview (first 200 chars):\n   {message_text[:200]}...")
+assert proposal_message_text(get_proposal(proposal_id)) == message_text, "Stored summary renders differently"
+print("   ✅ Stored summary renders the same message")
 
 # Step 3: Simulate callback - First Ingest
 print("\n3. Simulating first 'Ingest' callback...")
@@ -54,6 +99,9 @@ print(f"   Callback: proposal:ingest:{proposal_id}")
 
 chat_id = "123456789"  # Test chat ID
 from_user_id = "8372254579"  # John's Telegram ID (authorized)
+# Step 5 re-taps after this ingest, which can take a while to fail (DNS,
+# retries); keep its tap inside the debounce window however long that is
+TAP_LIMITER.debounce_window = 600
 
 result1 = handle_telegram_callback_message(
     message_text=f"proposal:ingest:{proposal_id}",
@@ -86,6 +134,18 @@ print(f"   Snapshot ID: {proposal.get('snapshot_id', 'N/A')}")
 print("\n5. Simulating second 'Ingest' callback (idempotency test)...")
 print(f"   Callback: proposal:ingest:{proposal_id}")
 
+# An immediate re-tap is debounced before it reaches the proposal at all
+retap = handle_telegram_callback_message(
+    message_text=f"proposal:ingest:{proposal_id}",
+    chat_id=chat_id,
+    from_user_id=from_user_id,
+    message_id=42
+)
+assert retap['kind'] == 'multiple' and not retap['instructions'], f"Re-tap not debounced: {retap}"
+print("   ✅ Immediate re-tap debounced")
+
+# Forget the tap so the next one goes through to the idempotency check
+TAP_LIMITER.clear()
 result2 = handle_telegram_callback_message(
     message_text=f"proposal:ingest:{proposal_id}",
     chat_id=chat_id,
@@ -113,7 +173,912 @@ result3 = handle_telegram_callback_message(
 print(f"   Result kind: {result3['kind']}")
 if result3['kind'] == 'send_file':
     print(f"   File: {result3['file']['filename']}")
-    print(f"   Size: {len(result3['file']['bytes'])} bytes")
+    print(f"   Size: {sum(len(chunk) for chunk in result3['file']['chunks']())} bytes")
+
+# Step 7: Payloads the summary can't fully read still create proposals
+print("\n7. Creating proposals from loosely shaped payloads...")
+loose_payloads = [
+    {"course": {"id": f"course_string_address_{uuid.uuid4().hex[:8]}", "name": "String Address GC",
+                "address": "123 Test St, Lansing, MI"}},
+    {"course": {"id": f"course_no_group_key_{uuid.uuid4().hex[:8]}", "name": "No Group Key GC"},
+     "courseTypes": [{"typeKey": "public"}, {"groupKey": "tech", "typeKey": "simulator"}]},
+]
+for loose in loose_payloads:
+    loose_id = create_proposal(payload=loose, agent_label="test-manual")
+    loose_text = proposal_message_text(get_proposal(loose_id))
+    assert loose_text == format_proposal_message(loose_id, loose), "Stored summary renders differently"
+    print(f"   ✅ {loose_id}: {loose_text.splitlines()[2]}")
+assert "• 123 Test St, Lansing, MI" in format_proposal_message("X", loose_payloads[0])
+assert "tech: simulator" in format_proposal_message("X", loose_payloads[1])
+
+# Step 8: With the ingest service down and no worker, a tap fails fast and queues nothing
+print("\n8. Tapping Ingest while the ingest service is down (no worker)...")
+breaker = get_ingest_breaker()
+for _ in range(max(breaker.failure_threshold - breaker.failures, 1)):
+    breaker.record_failure()
+assert breaker.is_open, "Breaker did not open"
+down_id = create_proposal(
+    payload={"course": {"id": f"course_service_down_{uuid.uuid4().hex[:8]}", "name": "Service Down GC"}},
+    agent_label="test-manual"
+)
+TAP_LIMITER.clear()
+down_result = handle_telegram_callback_message(
+    message_text=f"proposal:ingest:{down_id}",
+    chat_id=chat_id,
+    from_user_id=from_user_id
+)
+print(f"   Response: {down_result['text']}")
+assert down_result.get("error") == "Ingest service unavailable", down_result
+assert get_proposal(down_id)["status"] == "pending", "Proposal should stay pending"
+assert get_store().fetchone(
+    "SELECT COUNT(*) FROM ingest_jobs WHERE proposal_id = ?", (down_id,)
+)[0] == 0, "Nothing should be queued without a worker"
+print("   ✅ Not queued; proposal still pending")
+breaker.record_success()
+
+# Step 9: Sending through the rate-limited executor
+print("\n9. Sending a captioned file with a chat burst of 1...")
+
+
+class RecordingTelegramAPI:
+    def __init__(self, fail_documents=False):
+        self.calls = []
+        self.edits = []
+        self.fail_documents = fail_documents
+
+    def send_message(self, chat_id, text, **kwargs):
+        self.calls.append(("send_message", chat_id))
+
+    def send_document(self, chat_id, document, filename=None, **kwargs):
+        if self.fail_documents:
+            raise RuntimeError("Bad Request: file is empty")
+        self.calls.append(("send_document", chat_id))
+
+    def edit_message_text(self, **kwargs):
+        self.calls.append(("edit_message_text", kwargs["chat_id"]))
+        self.edits.append(kwargs["text"])
+
+
+api = RecordingTelegramAPI()
+captioned = {"kind": "send_file", "chat_id": chat_id, "file": result3["file"], "text": "Here it is"}
+outcomes = TelegramExecutor(api, chat_rate=20, chat_burst=1).execute([captioned])
+assert [(o["kind"], o["ok"]) for o in outcomes] == [("send_file", True), ("send_message", True)], outcomes
+assert [name for name, _ in api.calls] == ["send_document", "send_message"], api.calls
+print("   ✅ Two API calls, one token each")
+
+TAP_LIMITER.clear()
+handled = handle_proposal_message(f"proposal:view_json:{proposal_id}", chat_id, from_user_id,
+                                  telegram_api=RecordingTelegramAPI(fail_documents=True))
+assert handled == {"handled": True, "sent": False}, handled
+print("   ✅ Failed send reported as sent: False")
+
+# Step 10: The pretty View JSON file doesn't leave the parsed payload in the cache
+print("\n10. Streaming a pretty View JSON file from a cached proposal...")
+invalidate_proposal_cache([proposal_id])
+cached = get_proposal(proposal_id)
+tracemalloc.start()
+before = tracemalloc.get_traced_memory()[0]
+pretty_size = sum(len(chunk) for chunk in json_document(cached, pretty=True, gzip_min_bytes=0)["chunks"]())
+retained = tracemalloc.get_traced_memory()[0] - before
+tracemalloc.stop()
+assert get_proposal(proposal_id) is cached, "Expected the cached proposal"
+assert not dict.__contains__(cached, "payload"), "Pretty path cached the parsed payload"
+assert retained < cached.payload_size(), f"{retained} bytes retained after streaming"
+print(f"   ✅ {pretty_size:,} bytes streamed, {retained:,} bytes retained")
+
+# Step 11: View JSON shows the document as proposed; only the hash is canonical
+print("\n11. Viewing a payload with unsorted keys and float scores...")
+ordered = {"course": {"name": "Key Order GC", "id": f"course_key_order_{uuid.uuid4().hex[:8]}"},
+           "scores": {"overall": 70.0, "value": 8.5}, "amenities": ["range"]}
+ordered_id, created = get_or_create_proposal(ordered, agent_label="test-manual")
+assert created
+stored = get_proposal(ordered_id)
+pretty_text = b"".join(json_document(stored, pretty=True, gzip_min_bytes=0)["chunks"]()).decode("utf-8")
+assert pretty_text == json.dumps(ordered, indent=2), pretty_text
+raw_text = b"".join(json_document(stored, pretty=False, gzip_min_bytes=0)["chunks"]()).decode("utf-8")
+assert raw_text == '{"course":{"name":"Key Order GC","id":"%s"},"scores":{"overall":70.0,"value":8.5},' \
+                   '"amenities":["range"]}' % ordered["course"]["id"], raw_text
+assert stored["payload_hash"] == compute_payload_hash(ordered)
+reordered = {"amenities": ["range"], "scores": {"value": 8.5, "overall": 70}, "course": dict(
+    reversed(list(ordered["course"].items())))}
+assert get_or_create_proposal(reordered, agent_label="test-manual") == (ordered_id, False), \
+    "Same document in another key order should be a duplicate"
+print("   ✅ Key order and 70.0 kept for display; hash is canonical")
+
+# Step 12: Ingest queue - dedupe, lease recovery, open breaker, concurrent ingest
+print("\n12. Exercising the ingest queue...")
+
+
+def claim_only(job_id, lease_seconds=300.0):
+    """Claim `job_id`, handing back any other queued jobs claimed with it."""
+    claimed = ingest_queue.claim_jobs(1000, lease_seconds)
+    for other in claimed:
+        if other["job_id"] != job_id:
+            ingest_queue._requeue_job(other["job_id"])
+    mine = [job for job in claimed if job["job_id"] == job_id]
+    return mine[0] if mine else None
+
+
+queued_id = create_proposal(
+    payload={"course": {"id": f"course_queue_{uuid.uuid4().hex[:8]}", "name": "Queue GC"}},
+    agent_label="test-manual"
+)
+job_id, created = ingest_queue.enqueue_ingest(queued_id, chat_id)
+assert created and ingest_queue.enqueue_ingest(queued_id, chat_id) == (job_id, False), "Enqueue not deduped"
+print("   ✅ Second enqueue returns the active job")
+
+job = claim_only(job_id, lease_seconds=-1)  # Lease already expired: the worker "crashed"
+assert job and job["attempts"] == 1
+recovered = claim_only(job_id)
+assert recovered and recovered["attempts"] == 2, "Expired lease not reclaimed"
+assert claim_only(job_id) is None, "Live lease reclaimed"
+print("   ✅ Expired lease reclaimed, live one not")
+
+for _ in range(breaker.failure_threshold):
+    breaker.record_failure()
+ingest_queue.run_job(recovered)
+breaker.record_success()
+requeued = ingest_queue.get_job(job_id)
+assert (requeued["status"], requeued["attempts"]) == ("queued", 1), requeued
+assert get_proposal(queued_id)["status"] == "pending"
+print("   ✅ Open breaker requeues without counting an attempt")
+
+completions = []
+_, lease = claim_ingest(queued_id)  # A direct tap is ingesting it
+ingest_queue.run_job(claim_only(job_id), lambda *args: completions.append(args))
+proposal_manager.release_ingest_claim(queued_id, lease)
+assert ingest_queue.get_job(job_id)["status"] == "done" and not completions
+print("   ✅ Proposal already being ingested: job finishes as a no-op")
+
+real_claim_jobs = ingest_queue.claim_jobs
+
+
+def locked_claim_jobs(limit, lease_seconds):
+    raise sqlite3.OperationalError("database is locked")
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+claim_warnings = ListHandler()
+ingest_queue.logger.addHandler(claim_warnings)
+ingest_queue.logger.propagate = False
+ingest_queue.claim_jobs = locked_claim_jobs
+worker = ingest_queue.IngestWorker(concurrency=2, poll_interval=0.02)
+try:
+    worker.start()
+    time.sleep(0.2)
+    assert worker.running, "Worker thread died on a failed claim"
+    assert all(worker._slots.acquire(blocking=False) for _ in range(2)), "Slots leaked"
+    for _ in range(2):
+        worker._slots.release()
+finally:
+    worker.stop()
+    ingest_queue.claim_jobs = real_claim_jobs
+    ingest_queue.logger.removeHandler(claim_warnings)
+    ingest_queue.logger.propagate = True
+assert claim_warnings.records and claim_warnings.records[0].exc_info, "Failed claim not logged"
+print("   ✅ Failed claims keep the worker alive and release its slots")
+
+# Step 13: Batch ingest gives back claims it never sent
+print("\n13. Batch ingest failing before anything is sent...")
+batch_ids = [
+    create_proposal(payload={"course": {"id": f"course_batch_{uuid.uuid4().hex[:8]}", "name": f"Batch {n} GC"}},
+                    agent_label="test-manual")
+    for n in range(3)
+]
+real_get_ingest_client = proposal_manager.get_ingest_client
+
+
+def broken_get_ingest_client():
+    raise RuntimeError("client unavailable")
+
+
+proposal_manager.get_ingest_client = broken_get_ingest_client
+try:
+    ingest_proposals(batch_ids)
+    raise AssertionError("ingest_proposals swallowed the error")
+except RuntimeError:
+    pass
+finally:
+    proposal_manager.get_ingest_client = real_get_ingest_client
+assert [get_proposal(pid)["status"] for pid in batch_ids] == ["pending"] * 3
+print("   ✅ Error before the POST: claims released to pending")
+
+for _ in range(breaker.failure_threshold):
+    breaker.record_failure()
+batch_results = ingest_proposals(batch_ids)
+breaker.record_success()
+assert all(r == {"ok": False, "error": "Ingest service unavailable"} for r in batch_results.values()), batch_results
+assert [get_proposal(pid)["status"] for pid in batch_ids] == ["pending"] * 3
+print("   ✅ Batch refused by the open breaker: claims released to pending")
+
+# Step 14: Async client framing of body-less and EOF-delimited responses
+print("\n14. Reading 204, 100-continue and EOF-delimited responses (async client)...")
+RESPONSES = {
+    "/no-content": b"HTTP/1.1 204 No Content\r\nConnection: keep-alive\r\n\r\n",
+    "/continue": b"HTTP/1.1 100 Continue\r\n\r\nHTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok",
+    "/eof": b"HTTP/1.1 200 OK\r\n\r\nuntil the end",
+}
+
+
+async def serve_framing(reader, writer):
+    while True:
+        request_line = await reader.readline()
+        if not request_line:
+            break
+        while (await reader.readline()) not in (b"\r\n", b""):
+            pass  # Requests carry Content-Length: 0
+        path = request_line.split()[1].decode()
+        writer.write(RESPONSES[path])
+        await writer.drain()
+        if path == "/eof":
+            break
+    writer.close()
+
+
+async def check_framing():
+    server = await asyncio.start_server(serve_framing, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    client = AsyncIngestClient(f"http://127.0.0.1:{port}", "token", read_timeout=2, max_retries=0)
+    try:
+        assert await client.request("GET", "/no-content") == (204, b"")
+        assert len(client._pool) == 1, "204 connection not pooled"
+        assert await client.request("GET", "/continue") == (200, b"ok")
+        assert len(client._pool) == 1, "Connection not pooled after 100-continue"
+        assert await client.request("GET", "/eof") == (200, b"until the end")
+        assert len(client._pool) == 0, "EOF-delimited connection was pooled"
+    finally:
+        await client.close()
+        server.close()
+        await server.wait_closed()
+
+
+asyncio.run(check_framing())
+print("   ✅ No hang on 204, 1xx skipped, EOF-delimited connection not reused")
+
+# Step 15: Tap limiter - debounce window, per-user rate, rejected-tap replies
+print("\n15. Debouncing and rate-limiting taps...")
+limiter = TapLimiter(debounce_window=0.2, user_rate=0)
+assert limiter.check("u1", "P-1", "ingest") == ALLOWED
+assert limiter.check("u1", "P-1", "ingest") == DUPLICATE
+assert limiter.check("u1", "P-1", "skip") == ALLOWED, "Other action debounced"
+assert limiter.check("u2", "P-1", "ingest") == ALLOWED, "Other user debounced"
+time.sleep(0.25)
+assert limiter.check("u1", "P-1", "ingest") == ALLOWED, "Tap after the window debounced"
+print("   ✅ Same tap debounced only within the window")
+
+limiter = TapLimiter(debounce_window=0, user_rate=10, user_burst=2)
+assert [limiter.check("u1", f"P-{n}", "ingest") for n in range(4)] == [ALLOWED, ALLOWED, RATE_LIMITED, THROTTLED]
+assert limiter.check("u2", "P-0", "ingest") == ALLOWED, "Rate limit shared between users"
+time.sleep(0.15)
+assert limiter.check("u1", "P-9", "ingest") == ALLOWED, "Bucket did not refill"
+assert limiter.check("u1", "P-10", "ingest") == RATE_LIMITED, "New streak got no notice"
+print("   ✅ Burst of 2, then one notice per streak; refills at the user's rate")
+
+callback_handler.TAP_LIMITER = TapLimiter(debounce_window=0, user_rate=0.01, user_burst=1)
+try:
+    replies = [
+        handle_telegram_callback_message(message_text=f"proposal:view_json:{proposal_id}",
+                                         chat_id=chat_id, from_user_id=from_user_id)
+        for _ in range(3)
+    ]
+finally:
+    callback_handler.TAP_LIMITER = TAP_LIMITER
+assert replies[0]["kind"] == "send_file", replies[0]
+assert replies[1]["kind"] == "send_message" and replies[1]["error"] == "Rate limited", replies[1]
+assert replies[2] == {"kind": "multiple", "chat_id": chat_id, "instructions": [], "error": "Rate limited"}
+print(f"   ✅ Rejected taps: \"{replies[1]['text']}\" once, then nothing")
+
+# Step 16: Action routing through ACTIONS / register_action
+print("\n16. Routing callbacks through registered actions...")
+assert {"ingest", "view_json", "skip"} <= set(ACTIONS)
+assert parse_callback_data("proposal:skip:RS-20260201-001") == {"action": "skip", "proposal_id": "RS-20260201-001"}
+for bad in ("proposal:frobnicate:RS-20260201-001", "proposal:skip", "ingest:RS-20260201-001", ""):
+    assert parse_callback_data(bad) is None, bad
+TAP_LIMITER.clear()
+unknown = handle_telegram_callback_message(message_text=f"proposal:frobnicate:{proposal_id}",
+                                           chat_id=chat_id, from_user_id=from_user_id)
+assert unknown["text"] == "❌ Invalid callback format", unknown
+
+routed = []
+
+
+@register_action("echo", statuses=("skipped",))
+def handle_echo_action(echo_id, echo_proposal, echo_chat_id):
+    routed.append((echo_id, echo_proposal["status"], echo_chat_id))
+    return {"kind": "send_message", "chat_id": echo_chat_id, "text": f"echo {echo_id}"}
+
+
+try:
+    echo_id = create_proposal(
+        payload={"course": {"id": f"course_echo_{uuid.uuid4().hex[:8]}", "name": "Echo GC"}},
+        agent_label="test-manual"
+    )
+    pending_reply = handle_telegram_callback_message(message_text=f"proposal:echo:{echo_id}",
+                                                     chat_id=chat_id, from_user_id=from_user_id)
+    assert not routed and pending_reply["error"] == "Proposal status: pending", pending_reply
+    assert skip_proposal(echo_id)
+    TAP_LIMITER.clear()
+    echo_reply = handle_telegram_callback_message(message_text=f"proposal:echo:{echo_id}",
+                                                  chat_id=chat_id, from_user_id=from_user_id)
+    assert echo_reply["text"] == f"echo {echo_id}" and routed == [(echo_id, "skipped", chat_id)], echo_reply
+finally:
+    del ACTIONS["echo"]
+print("   ✅ Unknown actions rejected; registered action runs only in its statuses")
+
+# Step 17: Telegram executor - coalescing, 429 retry_after, rate limits
+print("\n17. Coalescing edits, retrying 429s and pacing sends...")
+
+
+def edit(text, message_id=7):
+    return {"kind": "edit_message", "chat_id": chat_id,
+            "edit": {"chat_id": chat_id, "message_id": message_id, "new_text": text}}
+
+
+def message(text, to=chat_id):
+    return {"kind": "send_message", "chat_id": to, "text": text}
+
+
+burst = [edit("Ingesting..."), message("queued"), edit("Ingested ✅"), edit("other", message_id=8)]
+assert coalesce_edits(burst) == [burst[2], burst[1], burst[3]], "Latest edit not kept at the first edit's place"
+api = RecordingTelegramAPI()
+TelegramExecutor(api).execute([{"kind": "multiple", "instructions": burst}])
+assert [name for name, _ in api.calls] == ["edit_message_text", "send_message", "edit_message_text"], api.calls
+assert api.edits == ["Ingested ✅", "other"], api.edits
+print("   ✅ Two edits of one message sent as one, with the latest text")
+
+
+class TooManyRequests(Exception):
+    retry_after = 0.3
+
+
+class RateLimitedTelegramAPI(RecordingTelegramAPI):
+    def __init__(self, limited_calls):
+        super().__init__()
+        self.limited_calls = limited_calls
+
+    def send_message(self, chat_id, text, **kwargs):
+        if self.limited_calls:
+            self.limited_calls -= 1
+            raise TooManyRequests("Too Many Requests: retry after 0.3")
+        super().send_message(chat_id, text, **kwargs)
+
+
+executor = TelegramExecutor(RateLimitedTelegramAPI(limited_calls=1), chat_rate=100, chat_burst=5)
+start = time.monotonic()
+outcomes = executor.execute([message("hello")])
+assert time.monotonic() - start >= 0.3, "Retried before retry_after"
+assert outcomes == [{"kind": "send_message", "chat_id": chat_id, "ok": True, "attempts": 2}], outcomes
+assert executor.rate_limited == 1
+outcomes = TelegramExecutor(RateLimitedTelegramAPI(limited_calls=5), chat_rate=100, max_retries=1).execute(
+    [message("hello")])
+assert not outcomes[0]["ok"] and outcomes[0]["attempts"] == 2, outcomes
+print("   ✅ 429 retried after retry_after, up to max_retries")
+
+api = RateLimitedTelegramAPI(limited_calls=1)  # Only the text after the file gets a 429
+outcomes = TelegramExecutor(api, chat_rate=100, chat_burst=5).execute([captioned])
+assert [name for name, _ in api.calls] == ["send_document", "send_message"], f"File resent: {api.calls}"
+assert [(o["kind"], o["attempts"]) for o in outcomes] == [("send_file", 1), ("send_message", 2)], outcomes
+api = RecordingTelegramAPI(fail_documents=True)
+outcomes = TelegramExecutor(api, chat_rate=100).execute([captioned])
+assert not api.calls and [o.get("error") for o in outcomes] == ["Bad Request: file is empty", "File not sent"]
+print("   ✅ 429 on a file's text retries only the text; no text without its file")
+
+bucket = TokenBucket(rate=10, capacity=2)
+assert bucket.try_acquire() and bucket.try_acquire() and not bucket.try_acquire()
+assert bucket.acquire() >= 0.05, "Third token should wait for the refill"
+for invalid in (lambda: TokenBucket(0, 1), lambda: TokenBucket(1, 0.5), lambda: bucket.acquire(3)):
+    try:
+        invalid()
+        raise AssertionError("Invalid bucket use accepted")
+    except ValueError:
+        pass
+
+api = RecordingTelegramAPI()
+executor = TelegramExecutor(api, chat_rate=10, chat_burst=1)
+start = time.monotonic()
+executor.execute([message(f"m{n}", to=to) for n in range(3) for to in ("111", "222")])
+elapsed = time.monotonic() - start
+assert 0.18 <= elapsed < 0.5, f"3 messages per chat at 10/s took {elapsed:.2f}s"
+assert [to for _, to in api.calls].count("111") == 3
+print(f"   ✅ 10/s per chat with bursts of 1: 3 messages in each of 2 chats took {elapsed:.2f}s")
+
+# Step 18: View JSON documents - raw vs pretty, gzip threshold, spooling
+print("\n18. Building View JSON documents...")
+course_file_id = payload["course"]["id"]
+viewed = get_proposal(proposal_id)
+stored_bytes = b"".join(viewed.payload_chunks())
+raw = json_document(viewed, pretty=False, gzip_min_bytes=0)
+assert (raw["filename"], raw["content_type"], raw["gzip"]) == (f"{course_file_id}.json", "application/json", False)
+assert b"".join(raw["chunks"]()) == stored_bytes, "Raw document is not the stored JSON"
+pretty = b"".join(json_document(viewed, pretty=True, gzip_min_bytes=0)["chunks"]())
+# (Compared with the stored document: rows from older versions are stored canonically)
+assert pretty.decode("utf-8") == json.dumps(json.loads(stored_bytes), indent=2), "Pretty document differs"
+print(f"   ✅ Raw {len(stored_bytes):,} bytes as stored, pretty {len(pretty):,} bytes")
+
+size = viewed.payload_size()
+assert size == len(stored_bytes)
+assert not json_document(viewed, gzip_min_bytes=size + 1)["gzip"], "Gzipped below the threshold"
+zipped = json_document(viewed, pretty=False, gzip_min_bytes=size)
+assert (zipped["filename"], zipped["content_type"]) == (f"{course_file_id}.json.gz", "application/gzip")
+assert gzip.decompress(b"".join(zipped["chunks"]())) == stored_bytes
+print(f"   ✅ Gzipped at the {size:,}-byte threshold, not one byte above it")
+
+with json_document(viewed, pretty=True, gzip_min_bytes=0, spool_bytes=1024)["open"]() as document:
+    assert document._rolled, "Document over spool_bytes stayed in memory"
+    assert document.read() == pretty
+with json_document(viewed, pretty=True, gzip_min_bytes=0)["open"]() as document:
+    assert not document._rolled and document.read() == pretty
+print("   ✅ open() spools to disk only beyond spool_bytes")
+
+# Step 19: Circuit breaker - closed -> open -> probe (half-open) -> closed
+print("\n19. Opening and closing the circuit breaker...")
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+probe_answers = []
+closed_events = []
+cb = CircuitBreaker(failure_threshold=3, reset_timeout=0.2, probe=lambda: probe_answers.pop(0),
+                    on_close=lambda: closed_events.append(True))
+cb.record_failure()
+cb.record_failure()
+cb.record_success()
+cb.record_failure()
+cb.record_failure()
+assert cb.state == CircuitBreaker.CLOSED and cb.allow(), "A success should reset the failure count"
+cb.record_failure()
+assert cb.is_open and cb.stats()["opened"] == 1
+try:
+    cb.check()
+    raise AssertionError("Open breaker let a request through")
+except CircuitOpenError:
+    pass
+assert not probe_answers and cb.stats()["rejected"] == 1, "Probed before reset_timeout"
+
+probe_answers.extend([False, True])
+time.sleep(0.25)
+assert not cb.allow(), "Callers never wait on the probe"
+assert wait_for(lambda: len(probe_answers) == 1 and not cb._probing), "Unhealthy probe did not run"
+assert cb.is_open and not cb.allow(), "Unhealthy probe closed the breaker (or re-probed at once)"
+time.sleep(0.25)
+cb.allow()
+assert wait_for(lambda: not cb.is_open), "Healthy probe did not close the breaker"
+assert closed_events == [True], "on_close not fired exactly once"
+print("   ✅ Opens at the threshold; unhealthy probe keeps it open; healthy probe closes it")
+
+trial = CircuitBreaker(failure_threshold=1, reset_timeout=0.2)
+trial.record_failure()
+assert not trial.allow()
+time.sleep(0.25)
+assert trial.allow() and not trial.allow(), "Without a probe, one trial request per reset_timeout"
+trial.record_success()
+assert trial.allow() and not trial.is_open
+print("   ✅ Without a probe, one trial request goes through and its success closes it")
+
+stub = StubIngestServer(fail_rate=1.0).start()
+try:
+    live = CircuitBreaker(failure_threshold=3, reset_timeout=0.2)
+    client = IngestClient(stub.url, "token", max_retries=0, breaker=live)
+    live.probe = client.health
+    for _ in range(3):
+        try:
+            client.post_json("/v1/courses/ingest", b'{"course": {"id": "x"}}')
+        except IngestHTTPError:
+            pass
+    assert live.is_open and stub.requests == 3
+    try:
+        client.post_json("/v1/courses/ingest", b'{"course": {"id": "x"}}')
+        raise AssertionError("Open breaker let a POST through")
+    except CircuitOpenError:
+        pass
+    assert stub.requests == 3, "Refused request reached the server"
+    stub.fail_rate = 0.0
+    time.sleep(0.25)
+    live.allow()  # Due: starts GET /health in the background
+    assert wait_for(lambda: not live.is_open), "/health probe did not close the breaker"
+    assert client.post_json("/v1/courses/ingest", b'{"course": {"id": "x"}}')["ok"]
+finally:
+    stub.stop()
+print("   ✅ 503s open it, POSTs fail fast, GET /health closes it again")
+
+# Step 20: Store backends must implement the whole interface
+print("\n20. Checking the ProposalStore interface...")
+assert isinstance(get_store(), ProposalStore)
+
+
+class ReadOnlyStore(ProposalStore):
+    def fetchone(self, sql, params=()):
+        return None
+
+
+try:
+    ReadOnlyStore()
+    raise AssertionError("Incomplete store backend instantiated")
+except TypeError as e:
+    assert "transaction" in str(e), e
+print("   ✅ A backend missing transaction/execute/fetchall can't be instantiated")
+
+
+# Step 21: Sweeper - archive old terminal proposals, purge jobs and taps, vacuum
+print("\n21. Archiving, purging and vacuuming...")
+store = get_store()
+long_ago = proposal_sweeper.retention_cutoff(60)
+old_payload = {"course": {"id": f"course_archive_{uuid.uuid4().hex[:8]}", "name": "Archive GC"}, "score": 70.0}
+old_skipped = create_proposal(payload=old_payload, agent_label="test-manual")
+assert skip_proposal(old_skipped)
+old_pending = create_proposal(
+    payload={"course": {"id": f"course_old_pending_{uuid.uuid4().hex[:8]}", "name": "Old Pending GC"}},
+    agent_label="test-manual"
+)
+store.execute("UPDATE proposals SET created_at = ?, expires_at = ? WHERE proposal_id IN (?, ?)",
+              (long_ago, "2999-01-01T00:00:00", old_skipped, old_pending))
+invalidate_proposal_cache([old_skipped, old_pending])
+assert proposal_sweeper.archive_proposals(retention_days=30) >= 1
+assert get_proposal(old_skipped) is None, "Archived proposal still in proposals"
+archived = proposal_sweeper.get_archived_proposal(old_skipped)
+assert archived["status"] == "skipped" and archived["payload"] == old_payload, archived
+assert archived["archived_at"], archived
+assert get_proposal(old_pending)["status"] == "pending", "Pending proposal archived"
+assert proposal_sweeper.get_archived_proposal(old_pending) is None
+skip_proposal(old_pending)
+print(f"   ✅ {old_skipped} archived and read back; pending proposal kept")
+
+job_proposal = create_proposal(
+    payload={"course": {"id": f"course_purge_{uuid.uuid4().hex[:8]}", "name": "Purge GC"}},
+    agent_label="test-manual"
+)
+with store.transaction() as conn:
+    old_done = conn.execute(
+        "INSERT INTO ingest_jobs (proposal_id, status, created_at) VALUES (?, 'done', ?) RETURNING job_id",
+        (job_proposal, long_ago)
+    ).fetchone()[0]
+    old_queued = conn.execute(
+        "INSERT INTO ingest_jobs (proposal_id, status, created_at) VALUES (?, 'queued', ?) RETURNING job_id",
+        (job_proposal, long_ago)
+    ).fetchone()[0]
+    recent_done = conn.execute(
+        "INSERT INTO ingest_jobs (proposal_id, status) VALUES (?, 'done') RETURNING job_id", (job_proposal,)
+    ).fetchone()[0]
+assert proposal_sweeper.purge_ingest_jobs(retention_days=30) >= 1
+assert ingest_queue.get_job(old_done) is None, "Old finished job not purged"
+assert ingest_queue.get_job(old_queued) and ingest_queue.get_job(recent_done), "Purged a live or recent job"
+store.execute("UPDATE ingest_jobs SET status = 'done' WHERE job_id = ?", (old_queued,))
+
+tap_user = f"sweeper-{uuid.uuid4().hex[:8]}"
+assert record_tap(tap_user, job_proposal, "old", 3) and record_tap(tap_user, job_proposal, "new", 3)
+store.execute("UPDATE callback_taps SET tapped_at = ? WHERE user_id = ? AND action = 'old'",
+              (time.time() - 2 * 86400, tap_user))
+assert proposal_sweeper.purge_callback_taps() >= 1
+assert [row[0] for row in store.fetchall("SELECT action FROM callback_taps WHERE user_id = ?", (tap_user,))] \
+    == ["new"], "Wrong taps purged"
+print("   ✅ Old finished jobs and day-old taps purged; queued jobs and recent rows kept")
+
+proposal_sweeper.incremental_vacuum()  # Switches an older file to incremental auto_vacuum once
+assert store.fetchone("PRAGMA auto_vacuum")[0] == 2
+with store.transaction() as conn:
+    conn.executemany(
+        "INSERT INTO ingest_jobs (proposal_id, status, last_error, created_at) VALUES (?, 'failed', ?, ?)",
+        [(job_proposal, uuid.uuid4().hex * 128, long_ago) for _ in range(200)]
+    )
+assert proposal_sweeper.purge_ingest_jobs(retention_days=30) >= 200
+pages_before = store.fetchone("PRAGMA page_count")[0]
+free_pages = proposal_sweeper.incremental_vacuum()
+assert free_pages > 0, "Purge freed no pages"
+assert store.fetchone("PRAGMA freelist_count")[0] == 0, "Free pages left after vacuum"
+assert store.fetchone("PRAGMA page_count")[0] <= pages_before - free_pages
+print(f"   ✅ Vacuum returned {free_pages} free pages to the filesystem")
+
+# Step 22: Async facade and client against the stub - keep-alive, stale connections, gzip
+print("\n22. Ingesting through the async facade...")
+
+
+async def check_async_facade(stub):
+    client = AsyncIngestClient(stub.url, "token", max_retries=0)
+    proposal_manager_async._clients[asyncio.get_running_loop()] = client
+    try:
+        ids = await asyncio.gather(*(
+            proposal_manager_async.create_proposal(
+                {"course": {"id": f"course_async_{uuid.uuid4().hex[:8]}", "name": f"Async {n} GC"}},
+                agent_label="test-manual"
+            )
+            for n in range(4)
+        ))
+        for proposal_id in ids[:2]:
+            result = await proposal_manager_async.ingest_proposal(proposal_id)
+            assert result["ok"] and result["snapshot_id"].startswith("snap-"), result
+        assert stub.connections == 1, f"Sequential ingests opened {stub.connections} connections"
+
+        results = await asyncio.gather(*(proposal_manager_async.ingest_proposal(pid) for pid in ids[2:]))
+        assert all(r["ok"] for r in results), results
+        proposals = await asyncio.gather(*(proposal_manager_async.get_proposal(pid) for pid in ids))
+        assert [p["status"] for p in proposals] == ["ingested"] * 4
+        assert (await proposal_manager_async.ingest_proposal(ids[0]))["already_ingested"]
+        assert stub.requests == 4, "Already ingested proposal was POSTed again"
+
+        # The stub has closed every idle connection; with max_retries=0 only
+        # the stale-connection resend can save the request
+        await asyncio.sleep(stub.keepalive_timeout * 2)
+        connections = stub.connections
+        status, data = await client.request("POST", "/v1/courses/ingest", b'{"course": {"id": "stale"}}')
+        assert status == 200 and json.loads(data)["courseId"] == "stale"
+        assert stub.connections == connections + 1 and stub.requests == 5
+    finally:
+        await client.close()
+
+
+stub = StubIngestServer(gzip_responses=True, keepalive_timeout=0.5).start()
+try:
+    asyncio.run(check_async_facade(stub))
+    assert IngestClient(stub.url, "token").post_json("/v1/courses/ingest", b'{"course": {"id": "sync"}}')["ok"]
+finally:
+    stub.stop()
+assert decode_content("deflate", zlib.compress(b"ok")) == b"ok"
+print("   ✅ Connection reused, stale connection resent once, gzip responses decoded")
+
+# Step 23: Batch ingest against the stub - one request, per-proposal results, retries
+print("\n23. Batch ingesting through the stub...")
+stub = StubIngestServer().start()
+proposal_manager.get_ingest_client = lambda: IngestClient(stub.url, "token", max_retries=0)
+try:
+    batch_courses = [f"course_batch_ok_{uuid.uuid4().hex[:8]}" for _ in range(3)]
+    batch_ids = [create_proposal(payload={"course": {"id": course_id, "name": "Batch GC"}}, agent_label="test-manual")
+                 for course_id in batch_courses]
+    skipped_id = create_proposal(
+        payload={"course": {"id": f"course_batch_skip_{uuid.uuid4().hex[:8]}", "name": "Skipped GC"}},
+        agent_label="test-manual"
+    )
+    assert skip_proposal(skipped_id)
+    missing_id = "ZZ-19700101-001"
+    batch_results = ingest_proposals(batch_ids + [skipped_id, missing_id, batch_ids[0]])
+    assert stub.requests == 1, f"Batch sent {stub.requests} requests"
+    assert set(batch_results) == set(batch_ids) | {skipped_id, missing_id}
+    for proposal_id, course_id in zip(batch_ids, batch_courses):
+        result = batch_results[proposal_id]
+        assert result["ok"] and result["course_id"] == course_id and result["snapshot_id"], result
+        assert get_proposal(proposal_id)["status"] == "ingested"
+        assert get_proposal(proposal_id)["snapshot_id"] == result["snapshot_id"]
+    assert batch_results[skipped_id] == {"ok": False, "error": "Proposal status: skipped"}
+    assert batch_results[missing_id] == {"ok": False, "error": f"Proposal {missing_id} not found"}
+    assert get_proposal(skipped_id)["status"] == "skipped"
+
+    again = ingest_proposals(batch_ids)
+    assert all(again[pid]["already_ingested"] and again[pid]["snapshot_id"] == batch_results[pid]["snapshot_id"]
+               for pid in batch_ids), again
+    assert stub.requests == 1, "Already ingested proposals were POSTed again"
+    print("   ✅ One request; skipped and missing IDs reported; a second call is already_ingested")
+
+    retry_ids = [
+        create_proposal(payload={"course": {"id": f"course_batch_503_{uuid.uuid4().hex[:8]}", "name": "Retry GC"}},
+                        agent_label="test-manual")
+        for _ in range(2)
+    ]
+    stub.fail_rate = 1.0
+    failed_results = ingest_proposals(retry_ids)
+    assert all(not r["ok"] and "HTTP 503" in r["error"] for r in failed_results.values()), failed_results
+    assert [get_proposal(pid)["status"] for pid in retry_ids] == ["failed"] * 2, "Claims left in 'ingesting'"
+    stub.fail_rate = 0.0
+    assert all(r["ok"] for r in ingest_proposals(retry_ids).values())
+    assert [get_proposal(pid)["status"] for pid in retry_ids] == ["ingested"] * 2
+finally:
+    proposal_manager.get_ingest_client = real_get_ingest_client
+    stub.stop()
+print("   ✅ A failed batch request releases its claims as failed, and they ingest on retry")
+
+# Step 24: Proposal cache - counters, LRU eviction, TTL, invalidation racing a read
+print("\n24. Exercising the proposal cache...")
+cache = ProposalCache(maxsize=2, ttl=0.2)
+cache.put("a", {"n": 1})
+cache.put("b", {"n": 2})
+assert cache.get("a") == {"n": 1}
+cache.put("c", {"n": 3})  # Evicts "b", the least recently used
+assert cache.get("b") is None and cache.get("c") == {"n": 3}
+assert cache.stats() == {"hits": 2, "misses": 1, "evictions": 1, "size": 2, "maxsize": 2}, cache.stats()
+time.sleep(0.25)
+assert cache.get("a") is None and cache.stats()["size"] == 1, "Expired entry served"
+
+generation = cache.generation()  # A reader misses and goes to the DB...
+cache.invalidate(["a"])  # ...while a writer changes the row
+cache.put("a", {"n": "stale"}, generation)
+assert cache.get("a") is None, "Row read before an invalidating write was cached"
+cache.put("a", {"n": 4}, cache.generation())
+assert cache.get("a") == {"n": 4}
+print("   ✅ Counters, LRU eviction and TTL expiry; a read racing a write isn't cached")
+
+cached_id = create_proposal(
+    payload={"course": {"id": f"course_cache_{uuid.uuid4().hex[:8]}", "name": "Cache GC"}},
+    agent_label="test-manual"
+)
+before = proposal_manager.proposal_cache_stats()
+assert get_proposal(cached_id) is get_proposal(cached_id), "Second read missed the cache"
+after = proposal_manager.proposal_cache_stats()
+assert after["hits"] == before["hits"] + 1 and after["misses"] == before["misses"] + 1
+assert skip_proposal(cached_id)
+assert get_proposal(cached_id)["status"] == "skipped", "Write didn't invalidate the cached proposal"
+print("   ✅ get_proposal reads through the cache; writes invalidate it")
+
+# Step 25: Schema migrations - each applied once, current schema takes no write lock
+print("\n25. Migrating fresh, partly migrated and current databases...")
+migration_dir = Path(tempfile.mkdtemp(prefix="migrations_"))
+try:
+    fresh = sqlite3.connect(migration_dir / "fresh.db", isolation_level=None)
+    assert migrate(fresh) == SCHEMA_VERSION
+    assert fresh.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    assert fresh.execute("SELECT name FROM sqlite_master WHERE name = 'callback_taps'").fetchone()
+    fresh.close()
+
+    partial = sqlite3.connect(migration_dir / "partial.db", isolation_level=None)
+    for migration in MIGRATIONS[:3]:
+        migration(partial)
+    partial.execute("PRAGMA user_version = 3")
+    assert migrate(partial) == SCHEMA_VERSION - 3
+    assert partial.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    partial.close()
+
+    # Another connection holds the write lock: a current database must not need it
+    writer = sqlite3.connect(migration_dir / "fresh.db", isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    current = sqlite3.connect(migration_dir / "fresh.db", isolation_level=None, timeout=0)
+    assert migrate(current) == 0 and not current.in_transaction
+    writer.execute("ROLLBACK")
+    writer.close()
+    current.close()
+
+    migrated_store = SQLiteProposalStore(migration_dir / "store.db")
+    assert migrated_store.fetchone("PRAGMA user_version")[0] == SCHEMA_VERSION
+    migrated_store.close()
+finally:
+    shutil.rmtree(migration_dir, ignore_errors=True)
+print(f"   ✅ {SCHEMA_VERSION} migrations applied once each; a current database is a pragma read")
+
+# Step 26: Bulk creation - one transaction, contiguous IDs, duplicates reported
+print("\n26. Creating proposals in bulk...")
+tag = uuid.uuid4().hex[:8]
+bulk_payloads = [
+    {"course": {"id": f"course_bulk_{tag}_{n}", "name": f"Bulk {n} GC", "city": "Lansing", "state": "MI"},
+     "score": 70 + n}
+    for n in range(3)
+]
+pending_payload = {"course": {"id": f"course_bulk_{tag}_pending", "name": "Bulk Pending GC"}}
+pending_id = create_proposal(payload=pending_payload, agent_label="test-manual")
+skipped_payload = {"course": {"id": f"course_bulk_{tag}_skipped", "name": "Bulk Skipped GC"}}
+skipped_id = create_proposal(payload=skipped_payload, agent_label="test-manual")
+assert skip_proposal(skipped_id)
+reordered = {"score": 70, "course": dict(reversed(list(bulk_payloads[0]["course"].items())))}
+
+created = create_proposals(
+    bulk_payloads + [pending_payload, reordered, skipped_payload],
+    agent_label="test-bulk", run_id=f"run-{tag}"
+)
+ids = created["proposal_ids"]
+assert len(ids) == 6 and ids[3] == pending_id and ids[4] == ids[0], ids
+assert ids[5] != skipped_id, "A skipped proposal counted as a duplicate"
+assert created["duplicates"] == [{"index": 3, "proposal_id": pending_id}, {"index": 4, "proposal_id": ids[0]}]
+new_ids = ids[:3] + [ids[5]]
+assert len(set(new_ids)) == 4
+prefix = ids[0].rsplit("-", 1)[0]
+seqs = sorted(int(pid.rsplit("-", 1)[1]) for pid in new_ids if pid.startswith(prefix + "-"))
+assert seqs == list(range(seqs[0], seqs[0] + len(seqs))), f"Non-contiguous IDs {new_ids}"
+for pid, bulk_payload in zip(ids[:3], bulk_payloads):
+    proposal = get_proposal(pid)
+    assert proposal["status"] == "pending" and proposal["payload"] == bulk_payload
+    assert proposal["agent_label"] == "test-bulk" and proposal["run_id"] == f"run-{tag}"
+    assert proposal["payload_hash"] == compute_payload_hash(bulk_payload)
+print(f"   ✅ {len(new_ids)} created with contiguous IDs; pending and in-batch duplicates reported")
+
+# A sequence counter behind the rows (e.g. rows copied in) falls back to row-by-row IDs
+store.execute("UPDATE proposal_sequences SET last_seq = last_seq - 1 WHERE prefix = ? AND day = ?",
+              tuple(prefix.split("-")))
+fallback = create_proposals([{"course": {"id": f"course_bulk_{tag}_late", "name": "Bulk Late GC"}}],
+                            agent_label="test-bulk")
+assert fallback["duplicates"] == [] and fallback["proposal_ids"][0] not in ids
+assert get_proposal(fallback["proposal_ids"][0])["payload"]["course"]["name"] == "Bulk Late GC"
+print("   ✅ An ID collision falls back to fresh IDs instead of failing the batch")
+
+# Step 27: Batch ingest - size bounds, per-item results, skipping a failed proposal
+print("\n27. Splitting batches and mapping per-item results...")
+
+
+class RecordingIngestClient:
+    """Answers batch POSTs with an error for every item whose course ID ends in "_bad"."""
+
+    def __init__(self):
+        self.calls = []
+
+    def post_json(self, path, body, idempotency_key=None):
+        items = json.loads(body)
+        self.calls.append((path, items, idempotency_key))
+        results = [{"index": i, "ok": True, "courseId": item["course"]["id"], "snapshotId": f"snap-{i}"}
+                   for i, item in enumerate(items) if not item["course"]["id"].endswith("_bad")]
+        errors = [{"index": i, "message": "invalid course"}
+                  for i, item in enumerate(items) if item["course"]["id"].endswith("_bad")]
+        return {"ok": not errors, "results": results, "errors": errors or None}
+
+
+tag = uuid.uuid4().hex[:8]
+split_payloads = [{"course": {"id": f"course_split_{tag}_{n}", "name": f"Split {n} GC"}} for n in range(4)]
+split_payloads.append({"course": {"id": f"course_split_{tag}_bad", "name": "Split Bad GC"}})
+split_ids = create_proposals(split_payloads, agent_label="test-manual")["proposal_ids"]
+recording = RecordingIngestClient()
+real_batch_size = proposal_manager.COURSE_INGEST_BATCH_SIZE
+proposal_manager.COURSE_INGEST_BATCH_SIZE = 2
+proposal_manager.get_ingest_client = lambda: recording
+try:
+    split_results = ingest_proposals(split_ids)
+finally:
+    proposal_manager.COURSE_INGEST_BATCH_SIZE = real_batch_size
+    proposal_manager.get_ingest_client = real_get_ingest_client
+assert [len(items) for _, items, _ in recording.calls] == [2, 2, 1], recording.calls
+assert all(path == "/v1/courses/ingest/batch" for path, _, _ in recording.calls)
+assert [item for _, items, _ in recording.calls for item in items] == split_payloads, "Bodies out of order"
+first_key = hashlib.sha256("".join(compute_payload_hash(p) for p in split_payloads[:2]).encode()).hexdigest()
+assert recording.calls[0][2] == first_key, "Batch key isn't derived from its items' payload hashes"
+for pid, split_payload in zip(split_ids[:4], split_payloads):
+    assert split_results[pid]["ok"] and split_results[pid]["course_id"] == split_payload["course"]["id"]
+    assert get_proposal(pid)["status"] == "ingested"
+bad_id = split_ids[4]
+assert split_results[bad_id] == {"ok": False, "error": "Ingest failed: invalid course"}, split_results[bad_id]
+assert get_proposal(bad_id)["status"] == "failed"
+print("   ✅ 5 proposals in batches of 2; each item's result lands on its own row")
+
+assert not skip_proposal(split_ids[0]), "Skipped an ingested proposal"
+assert skip_proposal(bad_id), "A failed proposal couldn't be skipped"
+assert get_proposal(bad_id)["status"] == "skipped"
+assert not skip_proposal(bad_id), "Skipped twice"
+assert ingest_proposals([bad_id])[bad_id] == {"ok": False, "error": "Proposal status: skipped"}
+print("   ✅ A failed proposal can be skipped once; a skipped one isn't ingested")
+
+# Step 28: Retry budget - a hung server costs one read timeout, fast failures still retry
+print("\n28. Timing out against a hung ingest server...")
+budget_options = {"read_timeout": 0.3, "max_retries": 3, "backoff_base": 0.01, "retry_budget": 0.5}
+stub = StubIngestServer(latency_ms=2000).start()
+try:
+    hung = IngestClient(stub.url, "token", **budget_options)
+    started = time.monotonic()
+    try:
+        hung.post_json("/v1/courses/ingest", b'{"course": {"id": "hung"}}', idempotency_key="hung")
+        raise AssertionError("Hung server answered")
+    except IngestConnectionError:
+        pass
+    assert stub.requests == 1, f"Read timeout retried {stub.requests - 1} time(s) past the budget"
+    assert time.monotonic() - started < 1.0
+
+    async def post_to_hung_server():
+        client = AsyncIngestClient(stub.url, "token", **budget_options)
+        try:
+            await client.post_json("/v1/courses/ingest", b'{"course": {"id": "hung"}}', idempotency_key="hung")
+            raise AssertionError("Hung server answered")
+        except IngestConnectionError:
+            pass
+        finally:
+            await client.close()
+
+    asyncio.run(post_to_hung_server())
+    assert stub.requests == 2, "Async client retried past the budget"
+
+    stub.latency = 0.0
+    stub.fail_rate = 1.0
+    try:
+        IngestClient(stub.url, "token", **budget_options).post_json("/v1/courses/ingest", b'{"course": {"id": "503"}}')
+        raise AssertionError("503 not raised")
+    except IngestHTTPError:
+        pass
+    assert stub.requests == 2 + 4, "Fast 503s weren't retried within the budget"
+finally:
+    stub.stop()
+print("   ✅ One attempt when a retry could overrun the budget; quick 503s retried max_retries times")
 
 print("\n" + "=" * 60)
 print("TEST COMPLETE")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Token Bucket - Thread-safe rate limiter shared by the Telegram executor
+(per-chat and global send rates) and the tap limiter (per-user tap rates).
+
+    bucket = TokenBucket(rate=1, capacity=3)   # 1 token/s, bursts of 3
+    bucket.acquire()        # blocks until a token is free
+    bucket.try_acquire()    # takes one now or returns False
+    bucket.pause(2.5)       # hand out nothing for 2.5 s (e.g. a 429)
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is free."""
+
+    def __init__(self, rate: float, capacity: float):
+        if rate <= 0:
+            raise ValueError(f"Token bucket rate must be positive, got {rate}")
+        if capacity < 1:
+            raise ValueError(f"Token bucket capacity must be at least 1, got {capacity}")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Take `tokens`, sleeping as needed; return the seconds waited."""
+        if tokens > self.capacity:
+            # The bucket never holds that many, so this would wait forever
+            raise ValueError(f"Cannot acquire {tokens} tokens from a bucket of {self.capacity}")
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = max(self._paused_until - now, (tokens - self._tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take `tokens` if they are available now; never sleeps."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self._paused_until and self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def pause(self, seconds: float):
+        """Hand out nothing for `seconds` (Telegram said retry_after)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0